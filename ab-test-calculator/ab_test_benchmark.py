@@ -0,0 +1,168 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+import argparse
+import json
+import logging
+import platform
+import time
+import numpy as np
+import scipy
+from scipy.integrate import quad
+from scipy.stats import beta
+from bayesian_ab_test_calculator import BayesianABTestCalculator, ENGINES, ENGINE_AUTO, ENGINE_EXACT
+
+# Number of outcomes per group
+SIZES = [10 ** k for k in range(2, 8)]
+# Win rate of the control group in each regime. The test group's win rate is set so that P(B>A) is about 80%
+REGIMES = {'low_winrate': 0.02, 'mid_winrate': 0.2, 'high_winrate': 0.6}
+# The exact engine iterates over every loss of the control group in Python, so it is skipped beyond this size
+MAX_EXACT_SIZE = 10 ** 5
+# A timing or an error is reported as a regression when it grows by more than this factor from the baseline results
+REGRESSION_FACTOR = 1.5
+RESULTS_PATH = Path(__file__).parent / 'benchmark_results.json'
+
+
+def reference_prob(a: int, b: int, c: int, d: int) -> float:
+    """
+    Compute P(X > Y), where X ~ beta(a, b) and Y ~ beta(c, d), by numerical integration of the density of Y times the
+    survival function of X, over the range holding the mass of Y.
+
+    Args:
+        a (int): The first beta parameter of the test
+        b (int): The second beta parameter of the test
+        c (int): The first beta parameter of the control
+        d (int): The second beta parameter of the control
+
+    Returns:
+        float: The probability
+    """
+    y = beta(c, d)
+    lo, hi = y.ppf(1e-15), y.isf(1e-15)
+    x_mean = a / (a + b)
+    points = [p for p in (x_mean, y.mean()) if lo < p < hi]
+    prob, _ = quad(lambda t: y.pdf(t) * beta.sf(t, a, b), lo, hi, points=points, epsabs=1e-15, epsrel=1e-13,
+                   limit=500)
+    return prob
+
+
+def time_call(func: Callable, repeat: int) -> float:
+    """
+    Returns:
+        float: The best time in seconds of calling func, out of repeat calls
+    """
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(sizes: List[int] = SIZES, max_exact_size: int = MAX_EXACT_SIZE, repeat: int = 3) -> List[Dict]:
+    """
+    Time run_test and calc_prob_between with each engine, across sizes and win rate regimes, and check their accuracy
+    against the numerical integration.
+
+    Args:
+        sizes (List[int]): Numbers of outcomes per group
+        max_exact_size (int): Largest size to run the exact engine on
+        repeat (int): Number of timed calls per measurement, of which the best is reported
+
+    Returns:
+        List[Dict]: A record per (size, regime, engine)
+    """
+    records = []
+    for size in sizes:
+        for regime, ctrl_winrate in REGIMES.items():
+            test_winrate = ctrl_winrate + 0.85 * np.sqrt(2 * ctrl_winrate * (1 - ctrl_winrate) / size)
+            wins_ctrl, wins_test = int(round(ctrl_winrate * size)), int(round(test_winrate * size))
+            losses_ctrl, losses_test = size - wins_ctrl, size - wins_test
+            a, b, c, d = wins_test + 1, losses_test + 1, wins_ctrl + 1, losses_ctrl + 1
+            reference = reference_prob(a, b, c, d)
+            beta_test, beta_control = beta(a, b), beta(c, d)
+            run_test_seconds = time_call(
+                lambda: BayesianABTestCalculator.run_test(losses_ctrl, wins_ctrl, losses_test, wins_test), repeat)
+            for engine in ENGINES:
+                if engine == ENGINE_EXACT and size > max_exact_size:
+                    continue
+                seconds = time_call(
+                    lambda: BayesianABTestCalculator.calc_prob_between(beta_test, beta_control, engine=engine), repeat)
+                result = BayesianABTestCalculator.calc_prob(a, b, c, d, engine=engine)
+                records.append({
+                    'size': size,
+                    'regime': regime,
+                    'losses_ctrl': losses_ctrl,
+                    'wins_ctrl': wins_ctrl,
+                    'losses_test': losses_test,
+                    'wins_test': wins_test,
+                    'engine': engine,
+                    'engine_used': result.engine,
+                    'prob': result.prob,
+                    'reference_prob': reference,
+                    'abs_error': abs(result.prob - reference),
+                    'error_bound': result.error,
+                    'calc_prob_seconds': seconds,
+                    'run_test_seconds': run_test_seconds if engine == ENGINE_AUTO else None,
+                })
+                logging.info(f"size {size}, {regime}, {engine} ({result.engine}): {seconds * 1000:.3f}ms, "
+                             f"error {records[-1]['abs_error']:.2e}")
+    return records
+
+
+def find_regressions(records: List[Dict], baseline_records: List[Dict]) -> List[str]:
+    """
+    Compare benchmark records to the records of a previous run.
+
+    Args:
+        records (List[Dict]): The current records
+        baseline_records (List[Dict]): The records of a previous run
+
+    Returns:
+        List[str]: A description of every timing or error that grew by more than REGRESSION_FACTOR
+    """
+    baseline = {(r['size'], r['regime'], r['engine']): r for r in baseline_records}
+    regressions = []
+    for record in records:
+        previous = baseline.get((record['size'], record['regime'], record['engine']))
+        if previous is None:
+            continue
+        for field, floor in (('calc_prob_seconds', 1e-4), ('abs_error', 1e-12)):
+            if record[field] > REGRESSION_FACTOR * max(previous[field], floor):
+                regressions.append(f"size {record['size']}, {record['regime']}, {record['engine']}: {field} "
+                                   f"{previous[field]:.3e} -> {record[field]:.3e}")
+    return regressions
+
+
+def main(args):
+    records = run_benchmark(args.sizes, args.max_exact_size, args.repeat)
+    results = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'records': records,
+    }
+    with open(args.output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    logging.info(f"Benchmark results saved to {args.output_path}")
+    if args.baseline_path is not None:
+        with open(args.baseline_path) as f:
+            regressions = find_regressions(records, json.load(f)['records'])
+        for regression in regressions:
+            logging.warning(f"Regression: {regression}")
+        logging.info(f"Found {len(regressions)} regressions with respect to {args.baseline_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Script for benchmarking the speed and accuracy of the A/B test calculator")
+    parser.add_argument("--output_path", help="JSON file for the results", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--baseline_path", help="JSON results of a previous run, to report regressions against",
+                        type=Path)
+    parser.add_argument("--sizes", help="numbers of outcomes per group", type=int, nargs='+', default=SIZES)
+    parser.add_argument("--max_exact_size", help="largest size to run the exact engine on", type=int,
+                        default=MAX_EXACT_SIZE)
+    parser.add_argument("--repeat", help="number of timed calls per measurement", type=int, default=3)
+    arguments = parser.parse_args()
+    main(arguments)
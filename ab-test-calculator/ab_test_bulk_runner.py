@@ -0,0 +1,167 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Iterator
+import argparse
+import logging
+import time
+import pandas as pd
+from ab_test_priors import load_prior
+from bayesian_ab_test_calculator import BayesianABTestCalculator, BetaPrior, BATCH_INPUT_COLUMNS, FLAT_PRIOR
+
+CHUNK_SIZE = 100_000
+
+
+def read_chunks(input_path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV or Parquet file of experiments in chunks of a fixed number of rows.
+
+    Args:
+        input_path (Path): Path of a CSV or Parquet file, with the BATCH_INPUT_COLUMNS columns
+        chunk_size (int): Number of rows per chunk
+
+    Returns:
+        Iterator[pd.DataFrame]: The chunks of the file
+
+    Raises:
+        ValueError: If the file is neither a CSV nor a Parquet file
+    """
+    if input_path.suffix == '.csv':
+        yield from pd.read_csv(input_path, chunksize=chunk_size)
+    elif input_path.suffix == '.parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(input_path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported input file: {input_path}. Expected a .csv or .parquet file")
+
+
+class ResultWriter:
+    """
+    Appends result chunks to a CSV or Parquet file, so that only one chunk is held in memory at a time.
+    """
+    def __init__(self, output_path: Path):
+        """
+        Args:
+            output_path (Path): Path of the output .csv or .parquet file. Overwritten if it exists.
+
+        Raises:
+            ValueError: If the file is neither a CSV nor a Parquet file
+        """
+        if output_path.suffix not in ('.csv', '.parquet'):
+            raise ValueError(f"Unsupported output file: {output_path}. Expected a .csv or .parquet file")
+        self.output_path = output_path
+        self._parquet_writer = None
+        self._is_first_chunk = True
+
+    def write(self, df: pd.DataFrame):
+        """
+        Append a chunk of results to the file, with the CSV header or the Parquet schema of the first chunk.
+
+        Args:
+            df (pd.DataFrame): The chunk of results, with the same columns as the previous chunks
+        """
+        if self.output_path.suffix == '.csv':
+            df.to_csv(self.output_path, mode='w' if self._is_first_chunk else 'a', header=self._is_first_chunk,
+                      index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.output_path, table.schema)
+            self._parquet_writer.write_table(table)
+        self._is_first_chunk = False
+
+    def close(self):
+        """
+        Finish the file. A Parquet file is only valid once closed.
+        """
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+
+def process_chunk(chunk: pd.DataFrame, prior: BetaPrior = FLAT_PRIOR) -> pd.DataFrame:
+    """
+    Run the batch A/B test on a chunk of experiments.
+
+    Args:
+        chunk (pd.DataFrame): Experiments with the BATCH_INPUT_COLUMNS columns, and possibly other columns (e.g. ids)
+        prior (BetaPrior): The beta prior of the win rate of all the groups
+
+    Returns:
+        pd.DataFrame: The chunk with the output columns of BayesianABTestCalculator.run_batch appended
+    """
+    result = BayesianABTestCalculator.run_batch_df(chunk, prior=prior)
+    return pd.concat([chunk, result.drop(columns=BATCH_INPUT_COLUMNS)], axis=1)
+
+
+def run_bulk(input_path: Path, output_path: Path, chunk_size: int = CHUNK_SIZE, workers: int = 1,
+             prior: BetaPrior = FLAT_PRIOR) -> int:
+    """
+    Stream experiments from the input file, through the batch A/B test, to the output file.
+    With several workers, chunks are processed by a process pool, with at most 2 chunks in flight per worker so that
+    the memory stays flat regardless of the size of the input.
+
+    Args:
+        input_path (Path): Path of a CSV or Parquet file, with the BATCH_INPUT_COLUMNS columns
+        output_path (Path): Path of the output CSV or Parquet file
+        chunk_size (int): Number of rows per chunk
+        workers (int): Number of worker processes. 1 processes the chunks in the current process.
+        prior (BetaPrior): The beta prior of the win rate of all the groups
+
+    Returns:
+        int: The number of processed rows
+    """
+    writer = ResultWriter(output_path)
+    process = partial(process_chunk, prior=prior)
+    n_rows = 0
+    try:
+        if workers == 1:
+            for chunk in read_chunks(input_path, chunk_size):
+                writer.write(process(chunk))
+                n_rows += len(chunk)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                in_flight = deque()
+                for chunk in read_chunks(input_path, chunk_size):
+                    in_flight.append(executor.submit(process, chunk))
+                    if len(in_flight) >= 2 * workers:
+                        result = in_flight.popleft().result()
+                        writer.write(result)
+                        n_rows += len(result)
+                while in_flight:
+                    result = in_flight.popleft().result()
+                    writer.write(result)
+                    n_rows += len(result)
+    finally:
+        writer.close()
+    return n_rows
+
+
+def main(args):
+    logging.info(f"ab_test_bulk_runner with input: {args.input_path}, output: {args.output_path}, "
+                 f"chunk_size: {args.chunk_size}, workers: {args.workers}, prior: {args.prior_path}")
+    prior = load_prior(args.prior_path) if args.prior_path is not None else FLAT_PRIOR
+    start = time.perf_counter()
+    n_rows = run_bulk(args.input_path, args.output_path, args.chunk_size, args.workers, prior)
+    elapsed = time.perf_counter() - start
+    logging.info(f"Processed {n_rows} rows in {elapsed:.2f} seconds ({n_rows / max(elapsed, 1e-9):,.0f} rows per second)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Script for running the A/B test calculator on a file of experiments")
+    parser.add_argument(
+        "input_path",
+        help=f"CSV or Parquet file of experiments, a row per experiment with the columns {BATCH_INPUT_COLUMNS}",
+        type=Path,
+    )
+    parser.add_argument("output_path", help="CSV or Parquet file for the results", type=Path)
+    parser.add_argument("--chunk_size", help="number of rows processed at a time", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", help="number of worker processes", type=int, default=1)
+    parser.add_argument("--prior_path", help="JSON prior fitted by ab_test_priors.py. Defaults to the flat prior",
+                        type=Path)
+    arguments = parser.parse_args()
+    main(arguments)
@@ -1,16 +1,23 @@
+from string import ascii_uppercase
+import pandas as pd
 import streamlit as st
 from bayesian_ab_test_calculator import BayesianABTestCalculator
+from ab_test_planner import ABTestPlanner, BASELINE_GRID, LIFT_GRID, SIZE_GRID
+from segmented_ab_test import run_segmented_test, GROUP_COLUMN, OUTCOME_COLUMN, CTRL_LABEL, TEST_LABEL
+
+# The probability is displayed with a 0.1% resolution, so there is no need for a better accuracy than that
+PROB_ACCURACY = 1e-4
+MAX_GROUPS = 6
+
+
+@st.cache_resource
+def get_planner() -> ABTestPlanner:
+    return ABTestPlanner()
 
 
 def main():
     st.title('Justt ABtest calculator')
     st.write("Recommended amount: at least 10,000 per group.  \nOn that amount, 85% probability is approximately achieved by 3% lift.")
-    # check boxes
-    a_total = st.number_input("Control group (A) total", min_value=0, value=10000)
-    a_won = st.number_input("Control group (A) won", min_value=0, max_value=a_total)
-    b_total = st.number_input("Test group (B) total", min_value=0, value=10000)
-    b_won = st.number_input("Test group (B) won", min_value=0, max_value=b_total)
-
     st.markdown(
         """
         <style>
@@ -26,12 +33,79 @@ def main():
         """,
         unsafe_allow_html=True
     )
-    if st.button("GO!", key="go_button") and a_total is not None and a_won is not None and b_total is not None and b_won is not None:
+    calculator_tab, planner_tab, segments_tab = st.tabs(["Calculator", "Planner", "Segments"])
+    with calculator_tab:
+        calculator()
+    with planner_tab:
+        planner()
+    with segments_tab:
+        segments()
+
+
+def calculator():
+    n_groups = st.number_input("Number of groups", min_value=2, max_value=MAX_GROUPS, value=2)
+    # check boxes
+    a_total = st.number_input("Control group (A) total", min_value=0, value=10000)
+    a_won = st.number_input("Control group (A) won", min_value=0, max_value=a_total)
+    b_total = st.number_input("Test group (B) total", min_value=0, value=10000)
+    b_won = st.number_input("Test group (B) won", min_value=0, max_value=b_total)
+    totals, wons = [a_total, b_total], [a_won, b_won]
+    for name in ascii_uppercase[2:n_groups]:
+        totals.append(st.number_input(f"Test group ({name}) total", min_value=0, value=10000))
+        wons.append(st.number_input(f"Test group ({name}) won", min_value=0, max_value=totals[-1]))
+
+    go = st.button("GO!", key="go_button")
+    if go and n_groups > 2 and None not in totals and None not in wons:
+        df, pairwise, txt = BayesianABTestCalculator.run_multi_test(
+            [total - won for total, won in zip(totals, wons)], wons)
+        st.table(df)
+        st.write(txt)
+        st.write("Probability of each group (row) to be better than each other group (column):")
+        st.table(pairwise.style.format("{:.1%}", na_rep="-"))
+    elif go and n_groups == 2 and a_total is not None and a_won is not None and b_total is not None and b_won is not None:
         a_lost = a_total-a_won
         b_lost = b_total-b_won
-        df, txt = BayesianABTestCalculator.run_test(a_lost, a_won, b_lost, b_won)
+        df, txt, prob_result = BayesianABTestCalculator.run_test(a_lost, a_won, b_lost, b_won, accuracy=PROB_ACCURACY,
+                                                                 return_engine=True)
         st.table(df)
         st.write(txt)
+        st.caption(f"Computed with the {prob_result.engine} engine (error up to {prob_result.error:.1e}).")
+
+
+def planner():
+    baseline = st.number_input("Control group (A) win rate (%)", min_value=float(100 * BASELINE_GRID[0]),
+                               max_value=float(100 * BASELINE_GRID[-1]), value=20.)
+    lift = st.number_input("Expected lift of the test group (B) (%)", min_value=float(100 * LIFT_GRID[0]),
+                           max_value=float(100 * LIFT_GRID[-1]), value=3.)
+    target_prob = st.number_input("Target probability (%)", min_value=50., max_value=99.9, value=85.)
+    if st.button("PLAN!", key="plan_button"):
+        size = get_planner().required_size(baseline / 100, lift / 100, target_prob / 100)
+        if size is None:
+            st.write(f"The target probability requires more than {SIZE_GRID[-1]:,} per group.")
+        else:
+            st.write(f"Required amount: {size:,} per group.")
+
+
+def segments():
+    uploaded_file = st.file_uploader("Outcomes CSV (a row per dispute, with its segments, group and whether it was won)",
+                                     type="csv")
+    if uploaded_file is None:
+        return
+    df = pd.read_csv(uploaded_file)
+    columns = list(df.columns)
+    segment_columns = st.multiselect("Segment columns", columns)
+    group_column = st.selectbox("Group column", columns,
+                                index=columns.index(GROUP_COLUMN) if GROUP_COLUMN in columns else 0)
+    outcome_column = st.selectbox("Won column (True/False or 1/0)", columns,
+                                  index=columns.index(OUTCOME_COLUMN) if OUTCOME_COLUMN in columns else 0)
+    ctrl_label = st.text_input("Control group (A) label", CTRL_LABEL)
+    test_label = st.text_input("Test group (B) label", TEST_LABEL)
+    if st.button("SEGMENT!", key="segments_button") and len(segment_columns) > 0:
+        df[group_column] = df[group_column].astype(str)
+        with st.spinner('Calculating...'):
+            result = run_segmented_test(df, segment_columns, group_column, outcome_column, ctrl_label, test_label)
+        st.dataframe(result)
+        st.download_button("Download", result.to_csv(index=False), file_name="segments_ab_test.csv", mime="text/csv")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,240 @@
+"""
+An HTTP server of the A/B test calculator, for tools calling it programmatically instead of through the streamlit app.
+The requests are coalesced across threads, so run it threaded in a single process, e.g.
+gunicorn --workers 1 --threads 32 'ab_test_http_server:create_app()'
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Tuple
+import logging
+import os
+import queue
+import threading
+import time
+import traceback
+import numpy as np
+from flask import Flask, request, jsonify
+from bayesian_ab_test_calculator import BayesianABTestCalculator, BATCH_INPUT_COLUMNS
+
+# Experiments computed together at most, across the coalesced requests
+MAX_BATCH_SIZE = 2 ** 16
+# How long the first request of a batch waits for concurrent requests to join it
+BATCH_WINDOW_SECONDS = 0.002
+# Number of experiments kept in the LRU cache of results
+CACHE_SIZE = 100_000
+# Experiments allowed in a single request of the batch endpoint
+MAX_REQUEST_EXPERIMENTS = 100_000
+
+Experiment = Tuple[int, int, int, int]
+
+
+class CoalescingCalculator:
+    """
+    Runs the batch A/B test for concurrent callers. The experiments of requests arriving together are computed in a
+    single vectorized BayesianABTestCalculator.run_batch by a background thread, and the results of recent experiments
+    are kept in an LRU cache, so that repeated experiments (e.g. polled by dashboards) are not recomputed.
+    """
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, batch_window: float = BATCH_WINDOW_SECONDS,
+                 cache_size: int = CACHE_SIZE):
+        """
+        Args:
+            max_batch_size (int): Experiments computed together at most. A larger request is still computed whole.
+            batch_window (float): Seconds the first request of a batch waits for concurrent requests
+            cache_size (int): Number of experiments kept in the cache
+        """
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name='ab-test-batcher', daemon=True).start()
+
+    def run_batch(self, experiments: List[Experiment]) -> List[Dict[str, float]]:
+        """
+        Args:
+            experiments (List[Experiment]): The (losses_ctrl, wins_ctrl, losses_test, wins_test) of each experiment
+
+        Returns:
+            List[Dict[str, float]]: The output columns of BayesianABTestCalculator.run_batch for each experiment,
+                without the input columns
+        """
+        results = [None] * len(experiments)
+        missing: Dict[Experiment, List[int]] = {}
+        with self._cache_lock:
+            for i, experiment in enumerate(experiments):
+                result = self._cache.get(experiment)
+                if result is None:
+                    missing.setdefault(experiment, []).append(i)
+                else:
+                    self._cache.move_to_end(experiment)
+                    results[i] = result
+            self.hits += len(experiments) - sum(len(indices) for indices in missing.values())
+            self.misses += len(missing)
+        if missing:
+            future = Future()
+            self._queue.put((list(missing), future))
+            for experiment, result in future.result().items():
+                for i in missing[experiment]:
+                    results[i] = result
+        return results
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            n_experiments = len(items[0][0])
+            deadline = time.monotonic() + self.batch_window
+            while n_experiments < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                items.append(item)
+                n_experiments += len(item[0])
+            try:
+                computed = self._compute(list(dict.fromkeys(e for experiments, _ in items for e in experiments)))
+                for experiments, future in items:
+                    future.set_result({experiment: computed[experiment] for experiment in experiments})
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+
+    def _compute(self, experiments: List[Experiment]) -> Dict[Experiment, Dict[str, float]]:
+        df = BayesianABTestCalculator.run_batch(*np.array(experiments, dtype=np.int64).T)
+        records = df.drop(columns=BATCH_INPUT_COLUMNS).to_dict('records')
+        computed = dict(zip(experiments, records))
+        with self._cache_lock:
+            self._cache.update(computed)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return computed
+
+
+def parse_experiment(data: Dict) -> Experiment:
+    """
+    Raises:
+        ValueError: If a count is missing, not an integer or negative
+    """
+    missing = [col for col in BATCH_INPUT_COLUMNS if col not in data]
+    if missing:
+        raise ValueError(f"Missing fields: {missing}")
+    experiment = tuple(data[col] for col in BATCH_INPUT_COLUMNS)
+    if not all(isinstance(count, int) and not isinstance(count, bool) and count >= 0 for count in experiment):
+        raise ValueError(f"The fields {BATCH_INPUT_COLUMNS} should be non-negative integers")
+    return experiment
+
+
+def require_api_key(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        api_key = request.headers.get('Ab-Test-Server-Api-Key')
+        if api_key and api_key == os.environ.get('AB_TEST_SERVER_API_KEY'):
+            return f(*args, **kwargs)
+        return jsonify({'error': 'Invalid or missing API key'}), 401
+
+    return decorated_function
+
+
+def create_app(calculator: CoalescingCalculator = None) -> Flask:
+    """
+    Create the server, with its file logging. Importing this module starts neither, so that importing
+    CoalescingCalculator (e.g. from the tests) leaves no thread or log file behind.
+
+    Args:
+        calculator (CoalescingCalculator, optional): The calculator serving the requests. If None, a new one is created.
+
+    Returns:
+        Flask: The server
+    """
+    calculator = calculator if calculator is not None else CoalescingCalculator()
+    app = Flask(__name__, static_folder=None)
+
+    # Get the absolute path
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    logs_dir = os.path.join(base_dir, 'logs')
+
+    # Configure logging
+    if not os.path.exists(logs_dir):
+        os.makedirs(logs_dir, mode=0o777, exist_ok=True)
+
+    file_handler = RotatingFileHandler(os.path.join(logs_dir, 'app.log'), maxBytes=10240, backupCount=10)
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+    ))
+    file_handler.setLevel(logging.INFO)
+    app.logger.addHandler(file_handler)
+    app.logger.setLevel(logging.INFO)
+    app.logger.info('Flask server startup')
+
+    @app.errorhandler(Exception)
+    def handle_error(error):
+        app.logger.error(f'An error occurred: {error}\n{traceback.format_exc()}')
+        return jsonify({
+            'error': 'An internal error occurred',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+    @app.route('/health', methods=['GET'])
+    def health_check():
+        return jsonify({
+            'status': 'healthy',
+            'cache_hits': calculator.hits,
+            'cache_misses': calculator.misses,
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    @app.route('/api/run_test', methods=['POST'])
+    @require_api_key
+    def run_test():
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        try:
+            experiment = parse_experiment(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        result = calculator.run_batch([experiment])[0]
+        return jsonify({
+            'result': result,
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    @app.route('/api/run_batch', methods=['POST'])
+    @require_api_key
+    def run_batch():
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        if not isinstance(data.get('experiments'), list):
+            return jsonify({'error': 'Missing experiments field'}), 400
+        if len(data['experiments']) > MAX_REQUEST_EXPERIMENTS:
+            return jsonify({'error': f'At most {MAX_REQUEST_EXPERIMENTS} experiments per request'}), 400
+        try:
+            experiments = [parse_experiment(experiment) for experiment in data['experiments']]
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': str(e)}), 400
+        results = calculator.run_batch(experiments)
+        app.logger.info(f'Processed a batch of {len(experiments)} experiments')
+        return jsonify({
+            'results': results,
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    app.logger.info("Registered Routes:")
+    for rule in app.url_map.iter_rules():
+        app.logger.info(f"{rule.endpoint}: {rule.methods} - {rule.rule}")
+    return app
+
+
+if __name__ == '__main__':
+    # Get port from environment variable or default to 5000
+    port = int(os.environ.get('PORT', 5000))
+
+    # The requests are coalesced across threads, so the server should run threaded in a single process
+    # (e.g. gunicorn --workers 1 --threads 32 'ab_test_http_server:create_app()')
+    create_app().run(host='0.0.0.0', port=port, threaded=True)
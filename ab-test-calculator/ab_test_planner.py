@@ -0,0 +1,164 @@
+from pathlib import Path
+from typing import Optional
+import argparse
+import logging
+import numpy as np
+from scipy.interpolate import RegularGridInterpolator
+from bayesian_ab_test_calculator import BayesianABTestCalculator
+
+PLANNER_CACHE_DIR = Path(__file__).parent / 'planner_cache'
+# Bump when the grid definition or the probability computation changes, to invalidate the cached grids
+PLANNER_GRID_VERSION = 1
+# The accuracy of the probabilities in the grid and the refinement. The targets are typically 80%-95%
+PLANNER_ACCURACY = 1e-3
+# The grid axes: baseline (control) win rate, relative lift of the test group and per-group size
+BASELINE_GRID = np.round(np.arange(0.05, 0.6001, 0.025), 3)
+LIFT_GRID = np.round(np.arange(0.01, 0.3001, 0.01), 3)
+SIZE_GRID = np.unique(np.logspace(2, 7, 51).astype(np.int64))
+
+
+class ABTestPlanner:
+    """
+    Plans the per-group size needed for an A/B test to reach a target probability that the test group (B) is better
+    than the control group (A), given the baseline win rate and the expected lift.
+    The probability of each size is computed for the expected outcome, i.e. with the wins of each group at their
+    expected win rate.
+
+    Queries interpolate a grid of probabilities over (baseline, lift, size), computed offline and cached on disk,
+    to bracket the required size, and refine it by a bisection of exact computations within the bracket.
+
+    Attributes:
+        grid (np.ndarray): The probabilities of the grid, of shape (len(BASELINE_GRID), len(LIFT_GRID), len(SIZE_GRID))
+    """
+    def __init__(self, cache_dir: Path = PLANNER_CACHE_DIR):
+        """
+        Load the probability grid from the cache, or compute and cache it if missing.
+
+        Args:
+            cache_dir (Path): Directory of the cached grid
+        """
+        cache_path = Path(cache_dir) / f'planner_grid_v{PLANNER_GRID_VERSION}.npz'
+        self.grid = self._load_grid(cache_path)
+        if self.grid is None:
+            logging.info(f'Computing the planner grid into {cache_path}...')
+            self.grid = self.compute_grid()
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(cache_path, grid=self.grid, baselines=BASELINE_GRID, lifts=LIFT_GRID, sizes=SIZE_GRID)
+        # interpolates over (baseline, lift), returning the probabilities of all the sizes at once
+        self._interpolator = RegularGridInterpolator((BASELINE_GRID, LIFT_GRID), self.grid)
+
+    @staticmethod
+    def _load_grid(cache_path: Path) -> Optional[np.ndarray]:
+        """
+        Load the cached grid, if it exists and was computed over the current axes.
+
+        Args:
+            cache_path (Path): Path of the cached grid
+
+        Returns:
+            Optional[np.ndarray]: The grid, or None if there is no valid cached grid
+        """
+        if not cache_path.exists():
+            return None
+        with np.load(cache_path) as cached:
+            if not all(np.array_equal(cached[name], axis) for name, axis in
+                       (('baselines', BASELINE_GRID), ('lifts', LIFT_GRID), ('sizes', SIZE_GRID))):
+                logging.info(f'The planner grid at {cache_path} has different axes. Ignoring it.')
+                return None
+            return cached['grid']
+
+    @staticmethod
+    def prob_for_size(baseline: float, lift: float, size: int) -> float:
+        """
+        Compute the probability that the test group is better than the control group, for the expected outcome.
+
+        Args:
+            baseline (float): Win rate of the control group
+            lift (float): Relative lift of the test group's win rate
+            size (int): Number of outcomes per group
+
+        Returns:
+            float: The probability that the test group is better than the control group
+        """
+        wins_ctrl = int(round(baseline * size))
+        wins_test = int(round(min(baseline * (1 + lift), 1) * size))
+        return BayesianABTestCalculator.calc_prob(wins_test + 1, size - wins_test + 1, wins_ctrl + 1,
+                                                  size - wins_ctrl + 1, accuracy=PLANNER_ACCURACY).prob
+
+    @staticmethod
+    def compute_grid() -> np.ndarray:
+        """
+        Compute the probability of every point of the grid.
+
+        Returns:
+            np.ndarray: The probabilities, of shape (len(BASELINE_GRID), len(LIFT_GRID), len(SIZE_GRID))
+        """
+        grid = np.empty((len(BASELINE_GRID), len(LIFT_GRID), len(SIZE_GRID)))
+        for i, baseline in enumerate(BASELINE_GRID):
+            for j, lift in enumerate(LIFT_GRID):
+                for k, size in enumerate(SIZE_GRID):
+                    grid[i, j, k] = ABTestPlanner.prob_for_size(baseline, lift, int(size))
+            logging.info(f'Computed the planner grid for baseline {baseline} ({i + 1}/{len(BASELINE_GRID)})')
+        return grid
+
+    def required_size(self, baseline: float, lift: float, target_prob: float = 0.85) -> Optional[int]:
+        """
+        Find the minimal per-group size for which the test group is better than the control group with the target
+        probability.
+
+        Args:
+            baseline (float): Win rate of the control group
+            lift (float): Relative lift of the test group's win rate
+            target_prob (float): The target probability
+
+        Returns:
+            Optional[int]: The required per-group size, or None if it is beyond the largest size of the grid
+
+        Raises:
+            ValueError: If the baseline or the lift are out of the grid's range
+        """
+        if not BASELINE_GRID[0] <= baseline <= BASELINE_GRID[-1] or not LIFT_GRID[0] <= lift <= LIFT_GRID[-1]:
+            raise ValueError(f"The planner supports baselines in [{BASELINE_GRID[0]}, {BASELINE_GRID[-1]}] "
+                             f"and lifts in [{LIFT_GRID[0]}, {LIFT_GRID[-1]}]")
+        probs = self._interpolator([baseline, lift])[0]
+        above = np.nonzero(probs >= target_prob)[0]
+        if len(above) == 0:
+            return None
+        hi = int(SIZE_GRID[above[0]])
+        lo = int(SIZE_GRID[above[0] - 1]) if above[0] > 0 else 1
+        # the interpolation only brackets the size, as the probabilities are not linear in between the grid points
+        if self.prob_for_size(baseline, lift, lo) >= target_prob:
+            lo = 1
+        while self.prob_for_size(baseline, lift, hi) < target_prob:
+            lo, hi = hi, 2 * hi
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self.prob_for_size(baseline, lift, mid) >= target_prob:
+                hi = mid
+            else:
+                lo = mid
+        return hi
+
+
+def main(args):
+    planner = ABTestPlanner(args.cache_dir)
+    if args.baseline is not None and args.lift is not None:
+        size = planner.required_size(args.baseline, args.lift, args.target_prob)
+        logging.info(f"Required per-group size: {size}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Script for computing the planner grid and/or planning an A/B test")
+    parser.add_argument(
+        "--cache_dir",
+        help="directory of the cached planner grid. The grid is computed if it is missing",
+        type=Path,
+        default=PLANNER_CACHE_DIR
+    )
+    parser.add_argument("--baseline", help="win rate of the control group", type=float)
+    parser.add_argument("--lift", help="relative lift of the test group's win rate", type=float)
+    parser.add_argument("--target_prob", help="the target probability for the test group to be better", type=float,
+                        default=0.85)
+    arguments = parser.parse_args()
+    main(arguments)
@@ -0,0 +1,179 @@
+from pathlib import Path
+from typing import Tuple
+import argparse
+import hashlib
+import json
+import logging
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import betaln, digamma
+from bayesian_ab_test_calculator import BetaPrior, FLAT_PRIOR
+
+PRIORS_CACHE_DIR = Path(__file__).parent / 'priors_cache'
+# Bump when the fitting changes, to invalidate the cached priors
+PRIOR_CACHE_VERSION = 3
+METHOD_MOMENTS = 'moments'
+METHOD_MLE = 'mle'
+METHODS = [METHOD_MOMENTS, METHOD_MLE]
+# Caps the prior's pseudo-count (alpha + beta), so that a prior does not outweigh the data of a reasonable experiment
+MAX_PRIOR_STRENGTH = 1000.
+
+
+def experiments_to_arms(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split a table of past experiments into the wins and losses of each of their arms (control and test).
+
+    Args:
+        df (pd.DataFrame): A row per experiment, with the BATCH_INPUT_COLUMNS columns
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The wins and the losses of every arm
+    """
+    wins = np.concatenate([df['wins_ctrl'].to_numpy(), df['wins_test'].to_numpy()]).astype(np.float64)
+    losses = np.concatenate([df['losses_ctrl'].to_numpy(), df['losses_test'].to_numpy()]).astype(np.float64)
+    return wins, losses
+
+
+def _fit_moments(wins: np.ndarray, totals: np.ndarray) -> BetaPrior:
+    """
+    Method of moments: the spread of the observed win rates, minus the expected binomial noise, is the variance of the
+    prior. Like _fit_mle, falls back to the flat prior if the strength of the prior reaches MAX_PRIOR_STRENGTH, i.e.
+    the win rates show (almost) no spread beyond the noise, or if they are all 0 or all 1.
+    """
+    rates = wins / totals
+    mean = rates.mean()
+    var = rates.var(ddof=1) - mean * (1 - mean) * np.mean(1 / totals)
+    if var <= 0 or mean * (1 - mean) == 0 or mean * (1 - mean) / var - 1 >= MAX_PRIOR_STRENGTH:
+        logging.warning("The past win rates do not vary beyond the sampling noise, falling back to the flat prior")
+        return FLAT_PRIOR
+    strength = max(mean * (1 - mean) / var - 1, 1e-3)
+    return BetaPrior(float(mean * strength), float((1 - mean) * strength))
+
+
+def _fit_mle(wins: np.ndarray, totals: np.ndarray) -> BetaPrior:
+    """
+    Maximum likelihood of the beta-binomial distribution, over (log(alpha), log(beta)), starting from the method of
+    moments. The log-likelihood is sum(betaln(wins + alpha, losses + beta) - betaln(alpha, beta)). Falls back to the
+    flat prior when the likelihood keeps growing with the strength of the prior, i.e. the arms look like draws of a
+    single win rate.
+    """
+    losses = totals - wins
+    initial = _fit_moments(wins, totals)
+    if initial is FLAT_PRIOR:
+        return FLAT_PRIOR
+
+    def negative_log_likelihood(log_params: np.ndarray) -> Tuple[float, np.ndarray]:
+        alpha, beta = np.exp(log_params)
+        likelihood = np.sum(betaln(wins + alpha, losses + beta) - betaln(alpha, beta))
+        common = digamma(alpha + beta) - digamma(totals + alpha + beta)
+        grad_alpha = np.sum(digamma(wins + alpha) - digamma(alpha) + common)
+        grad_beta = np.sum(digamma(losses + beta) - digamma(beta) + common)
+        return -likelihood, -np.array([grad_alpha * alpha, grad_beta * beta])
+
+    result = minimize(negative_log_likelihood, np.log([initial.alpha, initial.beta]), jac=True, method='L-BFGS-B',
+                      bounds=[(None, np.log(MAX_PRIOR_STRENGTH))] * 2)
+    alpha, beta = np.exp(result.x)
+    if max(alpha, beta) >= MAX_PRIOR_STRENGTH * (1 - 1e-6):
+        logging.warning("The past win rates do not vary beyond the sampling noise, falling back to the flat prior")
+        return FLAT_PRIOR
+    if alpha + beta > MAX_PRIOR_STRENGTH:
+        alpha, beta = alpha / (alpha + beta) * MAX_PRIOR_STRENGTH, beta / (alpha + beta) * MAX_PRIOR_STRENGTH
+    return BetaPrior(float(alpha), float(beta))
+
+
+def fit_beta_prior(wins, losses, method: str = METHOD_MOMENTS) -> BetaPrior:
+    """
+    Fit the beta prior of the win rate from the outcomes of past experiment arms (empirical Bayes).
+
+    Args:
+        wins (array-like): Number of wins of each past arm
+        losses (array-like): Number of losses of each past arm
+        method (str): METHOD_MOMENTS for the method of moments, or METHOD_MLE for the maximum likelihood
+
+    Returns:
+        BetaPrior: The fitted prior, or FLAT_PRIOR if the past win rates vary no more than the sampling noise, as the
+            strength of such a prior is unbounded
+
+    Raises:
+        ValueError: If the method is unknown, or there are less than 2 arms with outcomes
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}. Should be one of {METHODS}")
+    wins, losses = np.asarray(wins, dtype=np.float64).ravel(), np.asarray(losses, dtype=np.float64).ravel()
+    totals = wins + losses
+    wins, totals = wins[totals > 0], totals[totals > 0]
+    if len(totals) < 2:
+        raise ValueError(f"Fitting a prior requires at least 2 arms with outcomes, got {len(totals)}")
+    if method == METHOD_MOMENTS:
+        return _fit_moments(wins, totals)
+    return _fit_mle(wins, totals)
+
+
+def fit_beta_prior_cached(wins, losses, method: str = METHOD_MOMENTS, cache_dir: Path = PRIORS_CACHE_DIR) -> BetaPrior:
+    """
+    Same as fit_beta_prior, with the fitted prior cached on disk.
+    The cache key is the hash of PRIOR_CACHE_VERSION, the method and the data.
+
+    Args:
+        wins (array-like): Number of wins of each past arm
+        losses (array-like): Number of losses of each past arm
+        method (str): METHOD_MOMENTS for the method of moments, or METHOD_MLE for the maximum likelihood
+        cache_dir (Path): Directory of the cached priors
+
+    Returns:
+        BetaPrior: The fitted prior
+    """
+    wins, losses = np.asarray(wins, dtype=np.float64).ravel(), np.asarray(losses, dtype=np.float64).ravel()
+    key = hashlib.sha256(f'{PRIOR_CACHE_VERSION}-{method}'.encode() + wins.tobytes() + losses.tobytes()).hexdigest()
+    cache_path = Path(cache_dir) / f'prior_v{PRIOR_CACHE_VERSION}_{key[:16]}.json'
+    if cache_path.exists():
+        return load_prior(cache_path)
+    prior = fit_beta_prior(wins, losses, method)
+    save_prior(prior, cache_path, method=method, n_arms=len(wins))
+    return prior
+
+
+def save_prior(prior: BetaPrior, path: Path, **metadata):
+    """
+    Save a prior as JSON, along with PRIOR_CACHE_VERSION and any other metadata.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'alpha': prior.alpha, 'beta': prior.beta, 'version': PRIOR_CACHE_VERSION, **metadata}, f, indent=2)
+
+
+def load_prior(path: Path) -> BetaPrior:
+    """
+    Load a prior saved by save_prior.
+
+    Raises:
+        ValueError: If the prior was saved by another PRIOR_CACHE_VERSION
+    """
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get('version') != PRIOR_CACHE_VERSION:
+        raise ValueError(f"The prior at {path} is of version {saved.get('version')}, expected {PRIOR_CACHE_VERSION}")
+    return BetaPrior(saved['alpha'], saved['beta'])
+
+
+def main(args):
+    df = pd.read_csv(args.experiments_path)
+    wins, losses = experiments_to_arms(df)
+    prior = fit_beta_prior_cached(wins, losses, args.method, args.cache_dir)
+    logging.info(f"Fitted prior ({args.method}) from {len(df)} experiments: {prior}")
+    if args.output_path is not None:
+        save_prior(prior, args.output_path, method=args.method, n_arms=len(wins))
+        logging.info(f"Prior saved to {args.output_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Script for fitting the beta prior of the win rate from past experiments")
+    parser.add_argument("experiments_path", help="CSV of past experiments, a row per experiment with the columns "
+                                                 "losses_ctrl, wins_ctrl, losses_test, wins_test", type=Path)
+    parser.add_argument("--method", help="fitting method", choices=METHODS, default=METHOD_MOMENTS)
+    parser.add_argument("--cache_dir", help="directory of the cached priors", type=Path, default=PRIORS_CACHE_DIR)
+    parser.add_argument("--output_path", help="JSON file to save the fitted prior to", type=Path)
+    arguments = parser.parse_args()
+    main(arguments)
@@ -1,14 +1,94 @@
 # credit to https://towardsdatascience.com/bayesian-a-b-testing-with-python-the-easy-guide-d638f89e0b8a
+from dataclasses import dataclass
+from functools import lru_cache
 from math import lgamma
-from typing import Tuple
+from string import ascii_uppercase
+from typing import Optional, Sequence, Tuple, Union
+import warnings
 import numpy as np
 import pandas as pd
-from scipy.stats import beta
+from scipy.special import betainc, betaincinv, betaln, digamma, gammaln, polygamma
+from scipy.stats import beta, norm
 
 # Fill in here the losses and wins for each group (ctrl - A/test - B), in case you want to run it locally
 LOSSES_CTRL, WINS_CTRL = 8000, 2000
 LOSSES_TEST, WINS_TEST = 7927, 2073
 
+# Column names used by the batch API, both for its DataFrame input and its output
+BATCH_INPUT_COLUMNS = ['losses_ctrl', 'wins_ctrl', 'losses_test', 'wins_test']
+# Maximal number of series terms (or quadrature nodes) evaluated at once by the batch API. Bounds its memory usage
+# (~8 arrays of this size).
+BATCH_MAX_TERMS = 2 ** 21
+# Default absolute error allowed when truncating the series of the integral (see _g_log_series)
+SERIES_TOLERANCE = 1e-12
+# Default absolute error allowed in the probability by calc_prob and run_test. The probabilities are displayed with a
+# 0.1% resolution, and it lets ENGINE_AUTO use the gaussian approximation from about 250,000 outcomes per group.
+PROB_ACCURACY = 1e-6
+
+# Engines for computing the probability that the test is better than the control (see BayesianABTestCalculator.calc_prob)
+ENGINE_AUTO = 'auto'  # the cheapest of the engines below that meets the requested accuracy
+ENGINE_EXACT = 'exact'  # the full series, iterating over the control's beta parameter (b)
+ENGINE_SERIES = 'series'  # the significant terms of the series, in log space
+ENGINE_SYMMETRIC = 'symmetric'  # the significant terms of the series iterating over the smallest beta parameter
+ENGINE_NORMAL = 'normal'  # gaussian approximation of the beta distributions
+ENGINE_QUADRATURE = 'quadrature'  # numerical integration, for non-integer beta parameters (e.g. informative priors)
+ENGINES = [ENGINE_AUTO, ENGINE_EXACT, ENGINE_SERIES, ENGINE_SYMMETRIC, ENGINE_NORMAL, ENGINE_QUADRATURE]
+# Number of Gauss-Legendre nodes of the quadrature engine. Its error is estimated against half the nodes
+QUADRATURE_NODES = 256
+# The nodes are multiplied by 4 up to this number while the estimated error exceeds the requested accuracy
+QUADRATURE_MAX_NODES = 1024
+
+# Monte Carlo parameters of the multi-variant (A/B/n) test
+MULTI_TEST_DRAWS = 10 ** 6
+MULTI_TEST_CHUNK_SIZE = 2 ** 16  # draws per chunk, bounding the memory regardless of the total number of draws
+MULTI_TEST_SEED = 42
+
+# Monte Carlo parameters of the credible interval of the lift
+LIFT_CI_LEVEL = 0.95
+LIFT_CI_DRAWS = 10 ** 4
+LIFT_CI_SEED = 42
+# From this beta parameter on, the log of a beta variable is close enough to gaussian for a closed form interval
+LIFT_CI_MIN_PARAM = 10
+
+
+@dataclass(frozen=True)
+class BetaPrior:
+    """
+    A beta prior on the win rate of a group. The posterior of a group is beta(wins + alpha, losses + beta).
+
+    Attributes:
+        alpha (float): Prior pseudo-count of wins
+        beta (float): Prior pseudo-count of losses
+    """
+    alpha: float
+    beta: float
+
+
+# The flat prior, beta(1, 1)
+FLAT_PRIOR = BetaPrior(1, 1)
+
+
+@lru_cache(maxsize=None)
+def _legendre_nodes(n: int) -> Tuple[np.ndarray, np.ndarray]:
+    # computing the nodes takes cubic time in their number, much longer than the quadrature itself
+    return np.polynomial.legendre.leggauss(n)
+
+
+@dataclass(frozen=True)
+class ProbResult:
+    """
+    The probability that the test is better than the control, along with the engine that computed it.
+
+    Attributes:
+        prob (float): The probability
+        engine (str): The engine used for computing the probability (one of ENGINES, except ENGINE_AUTO)
+        error (Optional[float]): A bound (or for ENGINE_NORMAL and ENGINE_QUADRATURE, an estimate) of the absolute
+            error. None if unknown.
+    """
+    prob: float
+    engine: str
+    error: Optional[float]
+
 
 class BayesianABTestCalculator:
     @staticmethod
@@ -65,67 +145,565 @@ class BayesianABTestCalculator:
         )
 
     @staticmethod
-    def calc_prob_between(beta_test, beta_control) -> float:
+    def _g0_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of _g0.
+        :param a: np.ndarray
+        :param b: np.ndarray
+        :param c: np.ndarray
+        :return: np.ndarray.
+        """
+        return np.exp(gammaln(a + b) + gammaln(a + c) - (gammaln(a + b + c) + gammaln(a)))
+
+    @staticmethod
+    def _g_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of _g, computing the integral for many experiments at once.
+        The terms of all the experiments' series are laid out in one flat array (experiment after experiment),
+        evaluated in chunks of at most BATCH_MAX_TERMS terms, and summed back per experiment with np.bincount.
+        :param a: np.ndarray
+        :param b: np.ndarray
+        :param c: np.ndarray
+        :param d: np.ndarray of integers.
+        :return: np.ndarray.
+        """
+        a, b, c, d = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64) for x in (a, b, c, d)))
+        a, b, c, d = a.ravel(), b.ravel(), c.ravel(), d.ravel()
+        result = BayesianABTestCalculator._g0_batch(a, b, c)
+        if len(result) == 0:
+            return result
+        # the part of _h that doesn't depend on the series index
+        log_const = gammaln(a + c) + gammaln(a + b) - (gammaln(a) + gammaln(b) + gammaln(c))
+        n_terms = np.maximum(d - 1, 0).astype(np.int64)
+        ends = np.cumsum(n_terms)
+        starts = ends - n_terms
+        for chunk_start in range(0, int(ends[-1]), BATCH_MAX_TERMS):
+            t = np.arange(chunk_start, min(chunk_start + BATCH_MAX_TERMS, int(ends[-1])))
+            rows = np.searchsorted(ends, t, side='right')
+            j = (t - starts[rows] + 1).astype(np.float64)
+            a_r, b_r, c_r = a[rows], b[rows], c[rows]
+            log_terms = log_const[rows] + gammaln(b_r + j) + gammaln(c_r + j) \
+                - (gammaln(j) + gammaln(a_r + b_r + c_r + j) + np.log(j))
+            result += np.bincount(rows, weights=np.exp(log_terms), minlength=len(result))
+        return result
+
+    @staticmethod
+    def _g_log_series(a, b, c, d, tol: float = SERIES_TOLERANCE) -> Tuple[float, float]:
+        """
+        Computes _g in log space, evaluating only the significant terms of the series.
+        The terms h(a, b, c, j) / j are unimodal in j: the ratio between consecutive terms is
+        1 + ((b * c - a - b - c) - j * (a + 1)) / ((j + 1) * (a + b + c + j)), which crosses 1 once.
+        Thus, the terms are built as one array of log-terms, by a cumulative sum of the log-ratios around the peak,
+        and combined with a log-sum-exp. The window around the peak grows until the terms outside of it,
+        each bounded by the term at the window's edge, sum up to less than tol.
+        The window spans about 15 widths of the peak, so at 10^7 counts it may hold up to a million terms and take
+        1-20 ms. The sub-millisecond latency at such counts is met by ENGINE_AUTO, which uses the gaussian
+        approximation there, or this series over the smallest beta parameter (see _g_symmetric).
+        :param a: int
+        :param b: int
+        :param c: int
+        :param d: int
+        :param tol: float. the maximal absolute error allowed due to the truncation of the series.
+        :return: Tuple[float, float]. the integral, clipped to [0, 1], and a bound on its absolute error (truncation and
+        rounding).
+        """
+        g0 = BayesianABTestCalculator._g0(a, b, c)
+        n = int(d) - 1
+        if n <= 0:
+            return g0, 0.
+        s = a + b + c
+        # location and curvature of the peak of the log-terms
+        peak = int(np.clip(np.floor((b * c - s) / (a + 1)) + 1, 1, n))
+        curvature = 1 / (peak + 1) + 1 / (s + peak) - 1 / (b + peak) - 1 / (c + peak)
+        width = 1 / np.sqrt(curvature) if curvature > 0 else n
+        # half a window large enough for a gaussian shaped peak to account for the tolerance
+        half_width = int(np.sqrt(2 * np.log(max(n, 2) / tol)) * width) + 16
+        lo, hi = max(1, peak - half_width), min(n, peak + half_width)
+        while True:
+            j = np.arange(lo, hi, dtype=np.float64)
+            log_ratios = np.log1p(((b * c - s) - j * (a + 1)) / ((j + 1) * (s + j)))
+            log_first = betaln(a + c, b + lo) - betaln(a, b) - betaln(c, lo) - np.log(lo)
+            log_terms = log_first + np.concatenate(([0.], np.cumsum(log_ratios)))
+            log_max = log_terms.max()
+            series = np.exp(log_max) * np.sum(np.exp(log_terms - log_max))
+            # the terms are monotone outside of the window, so each is bounded by the term at the window's edge
+            left_err = (lo - 1) * np.exp(log_terms[0])
+            right_err = (n - hi) * np.exp(log_terms[-1])
+            if left_err + right_err <= tol or (lo == 1 and hi == n):
+                break
+            half_width *= 2
+            if left_err > tol / 2:
+                lo = max(1, peak - half_width)
+            if right_err > tol / 2:
+                hi = min(n, peak + half_width)
+        # the log-gamma values cancel each other, so their rounding errors dominate for large counts
+        log_scale = sum(abs(lgamma(x)) for x in (a + c, b + lo, a + b, c + lo, a, b, c, lo, s + lo))
+        rounding_err = (log_scale + len(log_terms)) * np.finfo(np.float64).eps * (g0 + series)
+        # the rounding errors may push a near-certain probability past 1, which the error bound still accounts for
+        return float(np.clip(g0 + series, 0, 1)), left_err + right_err + rounding_err
+
+    @staticmethod
+    def _g_symmetric(a, b, c, d, tol: float = SERIES_TOLERANCE) -> Tuple[float, float]:
+        """
+        Computes _g with _g_log_series, iterating over the smallest integer of the four beta parameters.
+        Uses the symmetries of the integral, P(X > Y) = 1 - P(Y > X) = P(1 - Y > 1 - X),
+        where X ~ beta(a, b), Y ~ beta(c, d), 1 - X ~ beta(b, a) and 1 - Y ~ beta(d, c).
+        :param a: int
+        :param b: int
+        :param c: int
+        :param d: int
+        :param tol: float. the maximal absolute error allowed due to the truncation of the series.
+        :return: Tuple[float, float]. the integral, and a bound on its absolute error.
+        """
+        smallest = min(p for p in (a, b, c, d) if float(p).is_integer())
+        if smallest == d:
+            return BayesianABTestCalculator._g_log_series(a, b, c, d, tol)
+        if smallest == a:
+            return BayesianABTestCalculator._g_log_series(d, c, b, a, tol)
+        if smallest == b:
+            prob, err = BayesianABTestCalculator._g_log_series(c, d, a, b, tol)
+        else:
+            prob, err = BayesianABTestCalculator._g_log_series(b, a, d, c, tol)
+        return 1 - prob, err
+
+    @staticmethod
+    def _g_normal(a, b, c, d) -> Tuple[float, float]:
+        """
+        Approximates _g by approximating both beta distributions with gaussians. See _g_normal_batch.
+        :param a: float
+        :param b: float
+        :param c: float
+        :param d: float
+        :return: Tuple[float, float]. the integral, and an estimate of its absolute error.
+        """
+        prob, err = BayesianABTestCalculator._g_normal_batch(a, b, c, d)
+        return float(prob[0]), float(err[0])
+
+    @staticmethod
+    def _g_normal_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vectorized version of _g_normal.
+        The error is estimated by the skewness term of the Edgeworth expansion of the difference of the two,
+        plus a term for the higher orders. Both terms are doubled for safety (calibrated against _g_log_series).
+        :param a: np.ndarray
+        :param b: np.ndarray
+        :param c: np.ndarray
+        :param d: np.ndarray
+        :return: Tuple[np.ndarray, np.ndarray]. the integral, and an estimate of its absolute error.
+        """
+        a, b, c, d = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64).ravel() for x in (a, b, c, d)))
+        mean_x, var_x = a / (a + b), a * b / ((a + b) ** 2 * (a + b + 1))
+        mean_y, var_y = c / (c + d), c * d / ((c + d) ** 2 * (c + d + 1))
+        std = np.sqrt(var_x + var_y)
+        # third cumulants of the two beta distributions
+        k3_x = 2 * (b - a) * np.sqrt(a + b + 1) / ((a + b + 2) * np.sqrt(a * b)) * var_x ** 1.5
+        k3_y = 2 * (d - c) * np.sqrt(c + d + 1) / ((c + d + 2) * np.sqrt(c * d)) * var_y ** 1.5
+        skewness = (k3_x - k3_y) / std ** 3
+        err = 2 * (np.abs(skewness) * norm.pdf(0) / 6 + 1 / (8 * np.minimum(np.minimum(a, b), np.minimum(c, d))))
+        return norm.cdf((mean_x - mean_y) / std), err
+
+    @staticmethod
+    def _g_quadrature_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray,
+                            n_nodes: int = QUADRATURE_NODES) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes _g for any (non-integer) beta parameters by Gauss-Legendre integration. See _quadrature_batch.
+        :param a: np.ndarray
+        :param b: np.ndarray
+        :param c: np.ndarray
+        :param d: np.ndarray
+        :param n_nodes: int. number of nodes of the quadrature.
+        :return: Tuple[np.ndarray, np.ndarray]. the integral, and an estimate of its absolute error by the difference
+        from the quadrature with half the nodes.
+        """
+        prob = BayesianABTestCalculator._quadrature_batch(a, b, c, d, n_nodes)
+        return prob, np.abs(prob - BayesianABTestCalculator._quadrature_batch(a, b, c, d, n_nodes // 2))
+
+    @staticmethod
+    def _quadrature_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, n_nodes: int) -> np.ndarray:
+        """
+        Gauss-Legendre integration over the quantiles of the narrower of X ~ beta(a, b) and Y ~ beta(c, d):
+        P(X > Y) = E[F_Y(X)] = E[1 - F_X(Y)].
+        Integrating over the quantiles keeps the integrand bounded, and smooth as long as the other variable is wider.
+        The experiments are integrated in blocks of at most BATCH_MAX_TERMS nodes in total, bounding the memory usage.
+        :param a: np.ndarray
+        :param b: np.ndarray
+        :param c: np.ndarray
+        :param d: np.ndarray
+        :param n_nodes: int. number of nodes of the quadrature.
+        :return: np.ndarray.
+        """
+        a, b, c, d = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64).ravel() for x in (a, b, c, d)))
+        nodes, weights = _legendre_nodes(n_nodes)
+        prob = np.empty(len(a))
+        block_size = max(BATCH_MAX_TERMS // n_nodes, 1)
+        for start in range(0, len(a), block_size):
+            a_r, b_r, c_r, d_r = (x[start:start + block_size, None] for x in (a, b, c, d))
+            over_x = a_r * b_r / ((a_r + b_r) ** 2 * (a_r + b_r + 1)) < c_r * d_r / ((c_r + d_r) ** 2 * (c_r + d_r + 1))
+            quantiles = betaincinv(np.where(over_x, a_r, c_r), np.where(over_x, b_r, d_r), (nodes + 1) / 2)
+            # F_Y at the quantiles of X, or 1 - F_X at the quantiles of Y
+            integrand = np.where(over_x, betainc(c_r, d_r, quantiles), betainc(b_r, a_r, 1 - quantiles))
+            prob[start:start + block_size] = integrand @ (weights / 2)
+        return prob
+
+    @staticmethod
+    def select_engine(a, b, c, d, accuracy: float = PROB_ACCURACY) -> str:
+        """
+        Selects the cheapest engine for computing _g(a, b, c, d) within the requested accuracy.
+        The gaussian approximation is used when its estimated error is within the accuracy (typically huge counts),
+        and otherwise the series iterating over the smallest integer beta parameter. When none of the parameters is an
+        integer (e.g. with informative priors), the quadrature is used. calc_prob falls back to the other engines when
+        the error of the selected one exceeds the accuracy.
+        :param a: int
+        :param b: int
+        :param c: int
+        :param d: int
+        :param accuracy: float. the maximal absolute error allowed.
+        :return: str. one of ENGINES, except ENGINE_AUTO.
+        """
+        _, normal_err = BayesianABTestCalculator._g_normal(a, b, c, d)
+        if normal_err <= accuracy:
+            return ENGINE_NORMAL
+        if any(float(p).is_integer() for p in (a, b, c, d)):
+            return ENGINE_SYMMETRIC
+        return ENGINE_QUADRATURE
+
+    @staticmethod
+    def calc_prob(a, b, c, d, engine: str = ENGINE_AUTO, accuracy: float = PROB_ACCURACY) -> ProbResult:
+        """
+        Returns the probability that beta(a, b) is higher than beta(c, d), i.e. _g(a, b, c, d), using the given engine.
+        :param a: int. the first beta parameter of the test.
+        :param b: int. the second beta parameter of the test.
+        :param c: int. the first beta parameter of the control.
+        :param d: int. the second beta parameter of the control.
+        :param engine: str. one of ENGINES. ENGINE_AUTO selects the cheapest engine meeting the accuracy, and falls
+        back to the other engines when its error exceeds the accuracy. If none meets it, warns and returns the most
+        accurate result.
+        :param accuracy: float. the maximal absolute error allowed.
+        :return: ProbResult. the probability, the engine that computed it and its error.
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}. Should be one of {ENGINES}")
+        if engine == ENGINE_AUTO:
+            selected = BayesianABTestCalculator.select_engine(a, b, c, d, accuracy)
+            has_integer = any(float(p).is_integer() for p in (a, b, c, d))
+            fallbacks = [ENGINE_SYMMETRIC] * has_integer + [ENGINE_QUADRATURE, ENGINE_NORMAL]
+            best = None
+            for engine in [selected] + [fallback for fallback in fallbacks if fallback != selected]:
+                result = BayesianABTestCalculator.calc_prob(a, b, c, d, engine, accuracy)
+                if best is None or result.error < best.error:
+                    best = result
+                if best.error <= accuracy:
+                    return best
+            warnings.warn(f"No engine computes the probability of {(a, b, c, d)} within {accuracy:.1e}. The most "
+                          f"accurate is the {best.engine} engine, with an error of {best.error:.1e}")
+            return best
+        if engine in (ENGINE_EXACT, ENGINE_SERIES) and not float(d).is_integer():
+            raise ValueError(f"The {engine} engine requires an integer d, got {d}")
+        if engine == ENGINE_SYMMETRIC and not any(float(p).is_integer() for p in (a, b, c, d)):
+            raise ValueError(f"The {engine} engine requires an integer beta parameter, got {(a, b, c, d)}")
+        if engine == ENGINE_EXACT:
+            return ProbResult(BayesianABTestCalculator._g(a, b, c, d), engine, None)
+        if engine == ENGINE_SERIES:
+            prob, err = BayesianABTestCalculator._g_log_series(a, b, c, d, accuracy)
+        elif engine == ENGINE_SYMMETRIC:
+            prob, err = BayesianABTestCalculator._g_symmetric(a, b, c, d, accuracy)
+        elif engine == ENGINE_QUADRATURE:
+            n_nodes = QUADRATURE_NODES
+            prob, err = (x[0] for x in BayesianABTestCalculator._g_quadrature_batch(a, b, c, d, n_nodes))
+            while err > accuracy and n_nodes < QUADRATURE_MAX_NODES:
+                n_nodes *= 4
+                prob, err = (x[0] for x in BayesianABTestCalculator._g_quadrature_batch(a, b, c, d, n_nodes))
+        else:
+            prob, err = BayesianABTestCalculator._g_normal(a, b, c, d)
+        return ProbResult(float(prob), engine, float(err))
+
+    @staticmethod
+    def calc_prob_between(beta_test, beta_control, engine: str = ENGINE_AUTO, accuracy: float = PROB_ACCURACY) -> float:
         """
         Returns the probability that the tests' mean is higher that the controls', based on their beta value.
         For more details, see the link at the top of the file.
         :param beta_test: float. the beta value of the test.
         :param beta_control: float. the beta value of the test.
+        :param engine: str. the engine to compute the probability with. See calc_prob.
+        :param accuracy: float. the maximal absolute error allowed.
         :return: float. a probability as described.
         """
-        return BayesianABTestCalculator._g(
+        return BayesianABTestCalculator.calc_prob(
             beta_test.args[0],
             beta_test.args[1],
             beta_control.args[0],
             beta_control.args[1],
-        )
+            engine,
+            accuracy,
+        ).prob
+
+    @staticmethod
+    def _prob_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray) -> np.ndarray:
+        """
+        Vectorized version of _g_symmetric: computes _g with _g_batch, each experiment iterating over its
+        smallest integer beta parameter. Experiments without an integer parameter (e.g. with a fitted prior) are
+        computed with the gaussian approximation when its estimated error is within PROB_ACCURACY, and otherwise with
+        _quadrature_batch.
+        :param a: np.ndarray
+        :param b: np.ndarray
+        :param c: np.ndarray
+        :param d: np.ndarray
+        :return: np.ndarray.
+        """
+        a, b, c, d = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64).ravel() for x in (a, b, c, d)))
+        all_params = np.stack([a, b, c, d])
+        is_integer = all_params == np.floor(all_params)
+        smallest = np.argmin(np.where(is_integer, all_params, np.inf), axis=0)
+        # the formulation of each experiment: 0 - g(a, b, c, d), 1 - g(d, c, b, a), 2 - 1 - g(c, d, a, b), 3 - 1 - g(b, a, d, c)
+        formulation = np.array([1, 2, 3, 0])[smallest]
+        params = np.stack([
+            np.select([formulation == 1, formulation == 2, formulation == 3], [d, c, b], a),
+            np.select([formulation == 1, formulation == 2, formulation == 3], [c, d, a], b),
+            np.select([formulation == 1, formulation == 2, formulation == 3], [b, a, d], c),
+            np.select([formulation == 1, formulation == 2, formulation == 3], [a, b, c], d),
+        ])
+        series = is_integer.any(axis=0)
+        prob = np.empty(len(a))
+        prob[series] = BayesianABTestCalculator._g_batch(*params[:, series])
+        prob[series] = np.where(formulation[series] >= 2, 1 - prob[series], prob[series])
+        normal, normal_err = BayesianABTestCalculator._g_normal_batch(a[~series], b[~series], c[~series], d[~series])
+        quadrature = normal_err > PROB_ACCURACY
+        # the error estimate of _g_quadrature_batch is not needed here, so the quadrature with half the nodes is skipped
+        normal[quadrature] = BayesianABTestCalculator._quadrature_batch(
+            *(x[~series][quadrature] for x in (a, b, c, d)), QUADRATURE_NODES)
+        prob[~series] = normal
+        return prob
+
+    @staticmethod
+    def _expected_loss_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, prob: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Closed form of the expected loss of choosing each arm, where X ~ beta(a, b) is the test, Y ~ beta(c, d) is the
+        control and prob = _g(a, b, c, d) = P(X > Y).
+        E[max(Y - X, 0)] = E[Y * 1{Y > X}] - E[X * 1{Y > X}] = c / (c + d) * (1 - _g(a, b, c + 1, d))
+        - a / (a + b) * (1 - _g(a + 1, b, c, d)), which by the recurrences of _g equals
+        (1 - prob) * (E[Y] - E[X]) + _h(a, b, c, d) * (1 / (a + b) + 1 / (c + d)).
+        E[max(X - Y, 0)] is the same plus E[X] - E[Y].
+        :param a: np.ndarray
+        :param b: np.ndarray
+        :param c: np.ndarray
+        :param d: np.ndarray
+        :param prob: np.ndarray
+        :return: Tuple[np.ndarray, np.ndarray]. the expected loss of choosing the control, and of choosing the test.
+        """
+        a, b, c, d = (np.asarray(x, dtype=np.float64) for x in (a, b, c, d))
+        h = np.exp(betaln(a + c, b + d) - betaln(a, b) - betaln(c, d))
+        mean_x, mean_y = a / (a + b), c / (c + d)
+        loss_test = np.maximum((1 - prob) * (mean_y - mean_x) + h * (1 / (a + b) + 1 / (c + d)), 0)
+        return np.maximum(loss_test + mean_x - mean_y, 0), loss_test
+
+    @staticmethod
+    def _lift_interval_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, level: float = LIFT_CI_LEVEL,
+                             n_draws: int = LIFT_CI_DRAWS, seed: int = LIFT_CI_SEED) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Equal-tailed credible interval of the relative lift X / Y - 1, where X ~ beta(a, b) is the test and
+        Y ~ beta(c, d) is the control.
+        log(X) - log(Y) has the closed form mean and variance psi(a) - psi(a + b) - psi(c) + psi(c + d) and
+        psi'(a) - psi'(a + b) + psi'(c) - psi'(c + d), and is close to gaussian when all the parameters are at least
+        LIFT_CI_MIN_PARAM. Other experiments are sampled, each from its own generator seeded by the seed and its
+        parameters, so that an experiment gets the same interval from run_test and from any batch.
+        :param a: np.ndarray
+        :param b: np.ndarray
+        :param c: np.ndarray
+        :param d: np.ndarray
+        :param level: float. the probability mass inside the interval.
+        :param n_draws: int. number of draws per sampled experiment.
+        :param seed: int. seed of the random generators, for reproducible results.
+        :return: Tuple[np.ndarray, np.ndarray]. the lower and upper bounds of the interval.
+        """
+        a, b, c, d = np.broadcast_arrays(*(np.asarray(x, dtype=np.float64).ravel() for x in (a, b, c, d)))
+        log_mean = digamma(a) - digamma(a + b) - digamma(c) + digamma(c + d)
+        log_std = np.sqrt(polygamma(1, a) - polygamma(1, a + b) + polygamma(1, c) - polygamma(1, c + d))
+        z = norm.ppf((1 + level) / 2)
+        low, high = np.exp(log_mean - z * log_std) - 1, np.exp(log_mean + z * log_std) - 1
+
+        sampled = np.minimum(np.minimum(a, b), np.minimum(c, d)) < LIFT_CI_MIN_PARAM
+        # small counts repeat a lot between experiments, so each distinct experiment is sampled once
+        params, inverse = np.unique(np.stack([a, b, c, d], axis=1)[sampled], axis=0, return_inverse=True)
+        sampled_low, sampled_high = np.empty(len(params)), np.empty(len(params))
+        for row, (a_s, b_s, c_s, d_s) in enumerate(params):
+            # a generator per experiment, seeded by its parameters, so that its interval is the same whichever other
+            # experiments are in the batch
+            rng = np.random.default_rng(np.random.SeedSequence([seed, *params[row].view(np.uint64).tolist()]))
+            lift = rng.beta(a_s, b_s, size=n_draws) / rng.beta(c_s, d_s, size=n_draws) - 1
+            sampled_low[row], sampled_high[row] = np.quantile(lift, [(1 - level) / 2, (1 + level) / 2])
+        low[sampled], high[sampled] = sampled_low[inverse.ravel()], sampled_high[inverse.ravel()]
+        return low, high
 
     @staticmethod
-    def run_test(losses_ctrl: int, wins_ctrl: int, losses_test: int, wins_test: int) -> Tuple[pd.DataFrame, str]:
+    def run_test(losses_ctrl: int, wins_ctrl: int, losses_test: int, wins_test: int, engine: str = ENGINE_AUTO,
+                 accuracy: float = PROB_ACCURACY, return_engine=False, prior: BetaPrior = FLAT_PRIOR) \
+            -> Union[Tuple[pd.DataFrame, str], Tuple[pd.DataFrame, str, ProbResult]]:
         """
         :param losses_ctrl: number of losses for the control group.
         :param wins_ctrl: number of wins for the control group.
         :param losses_test: number of losses for the test group.
         :param wins_test: number of wins for the test group.
-        :return: None. Prints the bottom line of the A/B test.
+        :param engine: the engine to compute the probability with. See calc_prob.
+        :param accuracy: the maximal absolute error allowed in the probability.
+        :param return_engine: if True, returns also the ProbResult of the probability, holding the engine that ran.
+        :param prior: the beta prior of the win rate of both groups. Defaults to the flat prior.
+        :return: the table and the bottom line of the A/B test (and the ProbResult if return_engine is True).
+        The table holds the expected loss of choosing each group, i.e. the expected win rate lost if it is worse.
         """
         # This is the known data: wins & losses for the Control and Test set
         ctrl_winrate = wins_ctrl / (max(wins_ctrl + losses_ctrl, 1))
         test_winrate = wins_test / (max(wins_test + losses_test, 1))
 
         # here we create the Beta functions for the two sets
-        a_C, b_C = wins_ctrl + 1, losses_ctrl + 1
+        a_C, b_C = wins_ctrl + prior.alpha, losses_ctrl + prior.beta
         beta_C = beta(a_C, b_C)
-        a_T, b_T = wins_test + 1, losses_test + 1
+        a_T, b_T = wins_test + prior.alpha, losses_test + prior.beta
         beta_T = beta(a_T, b_T)
 
         # calculating the lift
         lift = (beta_T.mean() - beta_C.mean()) / beta_C.mean()
 
         # calculating the probability for Test to be better than Control
-        prob = BayesianABTestCalculator.calc_prob_between(beta_T, beta_C)
+        prob_result = BayesianABTestCalculator.calc_prob(a_T, b_T, a_C, b_C, engine, accuracy)
+        prob = prob_result.prob
+        expected_loss_ctrl, expected_loss_test = BayesianABTestCalculator._expected_loss_batch(a_T, b_T, a_C, b_C, prob)
+        lift_ci_low, lift_ci_high = BayesianABTestCalculator._lift_interval_batch(a_T, b_T, a_C, b_C)
         df = pd.DataFrame(
                 [
                     [
                         losses_ctrl,
                         wins_ctrl,
                         str(np.around(100 * ctrl_winrate, 2)) + "%",
+                        str(np.around(100 * expected_loss_ctrl, 3)) + "%",
                     ],
                     [
                         losses_test,
                         wins_test,
                         str(np.around(100 * test_winrate, 2)) + "%",
+                        str(np.around(100 * expected_loss_test, 3)) + "%",
                     ],
                 ],
-                columns=["#lost", "#won", "winrate"], index=["A", "B"])
+                columns=["#lost", "#won", "winrate", "expected loss"], index=["A", "B"])
         color = BayesianABTestCalculator._get_color(prob)
         txt = f"The test group (B) lift with respect to the control group (A) is :{color}[{lift * 100:2.2f}%].  \n"
         # better_group = "control group (A)" if ctrl_winrate > test_winrate else "test group (B)"
         txt += f"The test group (B) win rate improvement with respect to the control group (A)" \
                f" is :{color}[{abs(np.around(100 * (ctrl_winrate - test_winrate), 2))}%].  \n"
+        txt += f"The test group (B) lift has a {LIFT_CI_LEVEL:.0%} credible interval of " \
+               f"[{lift_ci_low[0] * 100:2.2f}%, {lift_ci_high[0] * 100:2.2f}%].  \n"
         txt += f"The test group (B) is better than the control group (A) with :{color}[{prob * 100:2.1f}%] probability."
+        if return_engine:
+            return df, txt, prob_result
         return df, txt
 
+    @staticmethod
+    def run_batch(losses_ctrl, wins_ctrl, losses_test, wins_test, prior: BetaPrior = FLAT_PRIOR) -> pd.DataFrame:
+        """
+        Vectorized version of run_test, for running many A/B tests at once (e.g. one per merchant/segment).
+        :param losses_ctrl: array-like. number of losses for the control group of each test.
+        :param wins_ctrl: array-like. number of wins for the control group of each test.
+        :param losses_test: array-like. number of losses for the test group of each test.
+        :param wins_test: array-like. number of wins for the test group of each test.
+        :param prior: the beta prior of the win rate of all the groups. Defaults to the flat prior.
+        :return: pd.DataFrame with a row per test, holding the input counts, the win rates of both groups,
+        the lift and win rate difference of the test group (B) with respect to the control group (A),
+        the probability that the test group is better than the control group, the expected loss of choosing each group
+        and the LIFT_CI_LEVEL credible interval of the lift.
+        """
+        losses_ctrl, wins_ctrl, losses_test, wins_test = np.broadcast_arrays(
+            *(np.asarray(x, dtype=np.int64).ravel() for x in (losses_ctrl, wins_ctrl, losses_test, wins_test)))
+        ctrl_winrate = wins_ctrl / np.maximum(wins_ctrl + losses_ctrl, 1)
+        test_winrate = wins_test / np.maximum(wins_test + losses_test, 1)
+
+        # the Beta parameters of the two sets
+        a_C, b_C = wins_ctrl + prior.alpha, losses_ctrl + prior.beta
+        a_T, b_T = wins_test + prior.alpha, losses_test + prior.beta
+        mean_C = a_C / (a_C + b_C)
+        mean_T = a_T / (a_T + b_T)
+
+        prob = BayesianABTestCalculator._prob_batch(a_T, b_T, a_C, b_C)
+        expected_loss_ctrl, expected_loss_test = BayesianABTestCalculator._expected_loss_batch(a_T, b_T, a_C, b_C, prob)
+        lift_ci_low, lift_ci_high = BayesianABTestCalculator._lift_interval_batch(a_T, b_T, a_C, b_C)
+
+        return pd.DataFrame({
+            'losses_ctrl': losses_ctrl,
+            'wins_ctrl': wins_ctrl,
+            'losses_test': losses_test,
+            'wins_test': wins_test,
+            'ctrl_winrate': ctrl_winrate,
+            'test_winrate': test_winrate,
+            'lift': (mean_T - mean_C) / mean_C,
+            'winrate_diff': test_winrate - ctrl_winrate,
+            'prob': prob,
+            'expected_loss_ctrl': expected_loss_ctrl,
+            'expected_loss_test': expected_loss_test,
+            'lift_ci_low': lift_ci_low,
+            'lift_ci_high': lift_ci_high,
+        })
+
+    @staticmethod
+    def run_batch_df(df: pd.DataFrame, prior: BetaPrior = FLAT_PRIOR) -> pd.DataFrame:
+        """
+        Runs run_batch on a DataFrame with a row per test.
+        :param df: pd.DataFrame containing the BATCH_INPUT_COLUMNS columns.
+        :param prior: the beta prior of the win rate of all the groups. Defaults to the flat prior.
+        :return: pd.DataFrame. the output of run_batch, indexed as the input DataFrame.
+        """
+        missing = [col for col in BATCH_INPUT_COLUMNS if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns for the batch A/B test: {missing}")
+        result = BayesianABTestCalculator.run_batch(*(df[col].to_numpy() for col in BATCH_INPUT_COLUMNS), prior=prior)
+        result.index = df.index
+        return result
+
+    @staticmethod
+    def run_multi_test(losses: Sequence[int], wins: Sequence[int], n_draws: int = MULTI_TEST_DRAWS,
+                       chunk_size: int = MULTI_TEST_CHUNK_SIZE, seed: int = MULTI_TEST_SEED) \
+            -> Tuple[pd.DataFrame, pd.DataFrame, str]:
+        """
+        Multi-variant (A/B/n) version of run_test. The groups are named A, B, C... by their order.
+        The probabilities are estimated by drawing from all the beta posteriors at once, in chunks of chunk_size draws.
+        :param losses: number of losses for each group.
+        :param wins: number of wins for each group.
+        :param n_draws: total number of Monte Carlo draws.
+        :param chunk_size: number of draws held in memory at once.
+        :param seed: seed of the random generator, for reproducible results.
+        :return: the table of the groups with the probability of each to be the best, the pairwise table of the
+        probability of each group (row) to be better than each other group (column), and the bottom line.
+        """
+        if len(losses) != len(wins) or not 2 <= len(wins) <= len(ascii_uppercase):
+            raise ValueError(f"Expected between 2 and {len(ascii_uppercase)} groups, got {len(losses)} losses "
+                             f"and {len(wins)} wins")
+        losses, wins = np.asarray(losses, dtype=np.int64), np.asarray(wins, dtype=np.int64)
+        n_groups = len(wins)
+        names = list(ascii_uppercase[:n_groups])
+        a, b = wins + 1, losses + 1
+
+        rng = np.random.default_rng(seed)
+        best_counts = np.zeros(n_groups, dtype=np.int64)
+        better_counts = np.zeros((n_groups, n_groups), dtype=np.int64)
+        for start in range(0, n_draws, chunk_size):
+            draws = rng.beta(a, b, size=(min(chunk_size, n_draws - start), n_groups))
+            best_counts += np.bincount(draws.argmax(axis=1), minlength=n_groups)
+            better_counts += (draws[:, :, None] > draws[:, None, :]).sum(axis=0)
+        prob_best = best_counts / n_draws
+        prob_better = better_counts / n_draws
+        np.fill_diagonal(prob_better, np.nan)
+        pairwise = pd.DataFrame(prob_better, index=names, columns=names)
+
+        winrate = wins / np.maximum(wins + losses, 1)
+        df = pd.DataFrame({
+            '#lost': losses,
+            '#won': wins,
+            'winrate': [str(np.around(100 * w, 2)) + "%" for w in winrate],
+            'P(best)': [f"{100 * p:2.1f}%" for p in prob_best],
+        }, index=names)
+        best = int(prob_best.argmax())
+        color = BayesianABTestCalculator._get_color(prob_best[best])
+        txt = f"Group {names[best]} is the best group with :{color}[{prob_best[best] * 100:2.1f}%] probability."
+        return df, pairwise, txt
+
     @staticmethod
     def _get_color(prob: float) -> str:
         if prob >= 0.85:
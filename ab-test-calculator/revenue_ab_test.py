@@ -0,0 +1,222 @@
+from dataclasses import dataclass
+from typing import Tuple
+import numpy as np
+import pandas as pd
+from scipy.special import digamma, polygamma
+from bayesian_ab_test_calculator import BayesianABTestCalculator, BetaPrior, FLAT_PRIOR
+from segmented_ab_test import GROUP_COLUMN, OUTCOME_COLUMN, CTRL_LABEL, TEST_LABEL
+
+AMOUNT_COLUMN = 'amount'
+AMOUNT_MODEL_GAMMA = 'gamma'
+AMOUNT_MODEL_LOGNORMAL = 'lognormal'
+AMOUNT_MODELS = [AMOUNT_MODEL_GAMMA, AMOUNT_MODEL_LOGNORMAL]
+REVENUE_DRAWS = 10 ** 6
+REVENUE_CHUNK_SIZE = 2 ** 16  # draws per chunk, bounding the memory regardless of the total number of draws
+REVENUE_SEED = 42
+# disputes per chunk when computing the statistics of an arm, bounding the temporary arrays
+STATISTICS_CHUNK_SIZE = 2 ** 20
+# Caps the gamma shape of amounts with (almost) no spread, for which its estimate diverges
+MAX_GAMMA_SHAPE = 1e12
+
+
+@dataclass(frozen=True)
+class ArmStatistics:
+    """
+    The sufficient statistics of the disputes of an arm, for the beta win rate and the gamma or log-normal amounts.
+    The amount models are fitted on the recovered amounts, i.e. the amounts of the won disputes.
+
+    Attributes:
+        losses (int): Number of lost disputes
+        wins (int): Number of won disputes
+        sum_amount (float): Sum of the amounts of the won disputes
+        sum_log_amount (float): Sum of the log amounts of the won disputes
+        sum_sq_log_amount (float): Sum of the squared log amounts of the won disputes
+    """
+    losses: int
+    wins: int
+    sum_amount: float
+    sum_log_amount: float
+    sum_sq_log_amount: float
+
+
+def arm_statistics(amounts, won, chunk_size: int = STATISTICS_CHUNK_SIZE) -> ArmStatistics:
+    """
+    Compute the sufficient statistics of an arm from its disputes, a chunk of disputes at a time.
+
+    Args:
+        amounts (array-like): The amount of each dispute. Only the amounts of won disputes have to be positive.
+        won (array-like): Whether each dispute was won (boolean or 0/1)
+        chunk_size (int): Number of disputes processed at a time
+
+    Returns:
+        ArmStatistics: The statistics of the arm
+
+    Raises:
+        ValueError: If the amounts and the outcomes differ in length, or a won amount is not positive
+    """
+    amounts, won = np.asarray(amounts), np.asarray(won, dtype=bool)
+    if amounts.shape != won.shape:
+        raise ValueError(f"Got {amounts.shape} amounts and {won.shape} outcomes")
+    wins, sum_amount, sum_log_amount, sum_sq_log_amount = 0, 0., 0., 0.
+    for start in range(0, len(amounts), chunk_size):
+        won_amounts = amounts[start:start + chunk_size][won[start:start + chunk_size]].astype(np.float64)
+        if np.any(won_amounts <= 0):
+            raise ValueError("The amounts of won disputes should be positive")
+        log_amounts = np.log(won_amounts)
+        wins += len(won_amounts)
+        sum_amount += won_amounts.sum()
+        sum_log_amount += log_amounts.sum()
+        sum_sq_log_amount += log_amounts @ log_amounts
+    return ArmStatistics(len(amounts) - wins, wins, sum_amount, sum_log_amount, sum_sq_log_amount)
+
+
+def _gamma_shape(stats: ArmStatistics) -> float:
+    """
+    Maximum likelihood estimate of the gamma shape of the won amounts, by Minka's approximation refined by Newton steps
+    on log(shape) - digamma(shape) = log(mean) - mean(log).
+    """
+    s = max(np.log(stats.sum_amount / stats.wins) - stats.sum_log_amount / stats.wins, 1 / MAX_GAMMA_SHAPE)
+    shape = (3 - s + np.sqrt((s - 3) ** 2 + 24 * s)) / (12 * s)
+    for _ in range(3):
+        shape -= (np.log(shape) - digamma(shape) - s) / (1 / shape - polygamma(1, shape))
+    return min(shape, MAX_GAMMA_SHAPE)
+
+
+def _sample_mean_amount(stats: ArmStatistics, amount_model: str, size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Draw from the posterior of the mean won amount of an arm.
+    The gamma model draws the rate from its conjugate posterior, given the shape at its maximum likelihood estimate.
+    The log-normal model draws the mean and the variance of the log amounts from their normal-inverse-chi-squared
+    posterior, under the non-informative prior.
+    """
+    n = stats.wins
+    if amount_model == AMOUNT_MODEL_GAMMA:
+        shape = _gamma_shape(stats)
+        return shape / rng.gamma(n * shape, 1 / stats.sum_amount, size=size)
+    mean_log = stats.sum_log_amount / n
+    sum_sq_dev = max(stats.sum_sq_log_amount - n * mean_log ** 2, 0.)
+    var_log = sum_sq_dev / rng.chisquare(n - 1, size=size)
+    return np.exp(rng.normal(mean_log, np.sqrt(var_log / n)) + var_log / 2)
+
+
+def run_revenue_test_from_statistics(stats_ctrl: ArmStatistics, stats_test: ArmStatistics,
+                                     amount_model: str = AMOUNT_MODEL_LOGNORMAL, prior: BetaPrior = FLAT_PRIOR,
+                                     n_draws: int = REVENUE_DRAWS, chunk_size: int = REVENUE_CHUNK_SIZE,
+                                     seed: int = REVENUE_SEED) -> Tuple[pd.DataFrame, str]:
+    """
+    Revenue version of BayesianABTestCalculator.run_test, comparing the recovered amount per dispute of the arms.
+    The recovered amount per dispute is the win rate times the mean won amount, each drawn from its posterior.
+    The probability is estimated from n_draws draws of both arms, in chunks of chunk_size draws.
+
+    Args:
+        stats_ctrl (ArmStatistics): The statistics of the control group (A)
+        stats_test (ArmStatistics): The statistics of the test group (B)
+        amount_model (str): The distribution of the won amounts, AMOUNT_MODEL_GAMMA or AMOUNT_MODEL_LOGNORMAL
+        prior (BetaPrior): The beta prior of the win rate of both groups
+        n_draws (int): Total number of Monte Carlo draws
+        chunk_size (int): Number of draws held in memory at once
+        seed (int): Seed of the random generator, for reproducible results
+
+    Returns:
+        Tuple[pd.DataFrame, str]: The table and the bottom line of the A/B test. The table holds the expected loss of
+            choosing each group, i.e. the expected recovered amount per dispute lost if it is worse.
+
+    Raises:
+        ValueError: If the amount model is unknown, or a group has less than 2 wins to fit its amounts
+    """
+    if amount_model not in AMOUNT_MODELS:
+        raise ValueError(f"Unknown amount model: {amount_model}. Should be one of {AMOUNT_MODELS}")
+    if min(stats_ctrl.wins, stats_test.wins) < 2:
+        raise ValueError(f"Fitting the amounts requires at least 2 wins per group, got {stats_ctrl.wins} for the "
+                         f"control group and {stats_test.wins} for the test group")
+    rng = np.random.default_rng(seed)
+    better_count, sum_loss_ctrl, sum_loss_test = 0, 0., 0.
+    for start in range(0, n_draws, chunk_size):
+        size = min(chunk_size, n_draws - start)
+        # with few wins, the log-normal mean is heavy-tailed and may overflow to inf, which still compares correctly
+        with np.errstate(over='ignore', invalid='ignore'):
+            revenue_ctrl = rng.beta(stats_ctrl.wins + prior.alpha, stats_ctrl.losses + prior.beta, size=size) \
+                * _sample_mean_amount(stats_ctrl, amount_model, size, rng)
+            revenue_test = rng.beta(stats_test.wins + prior.alpha, stats_test.losses + prior.beta, size=size) \
+                * _sample_mean_amount(stats_test, amount_model, size, rng)
+            diff = revenue_test - revenue_ctrl
+        better_count += np.count_nonzero(diff > 0)
+        sum_loss_ctrl += np.fmax(diff, 0).sum()
+        sum_loss_test += np.fmax(-diff, 0).sum()
+    prob = better_count / n_draws
+    # the lift of the point estimates, i.e. the posterior mean win rate times the observed mean won amount
+    revenue_ctrl, revenue_test = ((stats.wins + prior.alpha) / (stats.wins + stats.losses + prior.alpha + prior.beta)
+                                  * stats.sum_amount / stats.wins for stats in (stats_ctrl, stats_test))
+    lift = (revenue_test - revenue_ctrl) / revenue_ctrl
+
+    rows = []
+    for stats, expected_loss in ((stats_ctrl, sum_loss_ctrl / n_draws), (stats_test, sum_loss_test / n_draws)):
+        winrate = stats.wins / max(stats.wins + stats.losses, 1)
+        rows.append([
+            stats.losses,
+            stats.wins,
+            str(np.around(100 * winrate, 2)) + "%",
+            f"{stats.sum_amount / stats.wins:,.2f}",
+            f"{stats.sum_amount / (stats.wins + stats.losses):,.2f}",
+            f"{expected_loss:,.3f}",
+        ])
+    df = pd.DataFrame(rows, columns=["#lost", "#won", "winrate", "avg won amount", "recovered per dispute",
+                                     "expected loss"], index=["A", "B"])
+    color = BayesianABTestCalculator._get_color(prob)
+    txt = f"The test group (B) recovered amount lift with respect to the control group (A) is " \
+          f":{color}[{lift * 100:2.2f}%].  \n"
+    txt += f"The test group (B) recovers more per dispute than the control group (A) with " \
+           f":{color}[{prob * 100:2.1f}%] probability."
+    return df, txt
+
+
+def run_revenue_test(amounts_ctrl, won_ctrl, amounts_test, won_test, amount_model: str = AMOUNT_MODEL_LOGNORMAL,
+                     prior: BetaPrior = FLAT_PRIOR, n_draws: int = REVENUE_DRAWS, chunk_size: int = REVENUE_CHUNK_SIZE,
+                     seed: int = REVENUE_SEED) -> Tuple[pd.DataFrame, str]:
+    """
+    Run the revenue A/B test on the disputes of both arms. See run_revenue_test_from_statistics.
+
+    Args:
+        amounts_ctrl (array-like): The amount of each dispute of the control group (A)
+        won_ctrl (array-like): Whether each dispute of the control group was won
+        amounts_test (array-like): The amount of each dispute of the test group (B)
+        won_test (array-like): Whether each dispute of the test group was won
+        amount_model (str): The distribution of the won amounts, AMOUNT_MODEL_GAMMA or AMOUNT_MODEL_LOGNORMAL
+        prior (BetaPrior): The beta prior of the win rate of both groups
+        n_draws (int): Total number of Monte Carlo draws
+        chunk_size (int): Number of draws held in memory at once
+        seed (int): Seed of the random generator, for reproducible results
+
+    Returns:
+        Tuple[pd.DataFrame, str]: The table and the bottom line of the A/B test
+    """
+    return run_revenue_test_from_statistics(arm_statistics(amounts_ctrl, won_ctrl),
+                                            arm_statistics(amounts_test, won_test),
+                                            amount_model, prior, n_draws, chunk_size, seed)
+
+
+def run_revenue_test_df(df: pd.DataFrame, amount_column: str = AMOUNT_COLUMN, group_column: str = GROUP_COLUMN,
+                        outcome_column: str = OUTCOME_COLUMN, ctrl_label=CTRL_LABEL, test_label=TEST_LABEL,
+                        **kwargs) -> Tuple[pd.DataFrame, str]:
+    """
+    Run the revenue A/B test on an outcome-level DataFrame, laid out as for the segmented A/B test.
+
+    Args:
+        df (pd.DataFrame): A row per dispute, with the amount column, the group column and the outcome column
+        amount_column (str): The column holding the amount of each dispute
+        group_column (str): The column holding the group of each dispute
+        outcome_column (str): The column holding whether each dispute was won (boolean or 0/1)
+        ctrl_label: The value of the group column for the control group
+        test_label: The value of the group column for the test group
+        **kwargs: The other arguments of run_revenue_test_from_statistics
+
+    Returns:
+        Tuple[pd.DataFrame, str]: The table and the bottom line of the A/B test
+    """
+    missing = [col for col in (amount_column, group_column, outcome_column) if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns for the revenue A/B test: {missing}")
+    stats = [arm_statistics(df.loc[df[group_column] == label, amount_column].to_numpy(),
+                            df.loc[df[group_column] == label, outcome_column].to_numpy())
+             for label in (ctrl_label, test_label)]
+    return run_revenue_test_from_statistics(*stats, **kwargs)
@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import os
+import numpy as np
+import pandas as pd
+from bayesian_ab_test_calculator import BayesianABTestCalculator, BATCH_INPUT_COLUMNS
+
+# Default layout of the outcome-level DataFrame: a row per dispute, with its group and whether it was won
+GROUP_COLUMN = 'group'
+OUTCOME_COLUMN = 'won'
+CTRL_LABEL = 'A'
+TEST_LABEL = 'B'
+# Below this number of segments per worker, the overhead of a process outweighs the vectorized computation
+MIN_SEGMENTS_PER_WORKER = 5000
+
+
+def aggregate_segments(df: pd.DataFrame, segment_columns: List[str], group_column: str = GROUP_COLUMN,
+                       outcome_column: str = OUTCOME_COLUMN, ctrl_label=CTRL_LABEL, test_label=TEST_LABEL) -> pd.DataFrame:
+    """
+    Aggregate an outcome-level DataFrame into the wins and losses of each group in each segment, with a single group-by.
+
+    Args:
+        df (pd.DataFrame): A row per outcome, with the segment columns, the group column and the outcome column
+        segment_columns (List[str]): The columns defining a segment (e.g. card network, reason code, merchant)
+        group_column (str): The column holding the group of each outcome
+        outcome_column (str): The column holding whether each outcome was won (boolean or 0/1)
+        ctrl_label: The value of the group column for the control group
+        test_label: The value of the group column for the test group
+
+    Returns:
+        pd.DataFrame: A row per segment, indexed by the segment columns, with the BATCH_INPUT_COLUMNS columns.
+            Outcomes of other groups are ignored.
+    """
+    df = df[df[group_column].isin([ctrl_label, test_label])]
+    counts = df.groupby(segment_columns + [group_column], observed=True)[outcome_column].agg(['sum', 'count'])
+    counts = counts.unstack(group_column, fill_value=0)
+    wins = counts['sum'].reindex(columns=[ctrl_label, test_label], fill_value=0).astype(np.int64)
+    totals = counts['count'].reindex(columns=[ctrl_label, test_label], fill_value=0).astype(np.int64)
+    losses = totals - wins
+    return pd.DataFrame({
+        'losses_ctrl': losses[ctrl_label],
+        'wins_ctrl': wins[ctrl_label],
+        'losses_test': losses[test_label],
+        'wins_test': wins[test_label],
+    }, index=counts.index)[BATCH_INPUT_COLUMNS]
+
+
+def run_segmented_test(df: pd.DataFrame, segment_columns: List[str], group_column: str = GROUP_COLUMN,
+                       outcome_column: str = OUTCOME_COLUMN, ctrl_label=CTRL_LABEL, test_label=TEST_LABEL,
+                       n_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    Run the A/B test on each segment of an outcome-level DataFrame.
+    The segments are split between worker processes, each running the batch API on its share.
+
+    Args:
+        df (pd.DataFrame): A row per outcome, with the segment columns, the group column and the outcome column
+        segment_columns (List[str]): The columns defining a segment (e.g. card network, reason code, merchant)
+        group_column (str): The column holding the group of each outcome
+        outcome_column (str): The column holding whether each outcome was won (boolean or 0/1)
+        ctrl_label: The value of the group column for the control group
+        test_label: The value of the group column for the test group
+        n_workers (int, optional): Maximal number of worker processes. Defaults to the number of CPUs.
+
+    Returns:
+        pd.DataFrame: A row per segment, with the segment columns and the output columns of
+            BayesianABTestCalculator.run_batch
+    """
+    missing = [col for col in segment_columns + [group_column, outcome_column] if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns for the segmented A/B test: {missing}")
+    segments = aggregate_segments(df, segment_columns, group_column, outcome_column, ctrl_label, test_label)
+    n_workers = n_workers if n_workers is not None else os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(segments) // MIN_SEGMENTS_PER_WORKER))
+    if n_workers == 1:
+        result = BayesianABTestCalculator.run_batch_df(segments)
+    else:
+        chunks = np.array_split(np.arange(len(segments)), n_workers)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            result = pd.concat(executor.map(BayesianABTestCalculator.run_batch_df,
+                                            [segments.iloc[chunk] for chunk in chunks]))
+    return result.reset_index()
@@ -0,0 +1,148 @@
+from typing import Tuple
+import numpy as np
+from scipy.special import betaln
+from bayesian_ab_test_calculator import BayesianABTestCalculator, ENGINE_SYMMETRIC
+
+
+class StreamingABTest:
+    """
+    A stateful A/B test, updating the probability that the test group (B) is better than the control group (A)
+    as new outcomes arrive, in O(#new outcomes) instead of recomputing it from scratch.
+
+    With X ~ beta(a, b) for the test and Y ~ beta(c, d) for the control, g(a, b, c, d) = P(X > Y) and h(a, b, c, d)
+    as defined in BayesianABTestCalculator, each outcome moves g to one of its neighbours:
+        g(a + 1, b, c, d) = g(a, b, c, d) + h(a, b, c, d) / a    (test win)
+        g(a, b + 1, c, d) = g(a, b, c, d) - h(a, b, c, d) / b    (test loss)
+        g(a, b, c + 1, d) = g(a, b, c, d) - h(a, b, c, d) / c    (control win)
+        g(a, b, c, d + 1) = g(a, b, c, d) + h(a, b, c, d) / d    (control loss)
+    and h moves by a ratio of its parameters. Both are vectorized over a sequence of outcomes with cumulative sums,
+    and resynced with an exact computation every RESYNC_INTERVAL outcomes to bound the accumulated rounding errors.
+
+    Attributes:
+        RESYNC_INTERVAL (int): Number of outcomes after which the probability is recomputed from scratch
+        losses_ctrl (int): Number of losses for the control group so far
+        wins_ctrl (int): Number of wins for the control group so far
+        losses_test (int): Number of losses for the test group so far
+        wins_test (int): Number of wins for the test group so far
+    """
+    RESYNC_INTERVAL = 2 ** 17
+
+    def __init__(self, losses_ctrl: int = 0, wins_ctrl: int = 0, losses_test: int = 0, wins_test: int = 0):
+        """
+        Initialize the streaming test with the outcomes gathered so far.
+
+        Args:
+            losses_ctrl (int): Number of losses for the control group
+            wins_ctrl (int): Number of wins for the control group
+            losses_test (int): Number of losses for the test group
+            wins_test (int): Number of wins for the test group
+        """
+        self.losses_ctrl, self.wins_ctrl, self.losses_test, self.wins_test = losses_ctrl, wins_ctrl, losses_test, wins_test
+        self._prob, self._log_h = self._resync()
+
+    @property
+    def prob(self) -> float:
+        """
+        Returns:
+            float: The probability that the test group (B) is better than the control group (A)
+        """
+        return self._prob
+
+    def _beta_params(self) -> Tuple[int, int, int, int]:
+        """
+        Returns:
+            Tuple[int, int, int, int]: The beta parameters (a, b, c, d) of the test and the control
+        """
+        return self.wins_test + 1, self.losses_test + 1, self.wins_ctrl + 1, self.losses_ctrl + 1
+
+    def _resync(self) -> Tuple[float, float]:
+        """
+        Compute the probability and log(h) of the current counts from scratch.
+
+        Returns:
+            Tuple[float, float]: The probability and log(h(a, b, c, d))
+        """
+        a, b, c, d = self._beta_params()
+        prob = BayesianABTestCalculator.calc_prob(a, b, c, d, engine=ENGINE_SYMMETRIC).prob
+        return prob, betaln(a + c, b + d) - betaln(a, b) - betaln(c, d)
+
+    def update(self, losses_ctrl: int = 0, wins_ctrl: int = 0, losses_test: int = 0, wins_test: int = 0) -> float:
+        """
+        Add new outcomes (e.g. the difference between two polls of the experiment's counters).
+
+        Args:
+            losses_ctrl (int): Number of new losses for the control group
+            wins_ctrl (int): Number of new wins for the control group
+            losses_test (int): Number of new losses for the test group
+            wins_test (int): Number of new wins for the test group
+
+        Returns:
+            float: The updated probability that the test group (B) is better than the control group (A)
+
+        Raises:
+            ValueError: If any of the counts is negative
+        """
+        counts = [losses_ctrl, wins_ctrl, losses_test, wins_test]
+        if min(counts) < 0:
+            raise ValueError(f"Outcome counts can not be negative: {counts}")
+        is_test = np.repeat([False, False, True, True], counts)
+        won = np.repeat([False, True, False, True], counts)
+        self.add_outcomes(is_test, won)
+        return self._prob
+
+    def add_outcomes(self, is_test, won) -> np.ndarray:
+        """
+        Add a sequence of new outcomes, in the order they occurred.
+
+        Args:
+            is_test (array-like): For each outcome, whether it belongs to the test group (otherwise to the control group)
+            won (array-like): For each outcome, whether it was won
+
+        Returns:
+            np.ndarray: The cumulative probability trajectory, i.e. the probability that the test group (B) is better
+                than the control group (A) after each of the outcomes
+        """
+        is_test = np.asarray(is_test, dtype=bool).ravel()
+        won = np.asarray(won, dtype=bool).ravel()
+        if len(is_test) != len(won):
+            raise ValueError(f"Got {len(is_test)} groups for {len(won)} outcomes")
+        trajectory = np.empty(len(won), dtype=np.float64)
+        for start in range(0, len(won), self.RESYNC_INTERVAL):
+            end = min(start + self.RESYNC_INTERVAL, len(won))
+            trajectory[start:end] = self._advance(is_test[start:end], won[start:end])
+            self._prob, self._log_h = self._resync()
+            trajectory[end - 1] = self._prob
+        return trajectory
+
+    def _advance(self, is_test: np.ndarray, won: np.ndarray) -> np.ndarray:
+        """
+        Apply the recurrences of g and h over a sequence of outcomes, and update the counts.
+
+        Args:
+            is_test (np.ndarray): For each outcome, whether it belongs to the test group
+            won (np.ndarray): For each outcome, whether it was won
+
+        Returns:
+            np.ndarray: The probability after each of the outcomes
+        """
+        # one-hot of the beta parameter each outcome increments: a - test win, b - test loss, c - ctrl win, d - ctrl loss
+        steps = np.stack([is_test & won, is_test & ~won, ~is_test & won, ~is_test & ~won]).astype(np.int64)
+        # the beta parameters before each outcome
+        a, b, c, d = (np.array(self._beta_params(), dtype=np.float64)[:, None] + np.cumsum(steps, axis=1) - steps)
+        total = a + b + c + d
+        param = np.select(steps.astype(bool), [a, b, c, d])
+        sign = np.select(steps.astype(bool), [1., -1., -1., 1.])
+        log_ratio = np.select(steps.astype(bool), [
+            np.log((a + c) * (a + b)),
+            np.log((b + d) * (a + b)),
+            np.log((a + c) * (c + d)),
+            np.log((b + d) * (c + d)),
+        ]) - np.log(param * total)
+        # log(h) before each outcome
+        log_h = self._log_h + np.cumsum(log_ratio) - log_ratio
+        trajectory = self._prob + np.cumsum(sign * np.exp(log_h) / param)
+
+        self.wins_test, self.losses_test, self.wins_ctrl, self.losses_ctrl = (
+            count + int(added) for count, added in zip(
+                (self.wins_test, self.losses_test, self.wins_ctrl, self.losses_ctrl), steps.sum(axis=1)))
+        return trajectory
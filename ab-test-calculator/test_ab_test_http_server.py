@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+
+pytest.importorskip('flask')
+from ab_test_http_server import CoalescingCalculator  # noqa: E402
+from bayesian_ab_test_calculator import BayesianABTestCalculator, FLAT_PRIOR  # noqa: E402
+
+# small counts, so that the credible interval of the lift is sampled rather than computed in closed form
+EXPERIMENT = (7, 3, 5, 6)
+OTHER_EXPERIMENTS = [(2, 1, 4, 0), (9, 8, 1, 2), (30, 5, 28, 9), (0, 0, 0, 0)]
+
+
+def test_coalesced_result_matches_single_request():
+    single = CoalescingCalculator(batch_window=0.).run_batch([EXPERIMENT])[0]
+
+    calculator = CoalescingCalculator(batch_window=0.2)
+    with ThreadPoolExecutor(max_workers=len(OTHER_EXPERIMENTS) + 1) as executor:
+        others = [executor.submit(calculator.run_batch, [experiment]) for experiment in OTHER_EXPERIMENTS]
+        coalesced = executor.submit(calculator.run_batch, [EXPERIMENT]).result()[0]
+        for future in others:
+            future.result()
+
+    assert coalesced == single
+
+
+def test_coalesced_result_matches_run_test():
+    coalesced = CoalescingCalculator(batch_window=0.).run_batch(OTHER_EXPERIMENTS + [EXPERIMENT])[-1]
+
+    losses_ctrl, wins_ctrl, losses_test, wins_test = EXPERIMENT
+    _, _, prob_result = BayesianABTestCalculator.run_test(*EXPERIMENT, return_engine=True)
+    # the interval of run_test, which samples the experiment alone
+    low, high = BayesianABTestCalculator._lift_interval_batch(
+        wins_test + FLAT_PRIOR.alpha, losses_test + FLAT_PRIOR.beta, wins_ctrl + FLAT_PRIOR.alpha,
+        losses_ctrl + FLAT_PRIOR.beta)
+
+    assert coalesced['prob'] == pytest.approx(prob_result.prob, abs=1e-9)
+    assert coalesced['lift_ci_low'] == low[0]
+    assert coalesced['lift_ci_high'] == high[0]
+    assert np.isfinite([coalesced['expected_loss_ctrl'], coalesced['expected_loss_test']]).all()
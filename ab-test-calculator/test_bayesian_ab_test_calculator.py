@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from bayesian_ab_test_calculator import BayesianABTestCalculator, ENGINE_NORMAL, ENGINE_QUADRATURE, ENGINE_SERIES, \
+    ENGINE_SYMMETRIC, LIFT_CI_LEVEL, LIFT_CI_MIN_PARAM
+
+# beta parameters (a, b, c, d), small enough for the full series of _g
+SMALL_PARAMS = [(1, 1, 1, 1), (3, 8, 5, 2), (21, 13, 8, 34), (120, 880, 100, 900), (900, 100, 950, 50),
+                (2, 300, 40, 260), (500, 1500, 480, 1520)]
+# beta parameters with non-integers, as with informative priors, of which only some are integers
+PRIOR_PARAMS = [(10.5, 20.3, 12, 19), (7, 3.25, 5.5, 6.75), (130.4, 870.6, 101, 899)]
+# huge counts, where the gaussian approximation is accurate
+LARGE_PARAMS = [(20_000, 80_000, 19_500, 80_500), (2_000_001, 7_999_999, 2_001_000, 7_999_000)]
+
+
+@pytest.mark.parametrize('params', SMALL_PARAMS)
+def test_log_series_matches_full_series(params):
+    expected = BayesianABTestCalculator._g(*params)
+    prob, err = BayesianABTestCalculator._g_log_series(*params)
+    assert abs(prob - expected) <= err + 1e-12
+
+
+@pytest.mark.parametrize('engine', [ENGINE_SERIES, ENGINE_SYMMETRIC, ENGINE_QUADRATURE])
+@pytest.mark.parametrize('params', SMALL_PARAMS)
+def test_engines_match_full_series(params, engine):
+    expected = BayesianABTestCalculator._g(*params)
+    result = BayesianABTestCalculator.calc_prob(*params, engine=engine, accuracy=1e-9)
+    assert result.engine == engine
+    assert result.prob == pytest.approx(expected, abs=max(result.error, 1e-9))
+
+
+@pytest.mark.parametrize('params', SMALL_PARAMS + LARGE_PARAMS)
+def test_normal_within_its_error(params):
+    expected, _ = BayesianABTestCalculator._g_symmetric(*params)
+    result = BayesianABTestCalculator.calc_prob(*params, engine=ENGINE_NORMAL)
+    assert abs(result.prob - expected) <= result.error
+
+
+@pytest.mark.parametrize('params', PRIOR_PARAMS)
+def test_quadrature_matches_symmetric_for_non_integer_params(params):
+    symmetric = BayesianABTestCalculator.calc_prob(*params, engine=ENGINE_SYMMETRIC, accuracy=1e-9)
+    quadrature = BayesianABTestCalculator.calc_prob(*params, engine=ENGINE_QUADRATURE, accuracy=1e-9)
+    assert quadrature.prob == pytest.approx(symmetric.prob, abs=symmetric.error + quadrature.error + 1e-9)
+
+
+def test_auto_meets_the_accuracy():
+    for params in SMALL_PARAMS + PRIOR_PARAMS + LARGE_PARAMS:
+        result = BayesianABTestCalculator.calc_prob(*params)
+        assert result.error <= 1e-6
+
+
+def test_near_certain_probability_is_clipped():
+    prob, _ = BayesianABTestCalculator._g_log_series(5000, 10, 10, 5000)
+    assert 0 <= prob <= 1
+
+
+def test_prob_batch_matches_full_series():
+    a, b, c, d = np.array(SMALL_PARAMS, dtype=np.float64).T
+    expected = [BayesianABTestCalculator._g(*params) for params in SMALL_PARAMS]
+    np.testing.assert_allclose(BayesianABTestCalculator._prob_batch(a, b, c, d), expected, rtol=0, atol=1e-9)
+
+
+def test_prob_batch_matches_calc_prob_for_non_integer_params():
+    a, b, c, d = np.array(PRIOR_PARAMS + [(3.5, 8.5, 5.5, 2.5)], dtype=np.float64).T
+    expected = [BayesianABTestCalculator.calc_prob(*params).prob for params in PRIOR_PARAMS + [(3.5, 8.5, 5.5, 2.5)]]
+    np.testing.assert_allclose(BayesianABTestCalculator._prob_batch(a, b, c, d), expected, rtol=0, atol=1e-6)
+
+
+def test_prob_batch_of_huge_non_integer_params_within_accuracy():
+    params = [(a + 0.5, b + 0.25, c + 0.5, d + 0.25) for a, b, c, d in LARGE_PARAMS]
+    a, b, c, d = np.array(params).T
+    expected = [BayesianABTestCalculator.calc_prob(*row).prob for row in params]
+    np.testing.assert_allclose(BayesianABTestCalculator._prob_batch(a, b, c, d), expected, rtol=0, atol=2e-6)
+
+
+@pytest.mark.parametrize('params', [(LIFT_CI_MIN_PARAM, 40, 12, 35), (120, 880, 100, 900), (2000, 8000, 1900, 8100)])
+def test_closed_form_lift_interval_matches_sampling(params):
+    low, high = BayesianABTestCalculator._lift_interval_batch(*params)
+    a, b, c, d = params
+    rng = np.random.default_rng(0)
+    lift = rng.beta(a, b, size=10 ** 6) / rng.beta(c, d, size=10 ** 6) - 1
+    expected_low, expected_high = np.quantile(lift, [(1 - LIFT_CI_LEVEL) / 2, (1 + LIFT_CI_LEVEL) / 2])
+    width = expected_high - expected_low
+    assert abs(low[0] - expected_low) < 0.03 * width
+    assert abs(high[0] - expected_high) < 0.03 * width
+
+
+def test_lift_interval_is_sampled_below_the_closed_form_threshold():
+    params = np.array([(3, 8, 5, 2), (3, 8, 5, 2), (LIFT_CI_MIN_PARAM - 1, 50, 20, 40)], dtype=np.float64).T
+    low, high = BayesianABTestCalculator._lift_interval_batch(*params)
+    # the same experiment gets the same sampled interval, whichever its position in the batch
+    assert (low[0], high[0]) == (low[1], high[1])
+    single_low, single_high = BayesianABTestCalculator._lift_interval_batch(*params[:, 2:])
+    assert (low[2], high[2]) == (single_low[0], single_high[0])
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from scipy.stats import gamma
+
+from revenue_ab_test import AMOUNT_MODELS, arm_statistics, _gamma_shape, _sample_mean_amount
+
+
+def _disputes(n: int = 10_000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return rng.lognormal(4, 1.2, n), rng.random(n) < 0.3
+
+
+def test_chunked_statistics_match_direct_computation():
+    amounts, won = _disputes()
+    stats = arm_statistics(amounts, won, chunk_size=777)
+
+    log_won = np.log(amounts[won])
+    assert (stats.losses, stats.wins) == (int((~won).sum()), int(won.sum()))
+    assert stats.sum_amount == pytest.approx(amounts[won].sum(), rel=1e-12)
+    assert stats.sum_log_amount == pytest.approx(log_won.sum(), rel=1e-12)
+    assert stats.sum_sq_log_amount == pytest.approx((log_won ** 2).sum(), rel=1e-12)
+
+
+def test_statistics_reject_non_positive_won_amounts():
+    with pytest.raises(ValueError):
+        arm_statistics([10., 0., 5.], [True, True, False])
+
+
+def test_gamma_shape_matches_maximum_likelihood():
+    amounts = np.random.default_rng(1).gamma(2.5, 40., 5000)
+    expected_shape, _, _ = gamma.fit(amounts, floc=0)
+    assert _gamma_shape(arm_statistics(amounts, np.ones(len(amounts), dtype=bool))) == \
+        pytest.approx(expected_shape, rel=1e-6)
+
+
+@pytest.mark.parametrize('amount_model', AMOUNT_MODELS)
+def test_posterior_mean_amount_near_the_observed_mean(amount_model):
+    amounts, won = _disputes(100_000)
+    draws = _sample_mean_amount(arm_statistics(amounts, won), amount_model, 10_000, np.random.default_rng(2))
+    assert np.mean(draws) == pytest.approx(amounts[won].mean(), rel=0.05)
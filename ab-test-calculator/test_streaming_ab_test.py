@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from bayesian_ab_test_calculator import BayesianABTestCalculator
+from streaming_ab_test import StreamingABTest
+
+INITIAL_COUNTS = (40, 12, 37, 15)  # losses_ctrl, wins_ctrl, losses_test, wins_test
+N_OUTCOMES = 3000
+
+
+def _direct_prob(losses_ctrl, wins_ctrl, losses_test, wins_test) -> float:
+    return BayesianABTestCalculator._g(wins_test + 1, losses_test + 1, wins_ctrl + 1, losses_ctrl + 1)
+
+
+def _outcomes(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    is_test = rng.random(N_OUTCOMES) < 0.5
+    won = rng.random(N_OUTCOMES) < np.where(is_test, 0.3, 0.25)
+    return is_test, won
+
+
+@pytest.mark.parametrize('resync_interval', [StreamingABTest.RESYNC_INTERVAL, 97])
+def test_trajectory_matches_direct_computation(resync_interval):
+    is_test, won = _outcomes()
+    streaming = StreamingABTest(*INITIAL_COUNTS)
+    streaming.RESYNC_INTERVAL = resync_interval
+    trajectory = streaming.add_outcomes(is_test, won)
+
+    # the counts after each outcome
+    counts = np.array(INITIAL_COUNTS)[:, None] + np.cumsum(
+        np.stack([~is_test & ~won, ~is_test & won, is_test & ~won, is_test & won]), axis=1)
+    for i in list(range(0, N_OUTCOMES, 250)) + [N_OUTCOMES - 1]:
+        assert trajectory[i] == pytest.approx(_direct_prob(*counts[:, i].tolist()), abs=1e-9)
+    assert (streaming.losses_ctrl, streaming.wins_ctrl, streaming.losses_test, streaming.wins_test) == \
+        tuple(counts[:, -1].tolist())
+    assert streaming.prob == pytest.approx(_direct_prob(*counts[:, -1].tolist()), abs=1e-9)
+
+
+def test_update_matches_direct_computation():
+    streaming = StreamingABTest(*INITIAL_COUNTS)
+    counts = np.array(INITIAL_COUNTS)
+    for new_counts in [(10, 3, 8, 5), (0, 0, 0, 7), (25, 0, 0, 0), (120, 40, 110, 52)]:
+        counts += new_counts
+        assert streaming.update(*new_counts) == pytest.approx(_direct_prob(*counts.tolist()), abs=1e-9)
+
+
+def test_update_rejects_negative_counts():
+    with pytest.raises(ValueError):
+        StreamingABTest().update(losses_ctrl=-1)
@@ -0,0 +1,114 @@
+from typing import Any, List, Optional, Tuple
+import threading
+import time
+import numpy as np
+
+
+class RFPAnswerCache:
+    """
+    An in-memory cache of generated answers, keyed by the dense embedding of the question and the merchant name, to skip
+    the language model for questions nearly identical to ones answered recently for the same merchant.
+    A cached answer is returned for a question whose embedding has a cosine similarity of at least the threshold with the
+    embedding of the cached question. The answers expire after a TTL, and the oldest answers are evicted beyond the size
+    limit. The cache should be cleared when the stored questions and answers change, as the answers depend on them.
+
+    Attributes:
+        SIMILARITY_THRESHOLD (float): Default cosine similarity from which questions are considered the same
+        TTL_SECONDS (float): Default number of seconds an answer is kept
+        MAX_ENTRIES (int): Default number of answers kept at most
+        hits (int): Number of answers served from the cache
+        misses (int): Number of lookups without a cached answer
+    """
+    SIMILARITY_THRESHOLD = 0.95
+    TTL_SECONDS = 3600.
+    MAX_ENTRIES = 2_000
+
+    def __init__(self, similarity_threshold: float = SIMILARITY_THRESHOLD, ttl_seconds: float = TTL_SECONDS,
+                 max_entries: int = MAX_ENTRIES):
+        """
+        Args:
+            similarity_threshold (float): Cosine similarity from which questions are considered the same
+            ttl_seconds (float): Number of seconds an answer is kept
+            max_entries (int): Number of answers kept at most
+        """
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # the entries, oldest first, with the unit-norm embeddings of their questions as the rows of a matrix
+        self._embeddings = np.empty((0, 0), dtype=np.float32)
+        self._merchants: List[Optional[str]] = []
+        self._answers: List[Tuple[str, Any]] = []
+        self._created = np.empty(0)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm > 0 else embedding
+
+    def _evict(self, n_new: int):
+        # the entries are in creation order, so the expired and the oldest ones are at the start
+        n_expired = int(np.searchsorted(self._created, time.time() - self.ttl_seconds, side='right'))
+        n_evicted = max(n_expired, len(self._answers) + n_new - self.max_entries)
+        if n_evicted > 0:
+            self._embeddings = self._embeddings[n_evicted:]
+            del self._merchants[:n_evicted]
+            del self._answers[:n_evicted]
+            self._created = self._created[n_evicted:]
+
+    def get(self, embedding: np.ndarray, merchant_name: Optional[str]) -> Optional[Tuple[str, Any]]:
+        """
+        Args:
+            embedding (np.ndarray): Dense embedding of the question
+            merchant_name (str, optional): Name of the merchant the answer is for
+
+        Returns:
+            Optional[Tuple[str, Any]]: The answer and the prompt of the most similar cached question of the merchant,
+                if similar enough, else None
+        """
+        embedding = self._normalize(embedding)
+        with self._lock:
+            self._evict(0)
+            best = None
+            if self._answers:
+                similarities = self._embeddings @ embedding
+                similarities[[merchant != merchant_name for merchant in self._merchants]] = -np.inf
+                best = int(np.argmax(similarities))
+                if similarities[best] < self.similarity_threshold:
+                    best = None
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._answers[best]
+
+    def put(self, embedding: np.ndarray, merchant_name: Optional[str], answer: str, prompt: Any):
+        """
+        Args:
+            embedding (np.ndarray): Dense embedding of the question
+            merchant_name (str, optional): Name of the merchant the answer is for
+            answer (str): The generated answer
+            prompt (Any): The prompt the answer was generated from
+        """
+        if self.max_entries <= 0:
+            return
+        embedding = self._normalize(embedding)
+        with self._lock:
+            self._evict(1)
+            embeddings = self._embeddings if len(self._answers) else np.empty((0, len(embedding)), dtype=np.float32)
+            self._embeddings = np.vstack([embeddings, embedding[None, :]])
+            self._merchants.append(merchant_name)
+            self._answers.append((answer, prompt))
+            self._created = np.append(self._created, time.time())
+
+    def clear(self):
+        with self._lock:
+            self._embeddings = np.empty((0, 0), dtype=np.float32)
+            self._merchants, self._answers = [], []
+            self._created = np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self._answers)
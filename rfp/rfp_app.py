@@ -1,8 +1,23 @@
+import hashlib
+import itertools
+import pandas as pd
 import streamlit as st
 
+from rfp.rfp_constants import CSV_FORMAT
 from rfp.rfp_filler import RFPFiller
+from rfp.rfp_utils import load_questionnaire
 
-rfp_fil = RFPFiller()
+SINGLE_QUESTION_MODE = 'Single question'
+QUESTIONNAIRE_MODE = 'Questionnaire upload'
+
+
+@st.cache_resource
+def get_rfp_filler() -> RFPFiller:
+    # a single filler for all the sessions and reruns of the app, so that they share its models and caches
+    return RFPFiller()
+
+
+rfp_fil = get_rfp_filler()
 
 
 def main():
@@ -25,18 +40,85 @@ def main():
         unsafe_allow_html=True
     )
     merchant_name = st.text_input("merchant name (optional)", '')
+    mode = st.radio("Mode", [SINGLE_QUESTION_MODE, QUESTIONNAIRE_MODE], horizontal=True)
+    if mode == QUESTIONNAIRE_MODE:
+        fill_questionnaire(merchant_name if merchant_name != '' else "_____")
+        return
     question = st.text_input("Question")
     if st.button("GO!", key="go_button") and question is not None:
         merchant_name = merchant_name if merchant_name != '' else "_____"
-        with st.spinner('Thinking...'):
-            answer, prompt = rfp_fil.answer_question(question, merchant_name, return_prompt=True)
+        try:
+            with st.spinner('Thinking...'):
+                answer_pieces, prompt = rfp_fil.answer_question_stream(question, merchant_name)
+                # the completion request is sent when iterating starts, so the spinner waits for its first piece
+                first_piece = next(answer_pieces, '')
+        except Exception as e:
+            st.error(f"Failed answering the question: {e}")
+            return
 
-        dic = {'Answer': answer, 'System prompt': prompt[0]['content'], 'user prompt': prompt[1]['content']}
+        dic = {'Answer': '', 'System prompt': prompt[0]['content'], 'user prompt': prompt[1]['content']}
         names = list(dic.keys())
         tabs = st.tabs(names)
         for t, name in zip(tabs, names):
             with t:
-                st.write(dic[name])
+                if name != 'Answer':
+                    st.write(dic[name])
+        with tabs[names.index('Answer')]:
+            # the answer is written as it is generated
+            answer_placeholder = st.empty()
+            try:
+                for piece in itertools.chain([first_piece], answer_pieces):
+                    dic['Answer'] += piece
+                    answer_placeholder.write(dic['Answer'])
+            except Exception as e:
+                st.error(f"The answer was interrupted: {e}")
+
+
+def fill_questionnaire(merchant_name: str):
+    """
+    Answer all the questions of an uploaded questionnaire CSV, concurrently, showing the answers as they are ready, and
+    offer the filled questionnaire for download: the uploaded one, with its rows and columns, and the answers in its
+    answer column, added if missing.
+    The filled questionnaire is kept in the session state, as the download reruns the app, keyed by the contents of the
+    file and the merchant name, so that it is not offered for another questionnaire or merchant.
+    """
+    uploaded_file = st.file_uploader(f"Questionnaire CSV, with a {CSV_FORMAT.QUESTION} column and optionally "
+                                     f"{CSV_FORMAT.NUMBER} and {CSV_FORMAT.CATEGORY} columns", type='csv')
+    if uploaded_file is None:
+        return
+    try:
+        questionnaire = pd.read_csv(uploaded_file, dtype=str)
+        questions = load_questionnaire(questionnaire)
+    except ValueError as e:
+        st.error(f"Invalid questionnaire: {e}")
+        return
+    st.write(f"{len(questions)} questions")
+    key = (hashlib.sha256(uploaded_file.getvalue()).hexdigest(), merchant_name)
+    if st.button("GO!", key="fill_button") and len(questions) > 0:
+        filled = questionnaire.copy()
+        if CSV_FORMAT.ANSWER not in filled.columns:
+            filled[CSV_FORMAT.ANSWER] = ''
+        errors = {}
+        progress = st.progress(0., text='Answering...')
+        table = st.empty()
+        for n_answered, (i, answer, error) in enumerate(rfp_fil.answer_questions(
+                questions[CSV_FORMAT.QUESTION].tolist(), merchant_name), start=1):
+            if error is None:
+                filled.loc[questions.index[i], CSV_FORMAT.ANSWER] = answer
+            else:
+                errors[i] = error
+            progress.progress(n_answered / len(questions), text=f'Answered {n_answered}/{len(questions)} questions')
+            table.dataframe(filled, use_container_width=True)
+        st.session_state['filled_questionnaire'] = (key, uploaded_file.name, filled)
+        if errors:
+            st.warning(f"Failed answering {len(errors)} questions: "
+                       f"{', '.join(questions[CSV_FORMAT.NUMBER].iloc[i] for i in sorted(errors))}")
+    elif st.session_state.get('filled_questionnaire', (None,))[0] == key:
+        st.dataframe(st.session_state['filled_questionnaire'][2], use_container_width=True)
+    if st.session_state.get('filled_questionnaire', (None,))[0] == key:
+        _, file_name, filled = st.session_state['filled_questionnaire']
+        st.download_button("Download the filled questionnaire", filled.to_csv(index=False),
+                           file_name=f"filled_{file_name}", mime='text/csv')
 
 
 if __name__ == '__main__':
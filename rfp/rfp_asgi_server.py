@@ -0,0 +1,261 @@
+"""
+The asyncio version of rfp_http_server.py, with the same routes and API key check, to serve hundreds of concurrent
+questions per process: a request waiting for the vector search or the language model holds no thread.
+Run it with an ASGI server, e.g. hypercorn --bind 0.0.0.0:5000 rfp.rfp_asgi_server:app
+"""
+from quart import Quart, Response, request, jsonify
+import io
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+from functools import wraps
+import os
+from datetime import datetime
+import traceback
+import pandas as pd
+from rfp.rfp_async_filler import RFPAsyncFiller
+from rfp.rfp_constants import CSV_FORMAT
+from rfp.rfp_utils import load_questionnaire, questionnaire_from_records
+
+# Questions answered at the same time at most by a request of the questionnaire endpoint
+MAX_CONCURRENT_QUESTIONS = int(os.environ.get('RFP_MAX_CONCURRENT_QUESTIONS', RFPAsyncFiller.MAX_CONCURRENT_QUESTIONS))
+# Questions allowed in a single questionnaire
+MAX_QUESTIONNAIRE_QUESTIONS = 1000
+
+rfp_fil = RFPAsyncFiller(
+    embedding_workers=int(os.environ.get('RFP_EMBEDDING_WORKERS', RFPAsyncFiller.EMBEDDING_WORKERS)),
+    search_workers=int(os.environ.get('RFP_SEARCH_WORKERS', RFPAsyncFiller.SEARCH_WORKERS)),
+    openai_max_connections=int(os.environ.get('RFP_OPENAI_MAX_CONNECTIONS', RFPAsyncFiller.OPENAI_MAX_CONNECTIONS)),
+)
+app = Quart(__name__, static_folder=None)
+
+# Get the absolute path
+base_dir = os.path.dirname(os.path.abspath(__file__))
+logs_dir = os.path.join(base_dir, 'logs')
+
+# Configure logging
+if not os.path.exists(logs_dir):
+    os.makedirs(logs_dir, mode=0o777, exist_ok=True)
+
+file_handler = RotatingFileHandler(os.path.join(logs_dir, 'app.log'), maxBytes=10240, backupCount=10)
+file_handler.setFormatter(logging.Formatter(
+    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+))
+file_handler.setLevel(logging.INFO)
+app.logger.addHandler(file_handler)
+app.logger.setLevel(logging.INFO)
+app.logger.info('Quart server startup')
+
+
+@app.after_serving
+async def close_clients():
+    await rfp_fil.aclose()
+
+
+def require_api_key(f):
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        api_key = request.headers.get('Rfp-Server-Api-Key')
+        if api_key and api_key == os.environ.get('RFP_SERVER_API_KEY'):
+            return await f(*args, **kwargs)
+        return jsonify({'error': 'Invalid or missing API key'}), 401
+
+    return decorated_function
+
+
+@app.errorhandler(Exception)
+async def handle_error(error):
+    app.logger.error(f'An error occurred: {error}\n{traceback.format_exc()}')
+    return jsonify({
+        'error': 'An internal error occurred',
+        'timestamp': datetime.utcnow().isoformat()
+    }), 500
+
+
+@app.route('/health', methods=['GET'])
+async def health_check():
+    answer_cache = rfp_fil.rfp_filler.answer_cache
+    return jsonify({
+        'status': 'healthy',
+        'query_cache': rfp_fil.rfp_filler.rfp_pinecone_embedder.query_cache.stats(),
+        'answer_cache': {'hits': answer_cache.hits, 'misses': answer_cache.misses,
+                         'entries': len(answer_cache)} if answer_cache is not None else None,
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+
+@app.route('/api/get_answer', methods=['POST'])
+@require_api_key
+async def get_answer():
+    try:
+        data = await request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        if 'query' not in data:
+            return jsonify({'error': 'Missing text field'}), 400
+
+        question = data['query']
+        merchant_name = data.get('merchant_name', None)
+        logging.info(f"Received question!\nmerchant name: {merchant_name}.\nQuestion: {question}")
+        answer, prompt = await rfp_fil.answer_question(question, merchant_name)
+        app.logger.info(f"Answer: {answer}")
+        app.logger.info(f"Prompt: {prompt}")
+
+        return jsonify({
+            'answer': answer,
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    except Exception as e:
+        app.logger.error(f'Error processing request: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({
+            'error': 'Error processing request',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+
+@app.route('/api/stream_answer', methods=['POST'])
+@require_api_key
+async def stream_answer():
+    """
+    Streaming version of get_answer, as server-sent events: an event {"token": ...} per piece of the answer as the
+    language model generates it, then a "done" event {"answer": ...} with the whole answer, or an "error" event
+    {"error": ...} if the generation fails. A failure before the generation, e.g. of the vector search, is an error
+    response instead of an event stream.
+    """
+    data = await request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    if 'query' not in data:
+        return jsonify({'error': 'Missing text field'}), 400
+
+    question = data['query']
+    merchant_name = data.get('merchant_name', None)
+    logging.info(f"Received question to stream!\nmerchant name: {merchant_name}.\nQuestion: {question}")
+    try:
+        answer_pieces, prompt = await rfp_fil.answer_question_stream(question, merchant_name)
+    except Exception as e:
+        app.logger.error(f'Error processing request: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({
+            'error': 'Error processing request',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+    app.logger.info(f"Prompt: {prompt}")
+
+    async def generate():
+        answer = ''
+        try:
+            async for piece in answer_pieces:
+                answer += piece
+                yield f"data: {json.dumps({'token': piece})}\n\n"
+        except Exception as e:
+            app.logger.error(f'Error streaming the answer: {str(e)}\n{traceback.format_exc()}')
+            error = {'error': 'Error processing request', 'timestamp': datetime.utcnow().isoformat()}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            return
+        app.logger.info(f"Answer: {answer}")
+        yield f"event: done\ndata: {json.dumps({'answer': answer, 'timestamp': datetime.utcnow().isoformat()})}\n\n"
+
+    # without buffering by proxies, so that the tokens reach the client as they are generated
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/answer_questionnaire', methods=['POST'])
+@require_api_key
+async def answer_questionnaire():
+    """
+    Answer all the questions of a questionnaire, in the CSV_FORMAT layout, given either as a CSV body (content type
+    text/csv, with the merchant name as a query parameter) or as JSON: {"questions": [{"Number": ..., "Category": ...,
+    "Question": ...}, ...], "merchant_name": ...}.
+    The questions are answered concurrently, and each answer is streamed back as an NDJSON line as soon as it is ready:
+    {"Number": ..., "Question": ..., "answer": ...}, or with an "error" field instead of the answer if it failed. If the
+    answering fails altogether, the last line is {"error": ...}, without a question number.
+    """
+    try:
+        if request.mimetype == 'text/csv':
+            df = pd.read_csv(io.StringIO(await request.get_data(as_text=True)), dtype=str)
+            merchant_name = request.args.get('merchant_name', None)
+        else:
+            data = await request.get_json(silent=True)
+            if not data:
+                return jsonify({'error': 'No data provided'}), 400
+            if not isinstance(data.get('questions'), list):
+                return jsonify({'error': 'Missing questions field'}), 400
+            df = questionnaire_from_records(data['questions'])
+            merchant_name = data.get('merchant_name', None)
+        questions = load_questionnaire(df)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'Invalid questionnaire: {e}'}), 400
+    if len(questions) == 0:
+        return jsonify({'error': 'No questions provided'}), 400
+    if len(questions) > MAX_QUESTIONNAIRE_QUESTIONS:
+        return jsonify({'error': f'At most {MAX_QUESTIONNAIRE_QUESTIONS} questions per questionnaire'}), 400
+    app.logger.info(f"Received a questionnaire of {len(questions)} questions. merchant name: {merchant_name}")
+    try:
+        # the questions are embedded before the response starts, so that an error is still a proper error response
+        answers = await rfp_fil.answer_questions(questions[CSV_FORMAT.QUESTION].tolist(), merchant_name,
+                                                 MAX_CONCURRENT_QUESTIONS)
+    except Exception as e:
+        app.logger.error(f'Error processing request: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({
+            'error': 'Error processing request',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+    async def generate():
+        try:
+            async for i, answer, error in answers:
+                result = {CSV_FORMAT.NUMBER: questions[CSV_FORMAT.NUMBER].iloc[i],
+                          CSV_FORMAT.QUESTION: questions[CSV_FORMAT.QUESTION].iloc[i]}
+                result.update({'answer': answer} if error is None else {'error': error})
+                yield json.dumps(result) + '\n'
+        except Exception as e:
+            # the response has started, so the error is its last line, telling the client the answers are missing
+            app.logger.error(f'Error answering the questionnaire: {str(e)}\n{traceback.format_exc()}')
+            yield json.dumps({'error': 'Error processing request', 'timestamp': datetime.utcnow().isoformat()}) + '\n'
+            return
+        app.logger.info(f"Answered a questionnaire of {len(questions)} questions")
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+@app.route('/api/save_answer', methods=['POST'])
+@require_api_key
+async def save_answer():
+    try:
+        data = await request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        if 'question' not in data:
+            return jsonify({'error': 'Missing query field'}), 400
+        if 'answer' not in data:
+            return jsonify({'error': 'Missing answer field'}), 400
+        response = await rfp_fil.save_answer(data['question'], data['answer'])  # should be {'upserted_count': 1}
+
+        app.logger.info(f'Successfully processed request: {response}')
+
+        return jsonify({
+            'pc_response': str(response),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+
+    except Exception as e:
+        app.logger.error(f'Error processing request: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({
+            'error': 'Error processing request',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+
+app.logger.info("Registered Routes:")
+for rule in app.url_map.iter_rules():
+    app.logger.info(f"{rule.endpoint}: {rule.methods} - {rule.rule}")
+
+
+if __name__ == '__main__':
+    # Get port from environment variable or default to 5000
+    port = int(os.environ.get('PORT', 5000))
+
+    # For development. In production, run it with an ASGI server, in a single worker process per pod
+    app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import httpx
+import numpy as np
+from openai import AsyncOpenAI
+from rfp.rfp_filler import RFPFiller
+from rfp.rfp_llm_answerer import RFPLlmAnswerer
+
+
+class RFPAsyncFiller:
+    """
+    The asyncio version of RFPFiller, to answer hundreds of concurrent questions from a single event loop, as the time
+    of a question is mostly spent waiting for the vector search and the language model.
+
+    The language model is called with an AsyncOpenAI client over a pool of HTTP connections, so a question waiting for
+    it holds no thread. The embedding of the questions, CPU-bound, runs in a bounded executor, so that it neither blocks
+    the event loop nor oversubscribes the CPUs. The vector search, a blocking call of the Pinecone client, runs in a
+    separate executor, so that slow searches do not delay the embeddings.
+
+    Attributes:
+        rfp_filler (RFPFiller): The synchronous filler, providing the embedder, the answer cache and the prompts
+        openai_client (AsyncOpenAI): The OpenAI client
+        EMBEDDING_WORKERS (int): Default number of threads embedding questions, one per CPU
+        SEARCH_WORKERS (int): Default number of threads waiting for vector searches
+        OPENAI_MAX_CONNECTIONS (int): Default number of pooled connections to OpenAI
+        OPENAI_TIMEOUT_SECONDS (float): Timeout of the OpenAI requests
+        MAX_CONCURRENT_QUESTIONS (int): Default number of questions of a questionnaire answered concurrently
+    """
+    EMBEDDING_WORKERS = os.cpu_count() or 1
+    SEARCH_WORKERS = 16
+    OPENAI_MAX_CONNECTIONS = 200
+    OPENAI_TIMEOUT_SECONDS = 60.
+    MAX_CONCURRENT_QUESTIONS = 32
+
+    def __init__(self, rfp_filler: RFPFiller = None, openai_api_key: str = None,
+                 embedding_workers: int = EMBEDDING_WORKERS, search_workers: int = SEARCH_WORKERS,
+                 openai_max_connections: int = OPENAI_MAX_CONNECTIONS):
+        """
+        Args:
+            rfp_filler (RFPFiller, optional): The synchronous filler to share the models and the caches of. If None,
+                a new one is created.
+            openai_api_key (str, optional): API key for OpenAI services.
+                If None, will try to use environment variable.
+            embedding_workers (int): Number of threads embedding questions
+            search_workers (int): Number of threads waiting for vector searches
+            openai_max_connections (int): Number of pooled connections to OpenAI, bounding the concurrent requests
+        """
+        self.rfp_filler = rfp_filler if rfp_filler is not None else RFPFiller(openai_api_key=openai_api_key)
+        openai_api_key = openai_api_key if openai_api_key is not None else os.getenv(key='OPENAI_API_KEY')
+        self.openai_client = AsyncOpenAI(api_key=openai_api_key, http_client=httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=openai_max_connections,
+                                max_keepalive_connections=openai_max_connections),
+            timeout=self.OPENAI_TIMEOUT_SECONDS))
+        self._embedding_executor = ThreadPoolExecutor(max_workers=embedding_workers,
+                                                      thread_name_prefix='rfp-embedding')
+        self._search_executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix='rfp-search')
+
+    @staticmethod
+    async def _run(executor: ThreadPoolExecutor, func: Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args))
+
+    async def _prepare(self, question: str, merchant_name: str) \
+            -> Tuple[Optional[np.ndarray], Optional[Tuple[str, List]], Optional[List]]:
+        """
+        Returns:
+            Tuple[Optional[np.ndarray], Optional[Tuple[str, List]], Optional[List]]: The dense embedding of the
+                question, the cached answer and prompt if any, else the prompt messages to generate the answer from
+        """
+        embedder = self.rfp_filler.rfp_pinecone_embedder
+        embedding, cached = await self._run(self._embedding_executor, self.rfp_filler.get_cached_answer, question,
+                                            merchant_name)
+        if cached is not None:
+            return embedding, cached, None
+        if embedding is None:
+            await self._run(self._embedding_executor, embedder.get_query_embedding, question)
+        # the embeddings of the question are in the query cache by now, so the search thread only waits for the index
+        q_a = await self._run(self._search_executor, self.rfp_filler.get_similar_questions, question)
+        return embedding, None, self.rfp_filler.rfp_llm_answerer.build_messages(q_a, question, merchant_name)
+
+    async def answer_question(self, question: str, merchant_name: str = "____") -> Tuple[str, List]:
+        """
+        Asynchronous version of RFPFiller.answer_question.
+
+        Returns:
+            Tuple[str, List]: The answer and the prompt used to generate it
+        """
+        embedding, cached, messages = await self._prepare(question, merchant_name)
+        if cached is not None:
+            return cached
+        completion = await self.openai_client.chat.completions.create(model=RFPLlmAnswerer.MODEL, messages=messages)
+        answer = completion.choices[0].message.content
+        self.rfp_filler.cache_answer(embedding, merchant_name, answer, messages)
+        return answer, messages
+
+    async def answer_question_stream(self, question: str, merchant_name: str = "____") \
+            -> Tuple[AsyncIterator[str], List]:
+        """
+        Asynchronous version of RFPFiller.answer_question_stream.
+
+        Returns:
+            Tuple[AsyncIterator[str], List]: The iterator of the pieces of the answer, and the prompt used to generate it
+        """
+        embedding, cached, messages = await self._prepare(question, merchant_name)
+
+        async def stream_tokens():
+            if cached is not None:
+                yield cached[0]
+                return
+            stream = await self.openai_client.chat.completions.create(model=RFPLlmAnswerer.MODEL, messages=messages,
+                                                                      stream=True)
+            pieces = []
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    pieces.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+            self.rfp_filler.cache_answer(embedding, merchant_name, ''.join(pieces), messages)
+
+        return stream_tokens(), cached[1] if cached is not None else messages
+
+    async def answer_questions(self, questions: List[str], merchant_name: str = "____",
+                               max_concurrent_questions: int = MAX_CONCURRENT_QUESTIONS,
+                               duplicate_similarity_threshold: Optional[float] =
+                               RFPFiller.DUPLICATE_SIMILARITY_THRESHOLD) \
+            -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Asynchronous version of RFPFiller.answer_questions: embeds and groups the questions when awaited, and returns
+        the asynchronous iterator of the answers. Closing the iterator early cancels the questions not answered yet.
+        """
+        groups = await self._run(self._embedding_executor, self.rfp_filler.group_questions, questions,
+                                 duplicate_similarity_threshold)
+        return self._answer_groups(questions, groups, merchant_name, max_concurrent_questions)
+
+    async def _answer_groups(self, questions: List[str], groups: List[List[int]], merchant_name: str,
+                             max_concurrent_questions: int) -> AsyncIterator[Tuple[int, Optional[str], Optional[str]]]:
+        semaphore = asyncio.Semaphore(max_concurrent_questions)
+
+        async def answer_group(group: List[int]) -> str:
+            async with semaphore:
+                answer, _ = await self.answer_question(questions[group[0]], merchant_name)
+                return answer
+
+        tasks = {asyncio.ensure_future(answer_group(group)): group for group in groups}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    group = tasks[task]
+                    try:
+                        answer, error = task.result(), None
+                    except Exception:
+                        logging.exception(f"Failed answering question {group[0]}: {questions[group[0]]}")
+                        answer, error = None, RFPFiller.QUESTION_ERROR
+                    for i in group:
+                        yield i, answer, error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def save_answer(self, question: str, answer: str):
+        """
+        Asynchronous version of RFPFiller.save_answer.
+        """
+        return await self._run(self._search_executor, self.rfp_filler.save_answer, question, answer)
+
+    async def aclose(self):
+        """
+        Close the connections to OpenAI and stop the executors.
+        """
+        await self.openai_client.close()
+        self._embedding_executor.shutdown(wait=False)
+        self._search_executor.shutdown(wait=False)
@@ -0,0 +1,127 @@
+from pathlib import Path
+from typing import Callable, Dict, List, Union
+import hashlib
+import json
+import logging
+import re
+import threading
+import numpy as np
+
+
+class RFPEmbeddingCache:
+    """
+    A persistent on-disk store of dense embeddings, keyed by the model name and the hash of the text.
+    The embeddings of each model are rows of a float32 matrix in a binary file, read through a memory map, with an index
+    file holding the text hash of each row. Both files are only appended to, so the cache can be shared by a single
+    writing process and any number of readers.
+
+    Files of a model, in <cache_dir>/<model name>/:
+        meta.json: The model name, the dimension of the embeddings and the format version
+        embeddings.f32: The embeddings, row after row
+        index.txt: The text hash of each row, a line per row
+
+    Attributes:
+        VERSION (int): Version of the file format. A cache of another version is ignored and rebuilt.
+    """
+    VERSION = 1
+    META_FILE = 'meta.json'
+    EMBEDDINGS_FILE = 'embeddings.f32'
+    INDEX_FILE = 'index.txt'
+
+    def __init__(self, cache_dir: Union[Path, str], model_name: str):
+        """
+        Open the cache of a model, creating its directory if missing.
+
+        Args:
+            cache_dir (Union[Path, str]): Root directory of the cache, shared by all the models
+            model_name (str): Name of the embedding model
+        """
+        self.model_name = model_name
+        self.dir = Path(cache_dir) / re.sub(r'[^\w.-]', '_', model_name)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = None
+        self._rows: Dict[str, int] = {}
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        meta_path = self.dir / self.META_FILE
+        if not meta_path.exists():
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('version') != self.VERSION or meta.get('model') != self.model_name:
+            logging.info(f"The embedding cache at {self.dir} is of another version or model. Rebuilding it.")
+            for file_name in (self.META_FILE, self.EMBEDDINGS_FILE, self.INDEX_FILE):
+                (self.dir / file_name).unlink(missing_ok=True)
+            return
+        self.dim = meta['dim']
+        index = (self.dir / self.INDEX_FILE).read_text() if (self.dir / self.INDEX_FILE).exists() else ''
+        hashes = index.split('\n')[:-1]  # without the last line, which is empty unless its write was interrupted
+        embeddings_path = self.dir / self.EMBEDDINGS_FILE
+        embeddings_size = embeddings_path.stat().st_size if embeddings_path.exists() else 0
+        n_rows = min(len(hashes), embeddings_size // (4 * self.dim))
+        # an interrupted write leaves more rows in one of the files, which are dropped to keep them aligned
+        if n_rows < len(hashes) or not index.endswith('\n') and index or embeddings_size != 4 * self.dim * n_rows:
+            logging.info(f"Truncating the embedding cache at {self.dir} to its {n_rows} complete rows")
+            hashes = hashes[:n_rows]
+            (self.dir / self.INDEX_FILE).write_text(''.join(f'{text_hash}\n' for text_hash in hashes))
+            with open(embeddings_path, 'ab') as f:
+                f.truncate(4 * self.dim * n_rows)
+        self._rows = {text_hash: row for row, text_hash in enumerate(hashes)}
+        self._map_vectors()
+        logging.info(f"Loaded {n_rows} cached embeddings of {self.model_name}")
+
+    def _map_vectors(self):
+        n_rows = len(self._rows)
+        if n_rows > 0:
+            self._vectors = np.memmap(self.dir / self.EMBEDDINGS_FILE, dtype=np.float32, mode='r',
+                                      shape=(n_rows, self.dim))
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_or_compute(self, texts: List[str], compute: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Get the embeddings of texts from the cache, computing and storing only the missing ones.
+
+        Args:
+            texts (List[str]): The texts
+            compute (Callable[[List[str]], np.ndarray]): Computes the embeddings of a list of texts, as a 2D array
+
+        Returns:
+            np.ndarray: The float32 embeddings of the texts, a row per text
+        """
+        hashes = [self.text_hash(text) for text in texts]
+        with self._lock:
+            missing = list(dict.fromkeys(h for h in hashes if h not in self._rows))
+        if missing:
+            missing_texts = {text_hash: text for text_hash, text in zip(hashes, texts)}
+            computed = np.asarray(compute([missing_texts[h] for h in missing]), dtype=np.float32)
+            self._append(missing, computed)
+        with self._lock:
+            return np.array(self._vectors[[self._rows[h] for h in hashes]]) if hashes \
+                else np.empty((0, self.dim or 0), dtype=np.float32)
+
+    def _append(self, hashes: List[str], vectors: np.ndarray):
+        with self._lock:
+            new = [i for i, text_hash in enumerate(hashes) if text_hash not in self._rows]
+            if not new:
+                return
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.dir / self.META_FILE, 'w') as f:
+                    json.dump({'model': self.model_name, 'dim': self.dim, 'version': self.VERSION}, f)
+            # the embeddings are written before the index, so an interrupted write is detected and dropped on load
+            with open(self.dir / self.EMBEDDINGS_FILE, 'ab') as f:
+                f.write(np.ascontiguousarray(vectors[new], dtype=np.float32).tobytes())
+            with open(self.dir / self.INDEX_FILE, 'a') as f:
+                f.write(''.join(f'{hashes[i]}\n' for i in new))
+            for i in new:
+                self._rows[hashes[i]] = len(self._rows)
+            self._map_vectors()
@@ -1,4 +1,8 @@
-from typing import List, Dict, Any, Union, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterator, Optional, Union, Tuple
+import logging
+import numpy as np
+from rfp.rfp_answer_cache import RFPAnswerCache
 from rfp.rfp_pinecone_embedder import RFPPinceconeEmbedder
 from rfp.rfp_llm_answerer import RFPLlmAnswerer
 
@@ -14,8 +18,20 @@ class RFPFiller:
     Attributes:
         rfp_pinecone_embedder (RFPPinceconeEmbedder): Component for vector similarity search
         rfp_llm_answerer (RFPLlmAnswerer): Component for language model-based answer generation
+        answer_cache (RFPAnswerCache): Recently generated answers, reused for nearly identical questions of the same
+            merchant. None if disabled.
+        MAX_CONCURRENT_QUESTIONS (int): Default number of questions of a questionnaire answered concurrently
+        DUPLICATE_SIMILARITY_THRESHOLD (float): Default cosine similarity from which questions of a questionnaire are
+            answered once
+        QUESTION_ERROR (str): Error given for a question of a questionnaire that failed, the exception being only logged
+            so that its details do not reach the clients
     """
-    def __init__(self, pinecone_api_key: str = None, pinecone_rfp_index: str = None, openai_api_key: str = None):
+    MAX_CONCURRENT_QUESTIONS = 8
+    DUPLICATE_SIMILARITY_THRESHOLD = RFPAnswerCache.SIMILARITY_THRESHOLD
+    QUESTION_ERROR = 'Error processing request'
+
+    def __init__(self, pinecone_api_key: str = None, pinecone_rfp_index: str = None, openai_api_key: str = None,
+                 use_answer_cache: bool = True):
         """
         Initialize the RFP Filler with necessary API keys and components.
 
@@ -26,9 +42,12 @@ class RFPFiller:
                 If None, will try to use environment variable.
             openai_api_key (str, optional): API key for OpenAI services.
                 If None, will try to use environment variable.
+            use_answer_cache (bool, optional): Whether to reuse the answers of nearly identical questions answered
+                recently for the same merchant, instead of calling the language model. Defaults to True.
         """
         self.rfp_pinecone_embedder = RFPPinceconeEmbedder(pinecone_api_key, pinecone_rfp_index)
         self.rfp_llm_answerer = RFPLlmAnswerer(openai_api_key)
+        self.answer_cache = RFPAnswerCache() if use_answer_cache else None
 
     def answer_question(self, question: str, merchant_name: str = "____", return_prompt=False) -> Union[str, Tuple[str, List]]:
         """
@@ -38,6 +57,8 @@ class RFPFiller:
         1. Finding similar previous questions using vector similarity search
         2. Using these similar Q&A pairs as context for the language model
         3. Generating a new, contextually appropriate answer
+        A nearly identical question answered recently for the same merchant is answered from the answer cache
+        instead, with the answer and the prompt of that question.
 
         Args:
             question (str): The RFP question to be answered
@@ -51,7 +72,180 @@ class RFPFiller:
                 generated answer as a string. If return_prompt is True, returns a tuple
                 containing the generated answer and the prompt used to generate it.
         """
+        embedding, cached = self.get_cached_answer(question, merchant_name)
+        if cached is None:
+            q_a = self.get_similar_questions(question)
+            cached = self.rfp_llm_answerer.generate_answer(q_a, question, merchant_name, return_prompt=True)
+            self.cache_answer(embedding, merchant_name, *cached)
+        answer, prompt = cached
+        return (answer, prompt) if return_prompt else answer
+
+    def get_cached_answer(self, question: str, merchant_name: str) \
+            -> Tuple[Optional[np.ndarray], Optional[Tuple[str, List]]]:
+        """
+        Look up the answer cache, the first step of answering a question.
+
+        Returns:
+            Tuple[Optional[np.ndarray], Optional[Tuple[str, List]]]: The dense embedding of the question, and the
+                cached answer and prompt of a nearly identical question. Both None if the answer cache is disabled.
+        """
+        if self.answer_cache is None:
+            return None, None
+        embedding = self.rfp_pinecone_embedder.get_query_embedding(question)
+        cached = self.answer_cache.get(embedding, merchant_name)
+        if cached is not None:
+            logging.info(f"Answered from the answer cache: {question}")
+        return embedding, cached
+
+    def get_similar_questions(self, question: str) -> List[Dict[str, str]]:
+        """
+        Find the previous Q&A pairs of the questions most similar to a question, the context of its answer.
+        """
         similar_questions_matches: List[Dict[str, Any]] = self.rfp_pinecone_embedder.get_matches(question)
-        q_a: List[Dict[str, str]] = [m['metadata'] for m in similar_questions_matches]
-        response = self.rfp_llm_answerer.generate_answer(q_a, question, merchant_name, return_prompt=return_prompt)
+        return [m['metadata'] for m in similar_questions_matches]
+
+    def cache_answer(self, embedding: Optional[np.ndarray], merchant_name: str, answer: str, prompt: List):
+        """
+        Add a generated answer to the answer cache, if enabled.
+        """
+        if self.answer_cache is not None:
+            self.answer_cache.put(embedding, merchant_name, answer, prompt)
+
+    def answer_question_stream(self, question: str, merchant_name: str = "____") -> Tuple[Iterator[str], List]:
+        """
+        Streaming version of answer_question, giving the answer piece by piece as the language model generates it.
+        An answer from the answer cache is given whole, and a generated answer is added to the cache once fully given.
+
+        Args:
+            question (str): The RFP question to be answered
+            merchant_name (str, optional): Name of the merchant to be used in the answer.
+                Defaults to "____".
+
+        Returns:
+            Tuple[Iterator[str], List]: The iterator of the pieces of the answer, and the prompt used to generate it
+        """
+        embedding, cached = self.get_cached_answer(question, merchant_name)
+        if cached is not None:
+            answer, prompt = cached
+            return iter([answer]), prompt
+        q_a = self.get_similar_questions(question)
+        tokens, prompt = self.rfp_llm_answerer.generate_answer_stream(q_a, question, merchant_name)
+
+        def cache_when_done():
+            pieces = []
+            for piece in tokens:
+                pieces.append(piece)
+                yield piece
+            self.cache_answer(embedding, merchant_name, ''.join(pieces), prompt)
+
+        return cache_when_done(), prompt
+
+    def save_answer(self, question: str, answer: str):
+        """
+        Store a question and its answer as a previous Q&A pair, and flush the answer cache, as its answers may have
+        been different with the new pair.
+
+        Args:
+            question (str): The question text
+            answer (str): The answer text
+
+        Returns:
+            dict: Vector index upsert response
+        """
+        response = self.rfp_pinecone_embedder.upsert_question(question, answer)
+        if self.answer_cache is not None:
+            self.answer_cache.clear()
         return response
+
+    def answer_questions(self, questions: List[str], merchant_name: str = "____",
+                         max_concurrent_questions: int = MAX_CONCURRENT_QUESTIONS,
+                         duplicate_similarity_threshold: Optional[float] = DUPLICATE_SIMILARITY_THRESHOLD) \
+            -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        """
+        Answer the questions of a questionnaire concurrently, as the time of a question is mostly spent waiting for the
+        vector search and the language model.
+        The questions are first embedded together and grouped with their near-duplicates, as questionnaires ask the
+        same questions in several sections, and only the first question of each group is answered, its answer being
+        given to the whole group.
+
+        Args:
+            questions (List[str]): The RFP questions to be answered
+            merchant_name (str, optional): Name of the merchant to be used in the answers. Defaults to "____".
+            max_concurrent_questions (int, optional): Number of questions answered at the same time at most.
+                Defaults to MAX_CONCURRENT_QUESTIONS.
+            duplicate_similarity_threshold (float, optional): Cosine similarity of the dense embeddings from which
+                questions are answered once. If None, every question is answered. Defaults to
+                DUPLICATE_SIMILARITY_THRESHOLD.
+
+        Returns:
+            Iterator[Tuple[int, Optional[str], Optional[str]]]: The index of each question, its answer and
+                QUESTION_ERROR if it failed (None if answered), in the order the answers are ready. Closing the
+                iterator early cancels the questions not started yet.
+
+        Raises:
+            Exception: The errors of embedding the questions, raised by this call rather than by the iterator, so
+                that they are known before any answer is given
+        """
+        groups = self.group_questions(questions, duplicate_similarity_threshold)
+        return self._answer_groups(questions, groups, merchant_name, max_concurrent_questions)
+
+    def _answer_groups(self, questions: List[str], groups: List[List[int]], merchant_name: str,
+                       max_concurrent_questions: int) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+        executor = ThreadPoolExecutor(max_workers=max_concurrent_questions, thread_name_prefix='rfp-question')
+        futures = {executor.submit(self.answer_question, questions[group[0]], merchant_name): group
+                   for group in groups}
+        try:
+            for future in as_completed(futures):
+                group = futures[future]
+                try:
+                    answer, error = future.result(), None
+                except Exception:
+                    logging.exception(f"Failed answering question {group[0]}: {questions[group[0]]}")
+                    answer, error = None, self.QUESTION_ERROR
+                for i in group:
+                    yield i, answer, error
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def group_questions(self, questions: List[str], duplicate_similarity_threshold: Optional[float]) -> List[List[int]]:
+        """
+        Group the questions of a questionnaire with their near-duplicates, embedding them together.
+
+        Returns:
+            List[List[int]]: The indices of the questions of each group, a group per question if the threshold is None
+        """
+        if duplicate_similarity_threshold is None:
+            return [[i] for i in range(len(questions))]
+        groups = group_near_duplicates(self.rfp_pinecone_embedder.get_query_embeddings(questions),
+                                       duplicate_similarity_threshold)
+        logging.info(f"Answering {len(groups)} groups of near-duplicate questions out of {len(questions)}")
+        return groups
+
+
+def group_near_duplicates(embeddings: np.ndarray, similarity_threshold: float) -> List[List[int]]:
+    """
+    Group vectors with their near-duplicates. Each group is a vector and the following vectors not grouped yet with a
+    cosine similarity of at least the threshold with it, so a group is never larger than the threshold allows, unlike
+    a chain of successive near-duplicates.
+
+    Args:
+        embeddings (np.ndarray): The vectors, a row per vector
+        similarity_threshold (float): Cosine similarity from which vectors are near-duplicates
+
+    Returns:
+        List[List[int]]: The indices of the vectors of each group, in increasing order
+    """
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = embeddings / np.where(norms > 0, norms, 1)
+    similar = unit @ unit.T >= similarity_threshold
+    grouped = np.zeros(len(embeddings), dtype=bool)
+    groups = []
+    for i in range(len(embeddings)):
+        if not grouped[i]:
+            # the previous vectors are all grouped already
+            group = np.flatnonzero(similar[i] & ~grouped)
+            grouped[group] = True
+            groups.append([i] + [int(j) for j in group if j != i])
+    return groups
@@ -0,0 +1,399 @@
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+import argparse
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+logging.basicConfig(level=logging.INFO)
+
+
+class HNSWIndex:
+    """
+    A Hierarchical Navigable Small World graph (Malkov & Yashunin, 2016) for approximate maximum inner product search
+    over dense embeddings, as the embedding model is trained for dot product similarity.
+
+    Nodes are added incrementally and never moved: a node is identified by its insertion order. Deleted nodes are
+    only marked, still routing the searches, and are left out of the results.
+
+    The index is saved as .npy files, loaded back as copy-on-write memory maps so that loading takes no time regardless
+    of the size of the index. Only the pages touched by the searches are read from the disk.
+
+    Attributes:
+        M (int): Default number of neighbors of a node in the upper layers (twice as many in the bottom layer).
+            Higher values improve the recall, at the cost of memory and insertion time.
+        EF_CONSTRUCTION (int): Default size of the candidate list when inserting. Higher values improve the graph.
+        EF_SEARCH (int): Default size of the candidate list when searching: the recall/latency trade-off of queries.
+    """
+    M = 16
+    EF_CONSTRUCTION = 200
+    EF_SEARCH = 64
+    # candidates expanded together by the beam search, trading a few extra distance computations for fewer steps
+    EXPANSION_WIDTH = 4
+    META_FILE = 'meta.json'
+    ARRAY_FILES = ('vectors', 'levels', 'neighbors0', 'deleted', 'upper_nodes', 'upper_neighbors')
+
+    def __init__(self, dim: int, m: int = M, ef_construction: int = EF_CONSTRUCTION, ef_search: int = EF_SEARCH,
+                 seed: int = 42):
+        """
+        Args:
+            dim (int): Dimension of the embeddings
+            m (int): Number of neighbors of a node in the upper layers
+            ef_construction (int): Size of the candidate list when inserting
+            ef_search (int): Default size of the candidate list when searching
+            seed (int): Seed of the random levels of the nodes
+        """
+        self.dim = dim
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._level_mult = 1 / np.log(m)
+        self._rng = np.random.default_rng(seed)
+        self._n = 0
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._levels = np.empty(0, dtype=np.int8)
+        self._neighbors0 = np.empty((0, self.m0), dtype=np.int32)
+        self._deleted = np.empty(0, dtype=bool)
+        # the neighbors of each node in each upper layer, as few nodes reach them
+        self._upper: List[Dict[int, np.ndarray]] = []
+        self._entry_point = -1
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._n]
+
+    @property
+    def deleted(self) -> np.ndarray:
+        return self._deleted[:self._n]
+
+    def _grow(self, n_new: int):
+        capacity = len(self._vectors)
+        if self._n + n_new <= capacity:
+            return
+        capacity = max(self._n + n_new, 2 * capacity, 1024)
+        for name, fill in (('_vectors', 0), ('_levels', 0), ('_neighbors0', -1), ('_deleted', False)):
+            old = getattr(self, name)
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            new[:self._n] = old[:self._n]
+            setattr(self, name, new)
+
+    def _neighbors(self, node: int, level: int) -> np.ndarray:
+        if level == 0:
+            neighbors = self._neighbors0[node]
+            return neighbors[neighbors >= 0]
+        return self._upper[level - 1].get(node, np.empty(0, dtype=np.int32))
+
+    def _set_neighbors(self, node: int, level: int, neighbors: np.ndarray):
+        if level == 0:
+            self._neighbors0[node] = -1
+            self._neighbors0[node, :len(neighbors)] = neighbors
+        else:
+            self._upper[level - 1][node] = np.asarray(neighbors, dtype=np.int32)
+
+    def _search_layer(self, query: np.ndarray, entry_points: Sequence[int], ef: int, level: int) \
+            -> List[Tuple[float, int]]:
+        """
+        Beam search of the ef nodes closest to the query in a layer, by inner product.
+
+        Returns:
+            List[Tuple[float, int]]: The (negative inner product, node) of the closest nodes, closest first
+        """
+        visited = np.zeros(self._n, dtype=bool)
+        neighbors0 = self._neighbors0
+        entry_points = np.asarray(entry_points, dtype=np.int64)
+        visited[entry_points] = True
+        distances = -(self._vectors[entry_points] @ query)
+        candidates = list(zip(distances.tolist(), entry_points.tolist()))  # min-heap by distance
+        heapq.heapify(candidates)
+        results = [(-d, node) for d, node in candidates]  # max-heap by distance, of at most ef nodes
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+        while candidates:
+            # expands the closest candidates a few at a time, computing the distances of their neighbors together
+            expanded = []
+            while candidates and len(expanded) < self.EXPANSION_WIDTH:
+                distance, node = heapq.heappop(candidates)
+                if distance > -results[0][0] and len(results) >= ef:
+                    candidates = []
+                    break
+                expanded.append(node)
+            if not expanded:
+                break
+            if level == 0:
+                neighbors = neighbors0[expanded].ravel()
+            else:
+                neighbors = np.concatenate([self._neighbors(node, level) for node in expanded])
+            neighbors = np.unique(neighbors[neighbors >= 0])
+            neighbors = neighbors[~visited[neighbors]]
+            if len(neighbors) == 0:
+                continue
+            visited[neighbors] = True
+            neighbor_distances = -(self._vectors[neighbors] @ query)
+            if len(results) >= ef:
+                # only the neighbors closer than the current furthest result may enter the results
+                closer = neighbor_distances < -results[0][0]
+                neighbors, neighbor_distances = neighbors[closer], neighbor_distances[closer]
+            for neighbor_distance, neighbor in zip(neighbor_distances.tolist(), neighbors.tolist()):
+                if len(results) < ef or neighbor_distance < -results[0][0]:
+                    heapq.heappush(candidates, (neighbor_distance, neighbor))
+                    heapq.heappush(results, (-neighbor_distance, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted((-d, node) for d, node in results)
+
+    def _select_neighbors(self, base: np.ndarray, candidates: List[Tuple[float, int]], m: int) -> np.ndarray:
+        """
+        The neighbor selection heuristic: a candidate is kept unless it is closer to an already kept neighbor than to
+        the base, which keeps links in diverse directions instead of only to the closest cluster.
+
+        Args:
+            base (np.ndarray): The vector whose neighbors are selected
+            candidates (List[Tuple[float, int]]): The (distance to the base, node) of the candidates, closest first
+            m (int): Maximal number of neighbors
+
+        Returns:
+            np.ndarray: The selected nodes
+        """
+        if len(candidates) <= m:
+            return np.array([node for _, node in candidates], dtype=np.int32)
+        nodes = np.array([node for _, node in candidates], dtype=np.int64)
+        base_distances = np.array([d for d, _ in candidates])
+        candidate_vectors = self._vectors[nodes]
+        # distance of each candidate to its closest kept neighbor, updated by a matrix-vector product per kept neighbor
+        closest_kept = np.full(len(nodes), np.inf)
+        selected = []
+        for i in range(len(nodes)):
+            if closest_kept[i] > base_distances[i]:
+                selected.append(i)
+                if len(selected) == m:
+                    break
+                np.minimum(closest_kept, -(candidate_vectors @ candidate_vectors[i]), out=closest_kept)
+        return nodes[selected].astype(np.int32)
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Insert vectors into the graph.
+
+        Args:
+            vectors (np.ndarray): The vectors, of shape (n, dim)
+
+        Returns:
+            np.ndarray: The nodes of the vectors
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        with self._lock:
+            self._grow(len(vectors))
+            nodes = np.arange(self._n, self._n + len(vectors))
+            for node, vector in zip(nodes, vectors):
+                self._add_one(int(node), vector)
+        return nodes
+
+    def _add_one(self, node: int, vector: np.ndarray):
+        level = int(-np.log(1 - self._rng.random()) * self._level_mult)
+        self._vectors[node] = vector
+        self._levels[node] = level
+        self._deleted[node] = False
+        self._n += 1
+        while len(self._upper) < level:
+            self._upper.append({})
+        if self._entry_point < 0:
+            self._entry_point = node
+            return
+        max_level = int(self._levels[self._entry_point])
+        entry_points = [self._entry_point]
+        for lc in range(max_level, level, -1):
+            entry_points = [self._search_layer(vector, entry_points, 1, lc)[0][1]]
+        for lc in range(min(level, max_level), -1, -1):
+            candidates = self._search_layer(vector, entry_points, self.ef_construction, lc)
+            neighbors = self._select_neighbors(vector, candidates, self.m)
+            self._set_neighbors(node, lc, neighbors)
+            max_neighbors = self.m0 if lc == 0 else self.m
+            for neighbor in neighbors.tolist():
+                links = self._neighbors(neighbor, lc)
+                if len(links) < max_neighbors:
+                    self._set_neighbors(neighbor, lc, np.append(links, node))
+                else:
+                    links = np.append(links, node)
+                    distances = -(self._vectors[links] @ self._vectors[neighbor])
+                    order = np.argsort(distances)
+                    pruned = self._select_neighbors(self._vectors[neighbor],
+                                                    list(zip(distances[order].tolist(), links[order].tolist())),
+                                                    max_neighbors)
+                    self._set_neighbors(neighbor, lc, pruned)
+            entry_points = [node for _, node in candidates]
+        if level > max_level:
+            self._entry_point = node
+
+    def mark_deleted(self, nodes: Sequence[int]):
+        with self._lock:
+            self._deleted[np.asarray(nodes, dtype=np.int64)] = True
+
+    def search(self, query: np.ndarray, k: int, ef: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate search of the k nodes with the highest inner product with the query.
+
+        Args:
+            query (np.ndarray): The query vector
+            k (int): Number of nodes to return
+            ef (int, optional): Size of the candidate list, at least k. Defaults to the index's ef_search.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The nodes and their inner products, by decreasing inner product
+        """
+        query = np.asarray(query, dtype=np.float32)
+        with self._lock:
+            if self._entry_point < 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            entry_points = [self._entry_point]
+            for lc in range(int(self._levels[self._entry_point]), 0, -1):
+                entry_points = [self._search_layer(query, entry_points, 1, lc)[0][1]]
+            # searches for more nodes than k when some are deleted, as they take places in the candidate list
+            n_deleted = int(self.deleted.sum())
+            ef = max(ef or self.ef_search, k) + min(n_deleted, k)
+            results = [(d, node) for d, node in self._search_layer(query, entry_points, ef, 0)
+                       if not self._deleted[node]][:k]
+        return (np.array([node for _, node in results], dtype=np.int64),
+                np.array([-d for d, _ in results], dtype=np.float32))
+
+    def exact_search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Brute-force version of search, as a reference for the recall.
+        """
+        scores = self.vectors @ np.asarray(query, dtype=np.float32)
+        scores[self.deleted] = -np.inf
+        top = np.argsort(-scores, kind='stable')[:min(k, int((~self.deleted).sum()))]
+        return top, scores[top]
+
+    def save(self, path: Union[Path, str]):
+        """
+        Save the index to a directory, replacing its previous files.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            upper_nodes = [(level, node) for level, layer in enumerate(self._upper, start=1) for node in layer]
+            upper_neighbors = np.full((len(upper_nodes), self.m), -1, dtype=np.int32)
+            for i, (level, node) in enumerate(upper_nodes):
+                neighbors = self._upper[level - 1][node]
+                upper_neighbors[i, :len(neighbors)] = neighbors
+            arrays = {
+                'vectors': self.vectors,
+                'levels': self._levels[:self._n],
+                'neighbors0': self._neighbors0[:self._n],
+                'deleted': self.deleted,
+                'upper_nodes': np.array(upper_nodes, dtype=np.int32).reshape(-1, 2),
+                'upper_neighbors': upper_neighbors,
+            }
+            meta = {'dim': self.dim, 'm': self.m, 'ef_construction': self.ef_construction, 'ef_search': self.ef_search,
+                    'n': self._n, 'entry_point': self._entry_point}
+            # written to temporary files first, and the meta last, so that an interrupted save keeps the previous index
+            for name, array in arrays.items():
+                with open(path / f'{name}.npy.tmp', 'wb') as f:
+                    np.save(f, array)
+            for name in arrays:
+                os.replace(path / f'{name}.npy.tmp', path / f'{name}.npy')
+            with open(path / f'{self.META_FILE}.tmp', 'w') as f:
+                json.dump(meta, f)
+            os.replace(path / f'{self.META_FILE}.tmp', path / self.META_FILE)
+
+    @classmethod
+    def load(cls, path: Union[Path, str], ef_search: int = None) -> 'HNSWIndex':
+        """
+        Load an index saved by save, memory mapping its arrays. Inserting into the loaded index copies them to memory.
+
+        Args:
+            path (Union[Path, str]): The directory of the index
+            ef_search (int, optional): Default size of the candidate list when searching. Defaults to the saved one.
+        """
+        path = Path(path)
+        with open(path / cls.META_FILE) as f:
+            meta = json.load(f)
+        index = cls(meta['dim'], meta['m'], meta['ef_construction'], ef_search or meta['ef_search'])
+        arrays = {name: np.load(path / f'{name}.npy', mmap_mode='c') for name in cls.ARRAY_FILES}
+        index._n = meta['n']
+        index._entry_point = meta['entry_point']
+        index._vectors, index._levels = arrays['vectors'], arrays['levels']
+        index._neighbors0, index._deleted = arrays['neighbors0'], arrays['deleted']
+        # the layers of the top level may have no links, when a single node reaches them
+        index._upper = [{} for _ in range(int(index._levels[:index._n].max(initial=0)))]
+        for (level, node), neighbors in zip(np.asarray(arrays['upper_nodes']).tolist(), arrays['upper_neighbors']):
+            index._upper[level - 1][node] = np.array(neighbors[neighbors >= 0])
+        return index
+
+
+def recall_report(index: HNSWIndex, queries: np.ndarray, k: int = 20, ef_values: Sequence[int] = (16, 32, 64, 128, 256)) \
+        -> List[Dict[str, float]]:
+    """
+    Measure the recall@k of the approximate search against the exact search, and their latencies, for several sizes of
+    the candidate list.
+
+    Args:
+        index (HNSWIndex): The index
+        queries (np.ndarray): The query vectors, of shape (n_queries, dim)
+        k (int): Number of results per query
+        ef_values (Sequence[int]): The sizes of the candidate list to measure
+
+    Returns:
+        List[Dict[str, float]]: A record per size of the candidate list, with its recall@k and mean latencies
+    """
+    start = time.perf_counter()
+    exact = [set(index.exact_search(query, k)[0].tolist()) for query in queries]
+    exact_ms = 1000 * (time.perf_counter() - start) / len(queries)
+    records = []
+    for ef in ef_values:
+        start = time.perf_counter()
+        approximate = [index.search(query, k, ef)[0] for query in queries]
+        hnsw_ms = 1000 * (time.perf_counter() - start) / len(queries)
+        recall = np.mean([len(expected.intersection(found.tolist())) / max(len(expected), 1)
+                          for expected, found in zip(exact, approximate)])
+        records.append({'ef': ef, f'recall@{k}': float(recall), 'hnsw_ms': hnsw_ms, 'exact_ms': exact_ms})
+    return records
+
+
+def main(args):
+    if args.index_dir is not None:
+        index = HNSWIndex.load(args.index_dir)
+    else:
+        logging.info(f"Building an index of {args.n_vectors} random vectors of dimension {args.dim}...")
+        rng = np.random.default_rng(0)
+        # clustered vectors, as embeddings are, rather than uniformly spread ones
+        centers = rng.normal(size=(max(args.n_vectors // 100, 1), args.dim))
+        vectors = centers[rng.integers(len(centers), size=args.n_vectors)] + 0.5 * rng.normal(size=(args.n_vectors, args.dim))
+        index = HNSWIndex(args.dim, args.m, args.ef_construction)
+        start = time.perf_counter()
+        index.add(vectors)
+        logging.info(f"Built the index in {time.perf_counter() - start:.1f} seconds")
+    rng = np.random.default_rng(1)
+    # the queries are perturbed stored vectors, so that they do not trivially match themselves
+    stored = index.vectors[rng.integers(len(index), size=args.n_queries)]
+    queries = stored + 0.1 * np.std(stored) * rng.normal(size=stored.shape).astype(np.float32)
+    for record in recall_report(index, queries, args.k, args.ef):
+        logging.info(f"ef {record['ef']}: recall@{args.k} {record[f'recall@{args.k}']:.4f}, "
+                     f"{record['hnsw_ms']:.2f}ms per query (exact search: {record['exact_ms']:.2f}ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Script for reporting the recall and latency of the HNSW index against "
+                                                 "the exact search")
+    parser.add_argument("--index_dir", help="directory of a saved index. If missing, an index of random vectors is "
+                                            "built", type=Path)
+    parser.add_argument("--n_vectors", help="number of random vectors", type=int, default=10_000)
+    parser.add_argument("--dim", help="dimension of the random vectors", type=int, default=768)
+    parser.add_argument("--m", help="number of neighbors per node", type=int, default=HNSWIndex.M)
+    parser.add_argument("--ef_construction", help="size of the candidate list when inserting", type=int,
+                        default=HNSWIndex.EF_CONSTRUCTION)
+    parser.add_argument("--n_queries", help="number of queries", type=int, default=200)
+    parser.add_argument("--k", help="number of results per query", type=int, default=20)
+    parser.add_argument("--ef", help="sizes of the candidate list to report", type=int, nargs='+',
+                        default=[16, 32, 64, 128, 256])
+    arguments = parser.parse_args()
+    main(arguments)
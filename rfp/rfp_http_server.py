@@ -1,14 +1,25 @@
 """
 This is an alternative for the app in case we want to have a server, instead of a streamlit app
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+import io
+import json
 import logging
 from logging.handlers import RotatingFileHandler
 from functools import wraps
 import os
 from datetime import datetime
 import traceback
+import pandas as pd
+from rfp.rfp_constants import CSV_FORMAT
 from rfp.rfp_filler import RFPFiller
+from rfp.rfp_utils import load_questionnaire, questionnaire_from_records
+
+# Questions answered at the same time at most by a request of the questionnaire endpoint
+MAX_CONCURRENT_QUESTIONS = int(os.environ.get('RFP_MAX_CONCURRENT_QUESTIONS', RFPFiller.MAX_CONCURRENT_QUESTIONS))
+# Questions allowed in a single questionnaire
+MAX_QUESTIONNAIRE_QUESTIONS = 1000
+
 rfp_fil = RFPFiller()
 app = Flask(__name__, static_folder=None)
 
@@ -54,6 +65,9 @@ def handle_error(error):
 def health_check():
     return jsonify({
         'status': 'healthy',
+        'query_cache': rfp_fil.rfp_pinecone_embedder.query_cache.stats(),
+        'answer_cache': {'hits': rfp_fil.answer_cache.hits, 'misses': rfp_fil.answer_cache.misses,
+                         'entries': len(rfp_fil.answer_cache)} if rfp_fil.answer_cache is not None else None,
         'timestamp': datetime.utcnow().isoformat()
     })
 
@@ -89,6 +103,53 @@ def get_answer():
         }), 500
 
 
+@app.route('/api/stream_answer', methods=['POST'])
+@require_api_key
+def stream_answer():
+    """
+    Streaming version of get_answer, as server-sent events: an event {"token": ...} per piece of the answer as the
+    language model generates it, then a "done" event {"answer": ...} with the whole answer, or an "error" event
+    {"error": ...} if the generation fails. A failure before the generation, e.g. of the vector search, is an error
+    response instead of an event stream.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    if 'query' not in data:
+        return jsonify({'error': 'Missing text field'}), 400
+
+    question = data['query']
+    merchant_name = data.get('merchant_name', None)
+    logging.info(f"Received question to stream!\nmerchant name: {merchant_name}.\nQuestion: {question}")
+    try:
+        answer_pieces, prompt = rfp_fil.answer_question_stream(question, merchant_name)
+    except Exception as e:
+        app.logger.error(f'Error processing request: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({
+            'error': 'Error processing request',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+    app.logger.info(f"Prompt: {prompt}")
+
+    def generate():
+        answer = ''
+        try:
+            for piece in answer_pieces:
+                answer += piece
+                yield f"data: {json.dumps({'token': piece})}\n\n"
+        except Exception as e:
+            app.logger.error(f'Error streaming the answer: {str(e)}\n{traceback.format_exc()}')
+            error = {'error': 'Error processing request', 'timestamp': datetime.utcnow().isoformat()}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            return
+        app.logger.info(f"Answer: {answer}")
+        yield f"event: done\ndata: {json.dumps({'answer': answer, 'timestamp': datetime.utcnow().isoformat()})}\n\n"
+
+    # without buffering by proxies, so that the tokens reach the client as they are generated
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/save_answer', methods=['POST'])
 @require_api_key
 def save_answer():
@@ -102,7 +163,7 @@ def save_answer():
             return jsonify({'error': 'Missing answer field'}), 400
         question = data['question']
         answer = data['answer']
-        response = rfp_fil.rfp_pinecone_embedder.upsert_question(question, answer)  # should be {'upserted_count': 1}
+        response = rfp_fil.save_answer(question, answer)  # should be {'upserted_count': 1}
 
         app.logger.info(f'Successfully processed request: {response}')
 
@@ -119,6 +180,65 @@ def save_answer():
         }), 500
 
 
+@app.route('/api/answer_questionnaire', methods=['POST'])
+@require_api_key
+def answer_questionnaire():
+    """
+    Answer all the questions of a questionnaire, in the CSV_FORMAT layout, given either as a CSV body (content type
+    text/csv, with the merchant name as a query parameter) or as JSON: {"questions": [{"Number": ..., "Category": ...,
+    "Question": ...}, ...], "merchant_name": ...}.
+    The questions are answered concurrently, and each answer is streamed back as an NDJSON line as soon as it is ready:
+    {"Number": ..., "Question": ..., "answer": ...}, or with an "error" field instead of the answer if it failed. If the
+    answering fails altogether, the last line is {"error": ...}, without a question number.
+    """
+    try:
+        if request.mimetype == 'text/csv':
+            df = pd.read_csv(io.StringIO(request.get_data(as_text=True)), dtype=str)
+            merchant_name = request.args.get('merchant_name', None)
+        else:
+            data = request.get_json(silent=True)
+            if not data:
+                return jsonify({'error': 'No data provided'}), 400
+            if not isinstance(data.get('questions'), list):
+                return jsonify({'error': 'Missing questions field'}), 400
+            df = questionnaire_from_records(data['questions'])
+            merchant_name = data.get('merchant_name', None)
+        questions = load_questionnaire(df)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'Invalid questionnaire: {e}'}), 400
+    if len(questions) == 0:
+        return jsonify({'error': 'No questions provided'}), 400
+    if len(questions) > MAX_QUESTIONNAIRE_QUESTIONS:
+        return jsonify({'error': f'At most {MAX_QUESTIONNAIRE_QUESTIONS} questions per questionnaire'}), 400
+    app.logger.info(f"Received a questionnaire of {len(questions)} questions. merchant name: {merchant_name}")
+    try:
+        # the questions are embedded before the response starts, so that an error is still a proper error response
+        answers = rfp_fil.answer_questions(questions[CSV_FORMAT.QUESTION].tolist(), merchant_name,
+                                           MAX_CONCURRENT_QUESTIONS)
+    except Exception as e:
+        app.logger.error(f'Error processing request: {str(e)}\n{traceback.format_exc()}')
+        return jsonify({
+            'error': 'Error processing request',
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+    def generate():
+        try:
+            for i, answer, error in answers:
+                result = {CSV_FORMAT.NUMBER: questions[CSV_FORMAT.NUMBER].iloc[i],
+                          CSV_FORMAT.QUESTION: questions[CSV_FORMAT.QUESTION].iloc[i]}
+                result.update({'answer': answer} if error is None else {'error': error})
+                yield json.dumps(result) + '\n'
+        except Exception as e:
+            # the response has started, so the error is its last line, telling the client the answers are missing
+            app.logger.error(f'Error answering the questionnaire: {str(e)}\n{traceback.format_exc()}')
+            yield json.dumps({'error': 'Error processing request', 'timestamp': datetime.utcnow().isoformat()}) + '\n'
+            return
+        app.logger.info(f"Answered a questionnaire of {len(questions)} questions")
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 app.logger.info("Registered Routes:")
 for rule in app.url_map.iter_rules():
     app.logger.info(f"{rule.endpoint}: {rule.methods} - {rule.rule}")
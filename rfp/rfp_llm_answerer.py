@@ -1,4 +1,4 @@
-from typing import List, Dict, Tuple, Union
+from typing import Iterator, List, Dict, Tuple, Union
 from openai import OpenAI
 # needed locally
 import os
@@ -13,12 +13,14 @@ class RFPLlmAnswerer:
 
     Attributes:
         SYSTEM_PROMPT (str): The system prompt that provides context about Justt.ai and the task
+        MODEL (str): The OpenAI chat model generating the answers
         openai_client (OpenAI): The OpenAI client instance for making API calls
     """
     SYSTEM_PROMPT = "I work at Justt.ai. A fintech company that handles chargebacks automatically for merchants. " \
              "I want you to fill the best answer you can on my behalf to questions for an RFP for new merchants. " \
              "I will supply previous questions and answers we made for other merchants, and want you to answer the last one. " \
                     "Reply only the answer. Do not use the names of other merchants."
+    MODEL = "gpt-4o-mini"
 
     def __init__(self, openai_api_key: str = None):
         """
@@ -63,6 +65,16 @@ class RFPLlmAnswerer:
         user_prompt += f"Question to answer: {question}\n Answer:"
         return user_prompt
 
+    def build_messages(self, similar_questions: List[Dict[str, str]], question: str, merchant_name: str = "_____") \
+            -> List[Dict[str, str]]:
+        """
+        Construct the chat messages of the prompt: the system prompt and the user prompt of build_prompt.
+        """
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": self.build_prompt(similar_questions, question, merchant_name)}
+        ]
+
     def generate_answer(self, similar_questions: List[Dict[str, str]], question: str, merchant_name: str = "_____", return_prompt=False) \
             -> Union[str, Tuple[str, List]]:
         """
@@ -92,16 +104,43 @@ class RFPLlmAnswerer:
             >> print(answer)
             "Our standard response time is within 24 hours of receiving a chargeback notification."
         """
-        user_prompt = self.build_prompt(similar_questions, question, merchant_name)
-        messages = [
-                {"role": "system", "content": self.SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ]
+        messages = self.build_messages(similar_questions, question, merchant_name)
         completion = self.openai_client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=self.MODEL,
             messages=messages
         )
         if return_prompt:
             return completion.choices[0].message.content, messages
         else:
             return completion.choices[0].message.content
+
+    def generate_answer_stream(self, similar_questions: List[Dict[str, str]], question: str,
+                               merchant_name: str = "_____") -> Tuple[Iterator[str], List]:
+        """
+        Streaming version of generate_answer, giving the answer token by token as the language model generates it,
+        so that it can be shown from the first token instead of after the whole generation.
+
+        Args:
+            similar_questions (List[Dict[str, str]]): List of dictionaries containing previous Q&A pairs.
+                Each dictionary should have 'question' and 'answer' keys.
+            question (str): The current question to be answered.
+            merchant_name (str, optional): Name of the merchant for whom the RFP is being prepared.
+                Defaults to "_____".
+
+        Returns:
+            Tuple[Iterator[str], List]: The iterator of the pieces of the answer, and the list of messages used in the
+                prompt. The request is sent when iterating starts.
+        """
+        messages = self.build_messages(similar_questions, question, merchant_name)
+
+        def stream_tokens():
+            stream = self.openai_client.chat.completions.create(
+                model=self.MODEL,
+                messages=messages,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        return stream_tokens(), messages
@@ -1,5 +1,10 @@
-from typing import List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
 import argparse
+import hashlib
+import json
+import numpy as np
 import pandas as pd
 import uuid
 from pathlib import Path
@@ -7,6 +12,9 @@ from pinecone import Pinecone, QueryResponse
 from pinecone_text.sparse import BM25Encoder, SparseVector
 from pinecone_text.hybrid import hybrid_convex_scale
 from sentence_transformers import SentenceTransformer
+from rfp.rfp_embedding_cache import RFPEmbeddingCache
+from rfp.rfp_local_index import RFPLocalIndex
+from rfp.rfp_query_cache import RFPQueryEmbeddingCache
 from rfp.rfp_utils import load_csv, load_rfp_files_dir, _format_question_and_answer_string
 import os
 import logging
@@ -25,25 +33,79 @@ class RFPPinceconeEmbedder:
         SPARSE_EMBEDDING_PARAMETERS_PATH (str): Path to save/load BM25 parameters
         TOP_K (int): Default number of similar results to return
         ALPHA (float): Weight factor between dense and sparse vector search (0 to 1)
+        NAMESPACE (str): Pinecone namespace of the questions and answers
+        ENCODE_BATCH_SIZE (int): Default number of texts encoded together when upserting a DataFrame
+        UPSERT_BATCH_SIZE (int): Default number of vectors per Pinecone upsert request
+        MAX_PENDING_UPSERTS (int): Number of upsert requests queued at most while encoding
+        MANIFEST_PATH (str): Path of the manifest of the hashes of the upserted texts, for incremental re-indexing
+        MANIFEST_VERSION (int): Version of the manifest format. A manifest of another version triggers a full re-index.
+        DELETE_BATCH_SIZE (int): Number of ids per Pinecone delete request
+        EMBEDDING_CACHE_DIR (str): Default directory of the on-disk cache of the dense embeddings of stored texts
+        INDEX_BACKENDS (List[str]): The vector index backends: a Pinecone index, or an in-process RFPLocalIndex
+        LOCAL_INDEX_DIR (str): Default directory the local index is persisted to
+        QUERY_CACHE_MAX_BYTES (int): Default size limit of the in-memory cache of the embeddings of query questions
     """
     DENSE_EMBEDDING_MODEL = 'multi-qa-mpnet-base-dot-v1'  # https://sbert.net/docs/sentence_transformer/pretrained_models.html
     SPARSE_EMBEDDING_PARAMETERS_PATH = 'bm25_params.json'
     TOP_K = 20
     ALPHA = 0.5  # for weighting between the dense and the sparse vector search
-
-    def __init__(self, pinecone_api_key: str = None, pinecone_rfp_index: str = None):
+    NAMESPACE = 'questionnaires'
+    ENCODE_BATCH_SIZE = 256
+    UPSERT_BATCH_SIZE = 100
+    MAX_PENDING_UPSERTS = 4
+    MANIFEST_PATH = 'embedding_manifest.json'
+    MANIFEST_VERSION = 1
+    DELETE_BATCH_SIZE = 1000
+    EMBEDDING_CACHE_DIR = 'embedding_cache'
+    INDEX_BACKEND_PINECONE = 'pinecone'
+    INDEX_BACKEND_LOCAL = 'local'
+    INDEX_BACKENDS = [INDEX_BACKEND_PINECONE, INDEX_BACKEND_LOCAL]
+    LOCAL_INDEX_DIR = 'local_index'
+    QUERY_CACHE_MAX_BYTES = 64 * 2 ** 20
+
+    def __init__(self, pinecone_api_key: str = None, pinecone_rfp_index: str = None,
+                 embedding_cache_dir: Union[Path, str] = None, use_embedding_cache: bool = True,
+                 index_backend: str = None, query_cache_max_bytes: int = QUERY_CACHE_MAX_BYTES):
         """
         Initialize the RFP embedder with Pinecone credentials and embedding models.
 
         Args:
             pinecone_api_key (str, optional): Pinecone API key. Defaults to environment variable.
             pinecone_rfp_index (str, optional): Name of Pinecone index. Defaults to environment variable.
+            embedding_cache_dir (Union[Path, str], optional): Directory of the cache of the dense embeddings.
+                Defaults to EMBEDDING_CACHE_DIR next to this file.
+            use_embedding_cache (bool): Whether to reuse the cached dense embeddings of the stored texts
+            index_backend (str, optional): One of INDEX_BACKENDS. Defaults to the RFP_INDEX_BACKEND environment
+                variable, or to Pinecone. The local index is persisted to the RFP_LOCAL_INDEX_DIR environment variable,
+                or to LOCAL_INDEX_DIR next to this file, and its dense search is set by the RFP_LOCAL_DENSE_SEARCH
+                environment variable (exact by default, or hnsw for large corpora).
+            query_cache_max_bytes (int): Size limit of the cache of the embeddings of query questions. 0 disables it.
+
+        Raises:
+            ValueError: If the index backend is unknown
         """
-        pinecone_api_key = pinecone_api_key if pinecone_api_key is not None else os.getenv(key='PINECONE_API_KEY')
-        pinecone_rfp_index = pinecone_rfp_index if pinecone_rfp_index is not None else os.getenv(key='PINECONE_RFP_INDEX')
-        pc = Pinecone(api_key=pinecone_api_key)
-        self.index = pc.Index(pinecone_rfp_index)
+        index_backend = index_backend if index_backend is not None else \
+            os.getenv(key='RFP_INDEX_BACKEND', default=self.INDEX_BACKEND_PINECONE)
+        if index_backend not in self.INDEX_BACKENDS:
+            raise ValueError(f"Unknown index backend: {index_backend}. Should be one of {self.INDEX_BACKENDS}")
+        if index_backend == self.INDEX_BACKEND_LOCAL:
+            local_index_dir = os.getenv(key='RFP_LOCAL_INDEX_DIR', default=Path(__file__).parent / self.LOCAL_INDEX_DIR)
+            self.index_name = f'{self.INDEX_BACKEND_LOCAL}:{local_index_dir}'
+            self.index = RFPLocalIndex(local_index_dir, dense_search=os.getenv(
+                key='RFP_LOCAL_DENSE_SEARCH', default=RFPLocalIndex.DENSE_SEARCH_EXACT))
+        else:
+            pinecone_api_key = pinecone_api_key if pinecone_api_key is not None else os.getenv(key='PINECONE_API_KEY')
+            pinecone_rfp_index = pinecone_rfp_index if pinecone_rfp_index is not None else os.getenv(key='PINECONE_RFP_INDEX')
+            pc = Pinecone(api_key=pinecone_api_key)
+            self.index_name = pinecone_rfp_index
+            self.index = pc.Index(pinecone_rfp_index)
         self.dense_model = SentenceTransformer(self.DENSE_EMBEDDING_MODEL)
+        self.embedding_cache = None
+        if use_embedding_cache:
+            embedding_cache_dir = embedding_cache_dir if embedding_cache_dir is not None else \
+                Path(__file__).parent / self.EMBEDDING_CACHE_DIR
+            self.embedding_cache = RFPEmbeddingCache(embedding_cache_dir, self.DENSE_EMBEDDING_MODEL)
+        self.query_cache = RFPQueryEmbeddingCache(query_cache_max_bytes)
         self.sparse_model = BM25Encoder()
         file_path = Path(__file__).parent / self.SPARSE_EMBEDDING_PARAMETERS_PATH
         if file_path.exists():
@@ -66,7 +128,7 @@ class RFPPinceconeEmbedder:
         """
         embeddings = []
         txt = _format_question_and_answer_string(question, answer)
-        question_dense_embedding = self._generate_dense_embedding(txt)
+        question_dense_embedding = self._generate_dense_embeddings([txt])[0]
         question_sparse_embedding = self._generate_sparse_embedding(txt)
         if embedding_id is None:
             embedding_id = self._generate_id()
@@ -76,7 +138,8 @@ class RFPPinceconeEmbedder:
             "sparse_values": question_sparse_embedding,
             "metadata": {"question": question, "answer": answer}
         })
-        response = self.index.upsert(embeddings, namespace='questionnaires')
+        response = self.index.upsert(embeddings, namespace=self.NAMESPACE)
+        self._flush_index()
         return response
 
     def _generate_id(self, max_attempts=10):
@@ -93,31 +156,144 @@ class RFPPinceconeEmbedder:
 
         raise RuntimeError(f"Failed to generate unique ID after {max_attempts} attempts")
 
-    def upsert_df(self, df: pd.DataFrame):
+    def upsert_df(self, df: pd.DataFrame, encode_batch_size: int = ENCODE_BATCH_SIZE,
+                  upsert_batch_size: int = UPSERT_BATCH_SIZE):
         """
         Batch insert or update questions and answers from a DataFrame.
+        The texts are encoded a batch at a time by both encoders, while the vectors of the previous batches are upserted
+        by a background thread.
 
         Args:
             df (pd.DataFrame): DataFrame containing 'txt', 'id', 'Question', and 'Answer' columns
+            encode_batch_size (int): Number of texts encoded together
+            upsert_batch_size (int): Number of vectors per upsert request
         """
-        embeddings = []
-        batch_size = 100
-        for i, row in df.iterrows():
-            question_dense_embedding = self._generate_dense_embedding(row['txt'])
-            question_sparse_embedding = self._generate_sparse_embedding(row['txt'])
-            embeddings.append({
-                "id": row['id'],
-                "values": question_dense_embedding,
-                "sparse_values": question_sparse_embedding,
-                "metadata": {"question": row['Question'], "answer": row['Answer']}
-            })
-
-            if len(embeddings) >= batch_size:
-                self.index.upsert(embeddings)
-                embeddings = []
-        # Upsert any remaining embeddings
-        if len(embeddings) > 0:
-            self.index.upsert(embeddings, namespace='questionnaires')
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=1) as upsert_executor:
+            for start in range(0, len(df), encode_batch_size):
+                batch = df.iloc[start:start + encode_batch_size]
+                texts = batch['txt'].tolist()
+                dense_embeddings = self._generate_dense_embeddings(texts)
+                sparse_embeddings = self._generate_sparse_embeddings(texts)
+                embeddings = [{
+                    "id": embedding_id,
+                    "values": dense_embedding,
+                    "sparse_values": sparse_embedding,
+                    "metadata": {"question": question, "answer": answer}
+                } for embedding_id, dense_embedding, sparse_embedding, question, answer in
+                    zip(batch['id'], dense_embeddings, sparse_embeddings, batch['Question'], batch['Answer'])]
+                for i in range(0, len(embeddings), upsert_batch_size):
+                    pending.append(upsert_executor.submit(self.index.upsert, embeddings[i:i + upsert_batch_size],
+                                                          namespace=self.NAMESPACE))
+                # bounds the memory held by the queued vectors, and raises the errors of the upserts
+                while len(pending) > self.MAX_PENDING_UPSERTS:
+                    pending.popleft().result()
+                logging.info(f"Encoded {min(start + encode_batch_size, len(df))}/{len(df)} questions")
+            while pending:
+                pending.popleft().result()
+        self._flush_index()
+
+    def sync_df(self, df: pd.DataFrame, manifest_path: Path = None, encode_batch_size: int = ENCODE_BATCH_SIZE,
+                full_reindex: bool = False, files: Optional[List[str]] = None):
+        """
+        Incrementally bring the index up to date with a DataFrame of all the RFP files, or of some of them.
+        A local manifest maps the id of every upserted row to the hash of its text and to its file. Only the rows that
+        are new or whose text changed are embedded and upserted, and the vectors of rows missing from the DataFrame are
+        deleted. When the DataFrame holds only some of the files, only the missing rows of these files are deleted, and
+        the manifest entries of the other files are kept.
+        All the rows are re-embedded when the embedding models, the index or the namespace differ from the manifest's,
+        e.g. after retraining the sparse model.
+        Vectors added with upsert_question are not in the manifest, and are left untouched.
+
+        Args:
+            df (pd.DataFrame): DataFrame containing 'txt', 'id', 'Question', 'Answer' and 'file' columns
+            manifest_path (Path, optional): Path of the manifest. Defaults to MANIFEST_PATH next to this file.
+            encode_batch_size (int): Number of texts encoded together
+            full_reindex (bool): Whether to re-embed all the rows, regardless of the manifest
+            files (List[str], optional): Names of the files the DataFrame holds the rows of, when it does not hold all
+                the RFP files. If None, the DataFrame holds all of them.
+
+        Returns:
+            dict: The number of upserted, deleted and unchanged rows
+        """
+        manifest_path = Path(manifest_path) if manifest_path is not None else Path(__file__).parent / self.MANIFEST_PATH
+        manifest = self._load_manifest(manifest_path)
+        signature = self._embedding_signature()
+        previous_hashes: Dict[str, str] = manifest.get('hashes', {})
+        previous_files: Dict[str, str] = manifest.get('files', {})
+        up_to_date_hashes = previous_hashes if manifest.get('signature') == signature and not full_reindex else {}
+        if previous_hashes and not up_to_date_hashes and not full_reindex:
+            logging.info("The embedding models or the index changed since the last run. Re-embedding all the rows.")
+
+        row_hashes = [hashlib.sha256(txt.encode()).hexdigest() for txt in df['txt']]
+        hashes = dict(zip(df['id'], row_hashes))
+        row_files = dict(zip(df['id'], df['file'])) if 'file' in df.columns else {}
+        changed = df[[up_to_date_hashes.get(row_id) != row_hash for row_id, row_hash in zip(df['id'], row_hashes)]]
+        if files is None:
+            removed = [row_id for row_id in previous_hashes if row_id not in hashes]
+            kept_hashes, kept_files = {}, {}
+        else:
+            # the rows of other files, or of an older manifest without files, are neither deleted nor forgotten
+            synced_files = set(files)
+            removed = [row_id for row_id in previous_hashes
+                       if row_id not in hashes and previous_files.get(row_id) in synced_files]
+            others = [row_id for row_id in previous_hashes
+                      if row_id not in hashes and previous_files.get(row_id) not in synced_files]
+            # an empty hash marks the rows embedded by other models, re-embedded at the next sync of their file
+            kept_hashes = {row_id: up_to_date_hashes.get(row_id, '') for row_id in others}
+            kept_files = {row_id: previous_files[row_id] for row_id in others if row_id in previous_files}
+        logging.info(f"Syncing {len(df)} rows: {len(changed)} new or changed, {len(removed)} removed")
+
+        self.upsert_df(changed, encode_batch_size=encode_batch_size)
+        for i in range(0, len(removed), self.DELETE_BATCH_SIZE):
+            self.index.delete(ids=removed[i:i + self.DELETE_BATCH_SIZE], namespace=self.NAMESPACE)
+        self._flush_index()
+        self._save_manifest(manifest_path, {'version': self.MANIFEST_VERSION, 'signature': signature,
+                                            'hashes': {**kept_hashes, **hashes}, 'files': {**kept_files, **row_files}})
+        return {'upserted': len(changed), 'deleted': len(removed), 'unchanged': len(df) - len(changed)}
+
+    def _flush_index(self):
+        """
+        Persist the local index after a change. Pinecone indexes persist the changes themselves.
+        """
+        if isinstance(self.index, RFPLocalIndex):
+            self.index.flush()
+
+    def _embedding_signature(self) -> Dict[str, str]:
+        """
+        Identify everything the vectors depend on besides the texts: the models, the index and the namespace.
+
+        Returns:
+            Dict[str, str]: The signature, compared across runs by sync_df
+        """
+        try:
+            sparse_params = json.dumps(self.sparse_model.get_params(), sort_keys=True)
+        except ValueError:  # the sparse model was not fitted
+            sparse_params = ''
+        return {
+            'dense_model': self.DENSE_EMBEDDING_MODEL,
+            'sparse_model': hashlib.sha256(sparse_params.encode()).hexdigest(),
+            'index': str(self.index_name),
+            'namespace': self.NAMESPACE,
+        }
+
+    def _load_manifest(self, manifest_path: Path) -> dict:
+        if not manifest_path.exists():
+            return {}
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != self.MANIFEST_VERSION:
+            logging.info(f"The manifest at {manifest_path} is of another version. Ignoring it.")
+            return {}
+        return manifest
+
+    @staticmethod
+    def _save_manifest(manifest_path: Path, manifest: dict):
+        # written to a temporary file first, so that an interrupted run never leaves a truncated manifest
+        tmp_path = manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
 
     def upsert_csv(self, file_path):
         df = load_csv(file_path)
@@ -134,15 +310,41 @@ class RFPPinceconeEmbedder:
         Returns:
             list: List of matching documents with their similarity scores and metadata
         """
-        # get the vector of embeddings
-        dense_embedding = self._generate_dense_embedding(question)
-        sparse_embedding = self.sparse_model.encode_queries(question)
-        dense_embedding, sparse_embedding = hybrid_convex_scale(dense_embedding, sparse_embedding, alpha=alpha)
+        # get the vector of embeddings, from the cache when the question was asked before
+        dense_embedding, sparse_embedding = self.query_cache.get_or_compute(question, self._generate_query_embeddings)
+        dense_embedding, sparse_embedding = hybrid_convex_scale(dense_embedding.tolist(), sparse_embedding, alpha=alpha)
         # QueryResponse is a dictionary with 3 keys: matches, namespace, usage.
         # The 'matches' value is a list of the matches. Each value is a dictionary with 'id', 'metadata', 'score', 'values'.
         similar_questions: QueryResponse = self._search_similar(dense_embedding, sparse_embedding)
         return similar_questions['matches']
 
+    def get_query_embedding(self, question: str) -> np.ndarray:
+        """
+        Get the dense embedding of a query question, from the cache when the question was asked before.
+
+        Args:
+            question (str): Query question text
+
+        Returns:
+            np.ndarray: Dense embedding vector, shared with the cache so not to be modified
+        """
+        return self.query_cache.get_or_compute(question, self._generate_query_embeddings)[0]
+
+    def get_query_embeddings(self, questions: List[str]) -> np.ndarray:
+        """
+        Batch version of get_query_embedding, encoding all the questions missing from the cache together.
+
+        Args:
+            questions (List[str]): Query question texts
+
+        Returns:
+            np.ndarray: Dense embedding vector of each question, a row per question
+        """
+        if not questions:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.array([dense for dense, _ in self.query_cache.get_or_compute_many(
+            questions, self._generate_query_embeddings)])
+
     def _search_similar(self, query_dense_embedding, query_sparse_embedding, top_k=20):
         """
         Execute hybrid search query in Pinecone.
@@ -156,19 +358,35 @@ class RFPPinceconeEmbedder:
             QueryResponse: Pinecone query response containing matches
         """
         return self.index.query(vector=query_dense_embedding, sparse_vector=query_sparse_embedding, top_k=top_k, include_metadata=True,
-                                namespace='questionnaires')
+                                namespace=self.NAMESPACE)
 
-    def _generate_dense_embedding(self, text) -> List[float]:
+    def _generate_query_embeddings(self, questions: List[str]) -> List[Tuple[np.ndarray, SparseVector]]:
         """
-        Generate dense embedding vector for input text.
+        Generate the dense and sparse embedding vectors of query questions, each model encoding all of them at once.
 
         Args:
-            text (str): Input text to embed
+            questions (List[str]): Query question texts
+
+        Returns:
+            List[Tuple[np.ndarray, SparseVector]]: Dense and sparse embedding vectors of each question
+        """
+        return list(zip(self.dense_model.encode(questions), self.sparse_model.encode_queries(questions)))
+
+    def _generate_dense_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate dense embedding vectors for a batch of texts to store.
+        The model splits the texts into its own mini-batches, of texts of similar lengths.
+        The embeddings are taken from the embedding cache when enabled, and only the texts missing from it are encoded.
+
+        Args:
+            texts (List[str]): Input texts to embed
 
         Returns:
-            List[float]: Dense embedding vector
+            List[List[float]]: Dense embedding vector of each text
         """
-        return self.dense_model.encode(text).tolist()
+        if self.embedding_cache is not None:
+            return self.embedding_cache.get_or_compute(texts, self.dense_model.encode).tolist()
+        return self.dense_model.encode(texts).tolist()
 
     def _generate_sparse_embedding(self, text) -> SparseVector:
         """
@@ -182,6 +400,18 @@ class RFPPinceconeEmbedder:
         """
         return self.sparse_model.encode_documents(text)
 
+    def _generate_sparse_embeddings(self, texts: List[str]) -> List[SparseVector]:
+        """
+        Generate sparse embedding vectors for a batch of texts.
+
+        Args:
+            texts (List[str]): Input texts to embed
+
+        Returns:
+            List[SparseVector]: Sparse embedding vector of each text
+        """
+        return self.sparse_model.encode_documents(texts)
+
     def retrain_sparse_model(self, directory_path, save_model=True):
         """
         Retrain the sparse embedding model on new data.
@@ -192,41 +422,48 @@ class RFPPinceconeEmbedder:
         """
         df = load_rfp_files_dir(directory_path)
         self.sparse_model.fit(df['txt'])
+        self.query_cache.clear()
         if save_model:
             self.sparse_model.dump(self.SPARSE_EMBEDDING_PARAMETERS_PATH)
             logging.info("sparse model saved")
 
 
-def embed_rfp_files(files_path, rfp_pc_embedder):
+def embed_rfp_files(files_path, rfp_pc_embedder, encode_batch_size: int = RFPPinceconeEmbedder.ENCODE_BATCH_SIZE,
+                    full_reindex: bool = False):
     """
     Load and embed RFP files into Pinecone index.
+    By default, only the rows that changed since the last run are embedded (see RFPPinceconeEmbedder.sync_df).
 
     Args:
         files_path (str): Path to directory containing RFP files or CSV file
         rfp_pc_embedder (RFPPinceconeEmbedder): Initialized embedder instance
+        encode_batch_size (int): Number of texts encoded together
+        full_reindex (bool): Whether to embed all the rows, regardless of the manifest of the last run
 
     Raises:
         ValueError: If the path is neither a directory nor a CSV file
     """
     path_obj = Path(files_path)
     if path_obj.is_dir():
-        df = load_rfp_files_dir(path_obj)
+        df, files = load_rfp_files_dir(path_obj), None
     elif path_obj.is_file() and path_obj.suffix == '.csv':
-        df = load_csv(path_obj)
+        # the other files are left as they are, rather than removed from the index
+        df, files = load_csv(path_obj), [path_obj.name]
     else:
         raise ValueError("The path added is neither an existing directory or a valid csv file")
-    rfp_pc_embedder.upsert_df(df)
+    counts = rfp_pc_embedder.sync_df(df, encode_batch_size=encode_batch_size, full_reindex=full_reindex, files=files)
+    logging.info(f"Synced the RFP files: {counts}")
 
 
 def main(args):
     logging.info(f"rfp_pinecone_embedder with train_sparse_model: {args.train_sparse_model}, update_pinecone_embedding: {args.update_pinecone_embedding}")
     rfp_directory = args.rfp_files_dir
-    rfp_pc_embedder = RFPPinceconeEmbedder()
+    rfp_pc_embedder = RFPPinceconeEmbedder(index_backend=args.index_backend)
     if args.train_sparse_model:
         rfp_pc_embedder.retrain_sparse_model(rfp_directory)
     if args.update_pinecone_embedding:
         logging.info("Embedding existing RFP files...")
-        embed_rfp_files(rfp_directory, rfp_pc_embedder)
+        embed_rfp_files(rfp_directory, rfp_pc_embedder, args.encode_batch_size, args.full_reindex)
         logging.info("Finished embedding existing RFP files.")
 
 
@@ -248,6 +485,22 @@ if __name__ == "__main__":
         help="used to update all the pinecone embedding. Occurs after the sparse retraining (if marked)",
         action="store_true",  # will default to false if flag is not present
     )
+    parser.add_argument(
+        "--encode_batch_size",
+        help="number of texts encoded together when updating the pinecone embedding",
+        type=int,
+        default=RFPPinceconeEmbedder.ENCODE_BATCH_SIZE
+    )
+    parser.add_argument(
+        "--index_backend",
+        help="the vector index to embed into. Defaults to the RFP_INDEX_BACKEND environment variable, or to pinecone",
+        choices=RFPPinceconeEmbedder.INDEX_BACKENDS
+    )
+    parser.add_argument(
+        "--full_reindex",
+        help="used to embed all the rows when updating the pinecone embedding, instead of only the changed ones",
+        action="store_true",  # will default to false if flag is not present
+    )
     arguments = parser.parse_args()
     main(arguments)
 
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+import sys
+import threading
+import numpy as np
+from pinecone_text.sparse import SparseVector
+
+QueryEmbeddings = Tuple[np.ndarray, SparseVector]
+# Bytes taken by an entry of the OrderedDict of the cache, besides its key and embeddings
+_ENTRY_OVERHEAD = 200
+
+
+class RFPQueryEmbeddingCache:
+    """
+    A bounded, thread-safe LRU cache of the dense and sparse embeddings of query questions, as questionnaires repeat the
+    same questions over and over.
+    The questions are keyed by their normalized text, lower cased with collapsed whitespace, which both embedding models
+    are insensitive to. The least recently used questions are evicted once the embeddings exceed the size limit.
+
+    Attributes:
+        max_bytes (int): Size limit of the cached entries, in bytes, counting the python objects of the keys and the
+            embeddings
+        hits (int): Number of lookups served from the cache
+        misses (int): Number of lookups computed
+    """
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes (int): Size limit of the cached entries, in bytes, counting the python objects of the keys and the
+            embeddings. 0 disables the cache.
+        """
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return ' '.join(text.split()).casefold()
+
+    @staticmethod
+    def _size(key: str, embeddings: QueryEmbeddings) -> int:
+        dense, sparse = embeddings
+        # the sparse vector is a dict of lists of python numbers, each taking several times its value
+        sparse_size = sys.getsizeof(sparse) + sum(sys.getsizeof(values) + sum(map(sys.getsizeof, values))
+                                                  for values in sparse.values())
+        return sys.getsizeof(key) + sys.getsizeof(embeddings) + sys.getsizeof(dense) + sparse_size + _ENTRY_OVERHEAD
+
+    def get_or_compute(self, text: str, compute: Callable[[List[str]], List[QueryEmbeddings]]) -> QueryEmbeddings:
+        """
+        Get the embeddings of a question from the cache, or compute and store them.
+
+        Args:
+            text (str): The question
+            compute (Callable[[List[str]], List[QueryEmbeddings]]): Computes the dense and sparse embeddings of
+                normalized questions
+
+        Returns:
+            QueryEmbeddings: The dense embedding, as a float32 array, and the sparse embedding. Shared with the cache,
+                so not to be modified.
+        """
+        return self.get_or_compute_many([text], compute)[0]
+
+    def get_or_compute_many(self, texts: List[str], compute: Callable[[List[str]], List[QueryEmbeddings]]) \
+            -> List[QueryEmbeddings]:
+        """
+        Batch version of get_or_compute, computing all the missing questions in a single call.
+        Concurrent misses of the same question may both compute it, rather than holding the lock while encoding.
+        """
+        keys = [self.normalize(text) for text in texts]
+        found: Dict[str, QueryEmbeddings] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                embeddings = self._entries.get(key)
+                if embeddings is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = embeddings
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return [found[key] for key in keys]
+        for key, (dense, sparse) in zip(missing, compute(missing)):
+            # copied, as a row of the batch of embeddings would keep the whole batch in memory
+            found[key] = (np.array(dense, dtype=np.float32), sparse)
+        with self._lock:
+            for key in missing:
+                size = self._size(key, found[key])
+                if key not in self._entries and size <= self.max_bytes:
+                    self._entries[key] = found[key]
+                    self._n_bytes += size
+            while self._n_bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._n_bytes -= self._size(evicted_key, evicted)
+        return [found[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                    'bytes': self._n_bytes, 'max_bytes': self.max_bytes}
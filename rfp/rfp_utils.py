@@ -30,11 +30,12 @@ def load_csv(file_path: str) -> pd.DataFrame:
             - Question: Combined category and question text
             - Answer: Combined answer and comment text
             - txt: Formatted question-answer pair
+            - file: Name of the CSV file
 
     Example:
         >> df = load_csv("rfp_responses.csv")
         >> print(df.columns)
-        ['id', 'Question', 'Answer', 'txt']
+        ['id', 'Question', 'Answer', 'txt', 'file']
     """
     logging.info(f"loading csv: {file_path}")
     df = pd.read_csv(file_path, dtype=str)
@@ -51,16 +52,57 @@ def load_csv(file_path: str) -> pd.DataFrame:
     df = df[~mask]
 
     # Create result DataFrame with standardized format
-    result_df = pd.DataFrame(columns=['id', 'Question', 'Answer', 'txt'])
+    result_df = pd.DataFrame(columns=['id', 'Question', 'Answer', 'txt', 'file'])
     result_df['id'] = os.path.basename(file_path)+df[CSV_FORMAT.NUMBER]
-    result_df['Question'] = df.apply(lambda row: row[CSV_FORMAT.QUESTION] if
-                            (pd.isna(row[CSV_FORMAT.CATEGORY]) or row[CSV_FORMAT.CATEGORY] in ('None', 'NaN', '')) else
-                            ': '.join([row[CSV_FORMAT.CATEGORY], row[CSV_FORMAT.QUESTION]]), axis=1)
+    result_df['Question'] = df.apply(lambda row: _combine_category_and_question(row[CSV_FORMAT.CATEGORY],
+                                                                                row[CSV_FORMAT.QUESTION]), axis=1)
     result_df['Answer'] = df.apply(lambda row: _add_comment(row[CSV_FORMAT.ANSWER], row[CSV_FORMAT.COMMENT]), axis=1)
     result_df['txt'] = result_df.apply(lambda row: _format_question_and_answer_string(row['Question'], row['Answer']), axis=1)
+    result_df['file'] = os.path.basename(file_path)
     return result_df
 
 
+def load_questionnaire(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Process a questionnaire to answer into its questions. The questionnaire has the layout of the RFP CSV files, where
+    only the question column is required.
+
+    Args:
+        df (pd.DataFrame): The questionnaire, with string columns
+
+    Returns:
+        pd.DataFrame: DataFrame of the rows with a question, indexed by their labels in the questionnaire, with
+            columns:
+            - Number: The number of the question, or its row number (from 1) if missing
+            - Question: Combined category and question text
+
+    Raises:
+        ValueError: If the questionnaire has no question column
+    """
+    if CSV_FORMAT.QUESTION not in df.columns:
+        raise ValueError(f"The questionnaire has no {CSV_FORMAT.QUESTION} column")
+    n_rows = len(df)
+    numbers = df[CSV_FORMAT.NUMBER].tolist() if CSV_FORMAT.NUMBER in df.columns else [pd.NA] * n_rows
+    categories = df[CSV_FORMAT.CATEGORY].tolist() if CSV_FORMAT.CATEGORY in df.columns else [pd.NA] * n_rows
+    questions = df[CSV_FORMAT.QUESTION].tolist()
+    positions = [i for i, question in enumerate(questions) if pd.notna(question) and question.strip() != '']
+    rows = [(numbers[i] if pd.notna(numbers[i]) else str(i + 1),
+             _combine_category_and_question(categories[i], questions[i])) for i in positions]
+    return pd.DataFrame(rows, index=df.index[positions], columns=[CSV_FORMAT.NUMBER, CSV_FORMAT.QUESTION])
+
+
+def questionnaire_from_records(records: List[dict]) -> pd.DataFrame:
+    """
+    Build a questionnaire from JSON records of the CSV_FORMAT columns, with string values like a CSV questionnaire.
+    Pass the result to load_questionnaire.
+
+    Raises:
+        AttributeError: If a record is not a dictionary
+    """
+    return pd.DataFrame([{column: str(value) for column, value in record.items() if value is not None}
+                         for record in records])
+
+
 def load_rfp_files_dir(dir_path: Union[Path, str]) -> pd.DataFrame:
     """
     Load and combine all CSV files in a directory into a single DataFrame.
@@ -114,6 +156,19 @@ def _add_comment(answer: str, comment: str) -> str:
     return f"{answer}. {comment}"
 
 
+def _combine_category_and_question(category: str, question: str) -> str:
+    """
+    Prefix a question with its category, if any.
+
+    Example:
+        >> _combine_category_and_question("Security", "Do you support 3DS?")
+        "Security: Do you support 3DS?"
+    """
+    if pd.isna(category) or category in ('None', 'NaN', ''):
+        return question
+    return ': '.join([category, question])
+
+
 def _format_question_and_answer_string(question: str, answer: str) -> str:
     """
     Format a question-answer pair into a standardized string format.
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from rfp.rfp_hnsw_index import HNSWIndex, recall_report
+
+DIM = 16
+N_VECTORS = 1000
+K = 10
+
+
+@pytest.fixture(scope='module')
+def vectors() -> np.ndarray:
+    vectors = np.random.default_rng(0).normal(size=(N_VECTORS, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture(scope='module')
+def queries() -> np.ndarray:
+    return np.random.default_rng(1).normal(size=(50, DIM)).astype(np.float32)
+
+
+@pytest.fixture(scope='module')
+def index(vectors) -> HNSWIndex:
+    index = HNSWIndex(DIM, ef_construction=100)
+    index.add(vectors)
+    return index
+
+
+def test_recall_against_exact_search(index, queries):
+    record, = recall_report(index, queries, k=K, ef_values=(64,))
+    assert record[f'recall@{K}'] >= 0.95
+
+
+def test_exact_search_is_brute_force(index, vectors, queries):
+    nodes, scores = index.exact_search(queries[0], K)
+    expected = np.argsort(-(vectors @ queries[0]), kind='stable')[:K]
+    np.testing.assert_array_equal(nodes, expected)
+    np.testing.assert_allclose(scores, vectors[expected] @ queries[0], rtol=1e-6)
+
+
+def test_search_skips_deleted_nodes(vectors, queries):
+    index = HNSWIndex(DIM, ef_construction=100)
+    index.add(vectors[:300])
+    deleted = index.exact_search(queries[0], K)[0][:3]
+    index.mark_deleted(deleted)
+
+    nodes, _ = index.search(queries[0], K)
+    assert len(nodes) == K
+    assert not set(nodes.tolist()).intersection(deleted.tolist())
+
+
+def test_saved_index_searches_the_same(index, queries, tmp_path):
+    index.save(tmp_path / 'hnsw')
+    loaded = HNSWIndex.load(tmp_path / 'hnsw')
+
+    assert len(loaded) == len(index)
+    for query in queries[:10]:
+        nodes, scores = index.search(query, K)
+        loaded_nodes, loaded_scores = loaded.search(query, K)
+        np.testing.assert_array_equal(loaded_nodes, nodes)
+        np.testing.assert_array_equal(loaded_scores, scores)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from rfp.rfp_local_index import RFPLocalIndex
+
+DIM = 8
+NAMESPACE = 'questions'
+
+
+def _vectors(ids, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [{
+        'id': vector_id,
+        'values': rng.normal(size=DIM).astype(np.float32).tolist(),
+        'sparse_values': {'indices': rng.choice(50, 3, replace=False).tolist(), 'values': rng.random(3).tolist()},
+        'metadata': {'question': f'question {vector_id}'},
+    } for vector_id in ids]
+
+
+def _query(index: RFPLocalIndex, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    response = index.query(rng.normal(size=DIM).tolist(), {'indices': list(range(0, 50, 5)), 'values': [1.] * 10},
+                           top_k=5, include_metadata=True, namespace=NAMESPACE)
+    return [(match['id'], match['score'], match['metadata']) for match in response['matches']]
+
+
+@pytest.mark.parametrize('dense_search', RFPLocalIndex.DENSE_SEARCHES)
+def test_reload_after_snapshot_and_log(tmp_path, dense_search):
+    index = RFPLocalIndex(tmp_path, dense_search)
+    index.upsert(_vectors([str(i) for i in range(40)]), NAMESPACE)
+    index.flush()
+    # small enough to be appended to the log of the snapshot
+    index.upsert(_vectors(['3', '40', '41'], seed=2), NAMESPACE)
+    index.delete(['7', '40'], NAMESPACE)
+    index.flush()
+    snapshot = (tmp_path / RFPLocalIndex.CURRENT_FILE).read_text()
+    assert (tmp_path / snapshot / RFPLocalIndex.LOG_FILE).exists()
+
+    loaded = RFPLocalIndex(tmp_path, dense_search)
+    assert _query(loaded) == _query(index)
+    assert set(loaded.fetch(['3', '7', '40', '41'], NAMESPACE).vectors) == {'3', '41'}
+    np.testing.assert_allclose(loaded.fetch(['3'], NAMESPACE).vectors['3']['values'],
+                               _vectors(['3'], seed=2)[0]['values'])
+
+
+def test_large_log_is_compacted_to_a_new_snapshot(tmp_path):
+    index = RFPLocalIndex(tmp_path)
+    index.MIN_COMPACTION_VECTORS = 10
+    index.upsert(_vectors([str(i) for i in range(10)]), NAMESPACE)
+    index.flush()
+    first_snapshot = (tmp_path / RFPLocalIndex.CURRENT_FILE).read_text()
+    index.upsert(_vectors([str(i) for i in range(10, 30)], seed=3), NAMESPACE)
+    index.flush()
+
+    snapshot = (tmp_path / RFPLocalIndex.CURRENT_FILE).read_text()
+    assert snapshot != first_snapshot
+    assert not (tmp_path / first_snapshot).exists()
+    assert not (tmp_path / snapshot / RFPLocalIndex.LOG_FILE).exists()
+    assert _query(RFPLocalIndex(tmp_path)) == _query(index)
+
+
+def test_truncated_log_end_is_discarded(tmp_path):
+    index = RFPLocalIndex(tmp_path)
+    index.upsert(_vectors([str(i) for i in range(20)]), NAMESPACE)
+    index.flush()
+    index.upsert(_vectors(['20']), NAMESPACE)
+    index.flush()
+    log_path = tmp_path / (tmp_path / RFPLocalIndex.CURRENT_FILE).read_text() / RFPLocalIndex.LOG_FILE
+    valid_size = log_path.stat().st_size
+    # an append interrupted by a crash
+    with open(log_path, 'a') as f:
+        f.write('{"op": "upsert", "namespace": "questions", "vec')
+
+    loaded = RFPLocalIndex(tmp_path)
+    assert '20' in loaded.fetch(['20'], NAMESPACE).vectors
+    assert log_path.stat().st_size == valid_size
+    loaded.delete(['20'], NAMESPACE)
+    loaded.flush()
+    assert '20' not in RFPLocalIndex(tmp_path).fetch(['20'], NAMESPACE).vectors
+
+
+@pytest.mark.parametrize('dense_search', RFPLocalIndex.DENSE_SEARCHES)
+def test_queries_between_changes_match_brute_force(dense_search):
+    rng = np.random.default_rng(3)
+    index, stored = RFPLocalIndex(None, dense_search), {}
+    for step in range(100):
+        # replaces some of the stored vectors, and deletes others, so that the rows are appended and deleted
+        vectors = _vectors([str(i) for i in rng.choice(60, 4, replace=False)], seed=step)
+        index.upsert(vectors, NAMESPACE)
+        stored.update({vector['id']: vector for vector in vectors})
+        deleted = [str(i) for i in rng.choice(60, 2, replace=False)]
+        index.delete(deleted, NAMESPACE)
+        for vector_id in deleted:
+            stored.pop(vector_id, None)
+
+        query = rng.normal(size=DIM)
+        sparse_query = dict.fromkeys(range(0, 50, 5), 1.)
+        scores = {vector_id: np.dot(vector['values'], query) + sum(
+            sparse_query.get(i, 0.) * value for i, value in zip(vector['sparse_values']['indices'],
+                                                                vector['sparse_values']['values']))
+            for vector_id, vector in stored.items()}
+        expected = sorted(scores, key=lambda vector_id: -scores[vector_id])[:5]
+        response = index.query(query.tolist(), {'indices': list(sparse_query), 'values': list(sparse_query.values())},
+                               top_k=5, namespace=NAMESPACE)
+        assert [match['id'] for match in response['matches']] == expected